@@ -15,8 +15,22 @@ CREATE TABLE job (
     time_add timestamptz DEFAULT now(),
     posting_text text NOT NULL,
     rejected boolean DEFAULT false,
-    time_reject timestamptz
-);
+    time_reject timestamptz,
+    search_vector tsvector
+) WITH (toast_tuple_target = 256);
+
+/* Posting texts and search vectors are moved out of the job table's rows (into its TOAST table) unless the
+   row fits in 256 bytes, so queries that do not select them read a fraction of the pages. Posting texts are
+   compressed with LZ4 where supported (Postgres 14+ built with LZ4, e.g. the official Docker image) */
+DO $$
+BEGIN
+  IF current_setting('server_version_num')::int >= 140000 THEN
+    EXECUTE 'ALTER TABLE job ALTER COLUMN posting_text SET COMPRESSION lz4';
+  END IF;
+EXCEPTION WHEN feature_not_supported THEN
+  RAISE NOTICE 'Postgres was built without LZ4 support, posting_text keeps the default compression';
+END;
+$$;
 
 CREATE TABLE industry (
     id serial PRIMARY KEY,
@@ -40,6 +54,25 @@ CREATE TABLE job_function(
     CONSTRAINT job_function_pkey PRIMARY KEY (job_id, function_id)
 );
 
+/* Junction tables are looked up by job_id through their primary keys; index the other side too, for
+   lookups of the jobs in an industry / function (and the ON DELETE RESTRICT checks) */
+CREATE INDEX job_industry_industry_id_idx ON job_industry (industry_id);
+
+CREATE INDEX job_function_function_id_idx ON job_function (function_id);
+
+/* Full-text search over the jobs' title, company and posting text (see PGHandler.search_jobs()) */
+CREATE INDEX job_search_vector_idx ON job USING GIN (search_vector);
+
+/* Rejecting jobs by title and company (see PGHandler.reject_jobs()) - ignoring case, and by trigram similarity
+   (pg_trgm ships with Postgres' contrib modules, included in the official Docker image) */
+CREATE INDEX job_lower_title_company_idx ON job (lower(title), lower(company));
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX job_title_trgm_idx ON job USING GIN (title gin_trgm_ops);
+
+CREATE INDEX job_company_trgm_idx ON job USING GIN (company gin_trgm_ops);
+
 
 /* Initialize NULL rows in 'industry' and 'function tables */
 INSERT INTO industry (name)
@@ -63,3 +96,22 @@ $$;
 CREATE TRIGGER set_reject_timestamp
 BEFORE UPDATE OF rejected ON job 
 FOR EACH ROW EXECUTE FUNCTION trigger_set_reject_timestamp();
+
+
+/* Create trigger function to compute 'search_vector' for the 'job' table when inserted, or when its text
+   is updated (a generated column would be recomputed by every update, e.g. of the 'rejected' flag) */
+
+CREATE FUNCTION trigger_set_search_vector() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+  NEW.search_vector = setweight(to_tsvector('english', NEW.title), 'A') ||
+                      setweight(to_tsvector('english', NEW.company), 'B') ||
+                      setweight(to_tsvector('english', NEW.posting_text), 'C');
+  RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER set_search_vector
+BEFORE INSERT OR UPDATE OF title, company, posting_text ON job 
+FOR EACH ROW EXECUTE FUNCTION trigger_set_search_vector();
@@ -0,0 +1,303 @@
+"""
+ASGI server for the API - alternative to api_gevent_server.py, serving the API's core endpoints on asyncio
+(Starlette / uvicorn), with database transactions on an asyncpg connection pool (see postgres_handler_async.py)
+and job data extraction offloaded from the event loop to the extraction pool (see extraction_pool.py).
+
+Usage:
+    python api_asgi_server.py          (listens on port API_PORT, default: 5000)
+    uvicorn api_asgi_server:app --host 0.0.0.0 --port 5000
+"""
+# Utility
+import os
+import json
+import logging
+from http import HTTPStatus
+from contextlib import asynccontextmanager
+# Starlette
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+# Flask-RESTful (job fields are serialized the same way as by the Flask API)
+from flask_restful import fields
+# Custom modules
+from postgres_handler_async import AsyncPGHandler
+from extraction_pool import ExtractionPool, PoolFullError, ExtractionTimeoutError
+from response_cache import ResponseCache
+from dedup_cache import DedupCache
+from job_serializer import JobSerializer
+from request_decoding import GzipDecoder, BodyTooLargeError, InvalidEncodingError, max_decoded_size
+from request_decoding import GZIP_ENCODINGS, IDENTITY_ENCODINGS
+from metrics import Metrics
+from structured_logging import configure_logging
+
+
+API_PREFIX = '/jobdataextractor/api/v1.0'
+
+logger = logging.getLogger(__name__)
+
+# Same fields as yielded by the Flask API (see api_linkedin_extractor.py)
+job_fields = {
+    'id': fields.Integer,
+    'url': fields.String,
+    'title': fields.String,
+    'company': fields.String,
+    'location': fields.String,
+    'seniority': fields.String,
+    'employment_type': fields.String,
+    'industries': fields.List(fields.String),
+    'functions': fields.List(fields.String),
+    'posting_text': fields.String,
+}
+
+# Serializer of the jobs' responses - with the 'uri' field built from the API's prefix, as Flask-RESTful's Url
+# field requires a Flask request context
+job_serializer = JobSerializer(dict(job_fields, uri=fields.Url('job')), uri_prefix=f"{API_PREFIX}/jobs/")
+
+# Number of jobs per page when listing jobs with ?after_id= / ?limit=
+PAGE_LIMIT_DEFAULT = 100
+PAGE_LIMIT_MAX = 1000
+
+# Maximum size of a decoded gzip request body (bytes, see request_decoding.py)
+MAX_DECODED_SIZE = max_decoded_size()
+
+
+def error_response(status_code, message=None):
+    """
+    Output: JSON response with the status' default message, as returned by the Flask API
+    """
+    return JSONResponse({'message': message or HTTPStatus(status_code).description}, status_code=status_code)
+
+
+def parse_int_arg(request, name):
+    """
+    Output: Integer query string argument, None if absent (raises ValueError if not an integer)
+    """
+    value = request.query_params.get(name)
+    return None if value is None else int(value)
+
+
+async def hello(request):
+    return PlainTextResponse("Hello World from Starlette!")
+
+
+async def checkconnect(request):
+    pool = AsyncPGHandler.connection_pool
+    pool_stats = None if pool is None else {'min_size': pool.get_min_size(), 'max_size': pool.get_max_size(),
+                                            'size': pool.get_size(), 'idle': pool.get_idle_size()}
+    return JSONResponse({'connection_status': AsyncPGHandler.connection_status, 'pool': pool_stats})
+
+
+async def stats(request):
+    return JSONResponse({'lookup_cache': AsyncPGHandler.lookup_cache.stats(),
+                         'response_cache': ResponseCache.stats(),
+                         'dedup_cache': DedupCache.stats()})
+
+
+async def metrics(request):
+    # Histograms of the time spent on the API's hot paths, in the Prometheus text format (see metrics.py)
+    return Response(Metrics.render(), headers={'Content-Type': Metrics.CONTENT_TYPE})
+
+
+async def job_list(request):
+    """
+    GET:  Data of all jobs (streamed), a page of jobs (?after_id= / ?limit=) or NDJSON (?format=ndjson)
+    POST: Extract and add a new job posting ({"id": ..., "HTML": ...}, or the raw HTML as a 'text/html' body with
+          ?id=) to the database - the body may be gzip-compressed ('Content-Encoding: gzip')
+    """
+    if AsyncPGHandler.connection_status == False:
+        await AsyncPGHandler.init_connection_pool()
+        if AsyncPGHandler.connection_status == False:
+            return error_response(504)
+
+    if request.method == 'POST':
+        return await post_job(request)
+
+    try:
+        after_id, limit = parse_int_arg(request, 'after_id'), parse_int_arg(request, 'limit')
+    except ValueError:
+        return error_response(400)
+    output_format = request.query_params.get('format', 'json')
+
+    if output_format == 'ndjson':
+        async def ndjson_lines():
+            async for job in AsyncPGHandler.iter_jobs(after_id=after_id, limit=limit):
+                yield job_serializer.serialize(job) + '\n'
+        return StreamingResponse(ndjson_lines(), media_type='application/x-ndjson')
+
+    elif output_format != 'json':
+        return error_response(400)
+
+    elif after_id is None and limit is None:
+        async def job_list_chunks():
+            yield '{"job_list": ['
+            i = 0
+            async for job in AsyncPGHandler.iter_jobs():
+                yield (', ' if i else '') + job_serializer.serialize(job)
+                i += 1
+            yield ']}'
+        return StreamingResponse(job_list_chunks(), media_type='application/json')
+
+    else:
+        limit = min(max(limit or PAGE_LIMIT_DEFAULT, 1), PAGE_LIMIT_MAX)
+        jobs = await AsyncPGHandler.select_jobs_page(after_id=after_id, limit=limit)
+        next_after_id = jobs[-1].id if len(jobs) == limit else None
+        body = ('{"job_list": ' + job_serializer.serialize_list(jobs) + ', "next_after_id": '
+                + json.dumps(next_after_id) + '}\n')
+        return Response(body, media_type='application/json')
+
+
+async def read_body(request):
+    """
+    Output: Request's body (bytes), decoded as it arrives if gzip-compressed - raises BodyTooLargeError /
+            InvalidEncodingError, or ValueError if the content encoding is not supported
+    """
+    encoding = request.headers.get('content-encoding', '').strip().lower()
+    if encoding in IDENTITY_ENCODINGS:
+        return await request.body()
+    if encoding not in GZIP_ENCODINGS:
+        raise ValueError(f"Unsupported Content-Encoding: {encoding}")
+
+    decoder = GzipDecoder(MAX_DECODED_SIZE)
+    chunks = [decoder.feed(chunk) async for chunk in request.stream()]
+    decoder.finish()
+    return b''.join(chunks)
+
+
+async def post_job(request):
+    try:
+        with Metrics.timer(Metrics.request_stage_seconds, 'decode'):
+            body = await read_body(request)
+    except BodyTooLargeError as error:
+        return error_response(413, str(error))
+    except InvalidEncodingError as error:
+        return error_response(400, str(error))
+    except ValueError as error:
+        return error_response(415, str(error))
+
+    try:
+        if request.headers.get('content-type', '').split(';')[0].strip() == 'text/html':
+            # Raw HTML as the body and the job id as a query parameter (as posted by the Chrome Extension)
+            job_id, html = parse_int_arg(request, 'id'), body.decode('utf-8', errors='replace')
+            if job_id is None:
+                raise ValueError
+        else:
+            args = json.loads(body)
+            job_id, html = int(args['id']), args['HTML']
+            if not isinstance(html, str):
+                raise TypeError
+    except (ValueError, TypeError, KeyError):
+        return error_response(400, "A job id and HTML must be provided")
+
+    # Reject jobs already in the database / currently being processed before parsing their HTML
+    with Metrics.timer(Metrics.request_stage_seconds, 'dedup'):
+        claimed = DedupCache.claim(job_id, html)
+    if claimed is not None:
+        return error_response(409)
+
+    stored = False
+    try:
+        # Extract the relevant data fields from the raw HTML in the extraction pool, off the event loop
+        try:
+            with Metrics.timer(Metrics.request_stage_seconds, 'extraction'):
+                job_data = await ExtractionPool.extract_async({'id': job_id, 'html': html})
+        except PoolFullError:
+            return JSONResponse({'message': 'Server is busy extracting other job postings, retry later'},
+                                status_code=503, headers={'Retry-After': str(ExtractionPool.retry_after)})
+        except ExtractionTimeoutError:
+            return error_response(504)
+
+        # Commit extracted data to the Postgres database and return HTML code
+        with Metrics.timer(Metrics.request_stage_seconds, 'insert'):
+            inserted = await AsyncPGHandler.insert_job(job_data)
+        stored = AsyncPGHandler.connection_status != False
+        if inserted:
+            return Response('{"job": ' + job_serializer.serialize(job_data) + '}\n', status_code=201,
+                            media_type='application/json')
+        else:
+            return error_response(409)
+    finally:
+        DedupCache.release(job_id, html, stored=stored)
+
+
+async def job(request):
+    """
+    GET: Data of a specific job, with ETag / If-None-Match support
+    """
+    job_id = request.path_params['id']
+
+    # Serve the job's serialized response from the response cache if possible
+    cached = ResponseCache.get(job_id)
+
+    if cached is not None:
+        body, etag = cached
+    else:
+        if AsyncPGHandler.connection_status == False:
+            return error_response(504)
+
+        cache_generation = ResponseCache.generation
+        selected_job = await AsyncPGHandler.select_job(job_id)
+        if selected_job is None:
+            return error_response(404)
+
+        body = ('{"job": ' + job_serializer.serialize(selected_job) + '}\n').encode()
+        etag = ResponseCache.set(job_id, body, cache_generation)
+
+    # Responds with 304 Not Modified (and no body) if the client's If-None-Match matches the ETag
+    headers = {'ETag': f'"{etag}"', 'X-Cache': 'HIT' if cached is not None else 'MISS'}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Input:  Value of the request's If-None-Match header (or None), and the response's ETag
+    Output: True if the header matches the ETag
+    """
+    if if_none_match is None:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*' or (tag[2:] if tag.startswith('W/') else tag) == f'"{etag}"':
+            return True
+    return False
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Initialize a connection pool to the Postgres database, the pool of workers used to extract job data
+    # and the response / dedup caches (see api_linkedin_extractor.py)
+    # NOTE: Connection parameters must be specified in the .env file
+    configure_logging()
+    Metrics.init_metrics()
+    error = await AsyncPGHandler.init_connection_pool()
+    if error:
+        logger.error("Connection to Postgres database failed", extra={'error': error})
+    ExtractionPool.init_pool()
+    ResponseCache.init_cache(AsyncPGHandler.add_job_change_listener)
+    DedupCache.init_cache(job_change_hook=AsyncPGHandler.add_job_change_listener)
+    if DedupCache.max_known_ids > 0 and AsyncPGHandler.connection_status:
+        recent_ids = await AsyncPGHandler.select_recent_ids(DedupCache.max_known_ids)
+        DedupCache.add_known_ids(reversed(recent_ids))
+    logger.info("API is ready to accept requests!")
+
+    yield
+
+    ExtractionPool.shutdown()
+    await AsyncPGHandler.close_connection_pool()
+
+
+app = Starlette(routes=[
+    Route('/', hello),
+    Route('/metrics', metrics),
+    Route(f'{API_PREFIX}/checkconnection/', checkconnect),
+    Route(f'{API_PREFIX}/stats/', stats),
+    Route(f'{API_PREFIX}/jobs/', job_list, methods=['GET', 'POST']),
+    Route(f'{API_PREFIX}/jobs/{{id:int}}', job),
+    ], lifespan=lifespan)
+
+
+# NOTE: The extraction pool's worker processes import this module when spawned, and must not start a server
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get("API_PORT") or 5000))
@@ -1,5 +1,14 @@
-from api_linkedin_extractor import app
-from gevent.pywsgi import WSGIServer
+# NOTE: Everything runs under the __main__ guard - the extraction pool's worker processes import this module
+# when spawned, and must neither initialize the API (db connections etc.) nor start a server of their own
+if __name__ == '__main__':
+    # Database calls must yield to other greenlets, set up before the API initializes its connection pool
+    from postgres_handler import PGHandler
+    PGHandler.use_gevent()
 
-http_server = WSGIServer(('0.0.0.0', 5000), app)
-http_server.serve_forever()
\ No newline at end of file
+    import os
+    from api_linkedin_extractor import app
+    from gevent.pywsgi import WSGIServer
+
+    # Listens on API_PORT (default: 5000) - the .env file is loaded by the API on import
+    http_server = WSGIServer(('0.0.0.0', int(os.environ.get("API_PORT") or 5000)), app)
+    http_server.serve_forever()
@@ -1,14 +1,37 @@
+# Utility
+import json
+import time
+import logging
 # Flask
-from flask import Flask, request, abort, make_response, jsonify
-from flask_restful import Api, Resource, reqparse, fields, marshal
+from flask import Flask, request, abort, make_response, jsonify, Response, stream_with_context, g, url_for
+from flask_restful import Api, Resource, reqparse, inputs, fields, marshal
+from werkzeug.exceptions import HTTPException
 # Custom modules
 from html_processor import JobData
 from postgres_handler import PGHandler
+from extraction_pool import ExtractionPool, PoolFullError, ExtractionTimeoutError
+from response_cache import ResponseCache
+from dedup_cache import DedupCache
+from ingest_spool import IngestSpool
+from bulk_ingest import BulkIngestor, iter_ndjson_documents, extract_batch_with_pool
+from job_serializer import JobSerializer
+from request_decoding import GzipRequestMiddleware, max_decoded_size
+from metrics import Metrics, RequestProfiler
+from structured_logging import configure_logging
 from postgres_config import pg_config
 
 
 app = Flask(__name__)
-api = Api(app)
+# Decode gzip-compressed request bodies (e.g. job postings from the Chrome Extension) as they are read
+app.wsgi_app = GzipRequestMiddleware(app.wsgi_app)
+# Database errors raised while handling a request: no connection available in time / database unreachable /
+# query cancelled / pg_trgm extension (see migrations/) not installed
+api = Api(app, errors={
+    'PoolTimeoutError': {'message': 'Server is busy, no database connection available, retry later', 'status': 503},
+    'OperationalError': {'message': 'Connection to the database failed', 'status': 504},
+    'QueryCanceled': {'message': 'Search took too long, narrow down the query', 'status': 504},
+    'UndefinedFunction': {'message': 'Database is missing an extension, run the migrations', 'status': 501},
+})
 
 # Define the fields to be yielded during GET requests
 job_fields = {
@@ -25,22 +48,143 @@ job_fields = {
     'uri': fields.Url('job')
 }
 
+# Fields yielded by job searches - the job's fields and its relevance to the search
+search_fields = dict(job_fields, rank=fields.Float)
+
+# Fields yielded by job rejects - the rejected job, and whether it was rejected by this request
+reject_fields = {
+    'id': fields.Integer,
+    'title': fields.String,
+    'company': fields.String,
+    'time_reject': fields.DateTime(dt_format='iso8601'),
+    'newly_rejected': fields.Boolean,
+    'uri': fields.Url('job')
+}
+
+# Fields yielded by the status of a spooled job posting (accept-then-process mode, see ingest_spool.py) - the
+# job's uri is only found once its status is 'inserted' / 'exists'
+ingest_fields = {
+    'id': fields.Integer,
+    'status': fields.String,
+    'attempts': fields.Integer,
+    'error': fields.String,
+    'time_received': fields.DateTime(dt_format='iso8601'),
+    'time_updated': fields.DateTime(dt_format='iso8601'),
+    'uri': fields.Url('job')
+}
+
+# Largest job id stored by the database (bigint)
+MAX_JOB_ID = 2**63 - 1
+
+# Maximum size of a 'text/html' job posting body read in full, i.e. spooled (decoded, if gzip-compressed) - see
+# request_decoding.py
+MAX_HTML_BODY_SIZE = max_decoded_size()
+HTML_BODY_READ_SIZE = 64 * 1024
+
+# Log to stderr (JSON lines by default, see structured_logging.py), and time the API's hot paths / sample
+# requests to profile (see metrics.py)
+configure_logging()
+logger = logging.getLogger(__name__)
+Metrics.init_metrics()
+RequestProfiler.init_profiler()
 # Initialize a connection pool to the Postgres database
 # NOTE: Connection parameters must be specified in the .env file
 PGHandler.init_connection_pool()
-print("API is ready to accept requests!")
+# Initialize the pool of workers used to extract job data from the posted HTML
+ExtractionPool.init_pool()
+# Initialize the cache of GET /jobs/<id> responses, invalidated by PGHandler when jobs are inserted / updated
+ResponseCache.init_cache(PGHandler.add_job_change_listener)
+# Initialize the set of known job ids, used to reject duplicate job postings before parsing them
+DedupCache.init_cache(PGHandler.select_recent_ids, PGHandler.add_job_change_listener)
+# In accept-then-process mode, start the worker extracting / committing the spooled job postings
+IngestSpool.init_spool(extract_batch_with_pool)
+logger.info("API is ready to accept requests!")
+
+
+def parse_fields(fields_arg, output_fields):
+    """
+    Input:  Value of a ?fields= query string argument (comma separated field names, e.g. 'id,title,company'),
+            and dict of the fields yielded by the endpoint
+    Output: Tuple of (dict of the fields to yield, list of the fields to select from the database - None for
+            every field), aborts with 400 if a field is unknown
+    """
+    if fields_arg is None:
+        return output_fields, None
+    
+    fields_list = [field.strip() for field in fields_arg.split(',') if field.strip()]
+    if not fields_list or any(field not in output_fields for field in fields_list):
+        abort(400)
+    return {field: output_fields[field] for field in fields_list}, fields_list
+
+
+def job_response(serializer, job, status=200):
+    """
+    Input:  JobSerializer of the fields to yield, JobRecord of the job's data, and response status code
+    Output: Response of the {"job": {...}} JSON document, as Flask-RESTful would output it
+    """
+    return Response('{"job": ' + serializer.serialize(job) + '}\n', status=status, mimetype='application/json')
+
+
+def job_list_response(serializer, job_list, next_name, next_value):
+    """
+    Input:  JobSerializer of the fields to yield, list of JobRecords, and name / value of the next page's argument
+    Output: 200 response of the {"job_list": [...], <next_name>: <next_value>} JSON document, as Flask-RESTful
+            would output it
+    """
+    body = ('{"job_list": ' + serializer.serialize_list(job_list) + ', ' + json.dumps(next_name) + ': '
+            + json.dumps(next_value) + '}\n')
+    return Response(body, mimetype='application/json')
+
+
+def read_html_body():
+    """
+    Output: String of the request's 'text/html' body, decoded if gzip-compressed (see request_decoding.py) -
+            aborts with 413 if larger than MAX_HTML_BODY_SIZE
+    """
+    chunks = []
+    size = 0
+    while True:
+        chunk = request.stream.read(HTML_BODY_READ_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_HTML_BODY_SIZE:
+            abort(413)
+        chunks.append(chunk)
+    return b''.join(chunks).decode('utf-8', errors='replace')
 
 
 def attempt_connection():
     """
-    Attempts to connect to the postgres database if the connection has not been established already
+    Fails fast (504) if the database is unreachable - the connection pool reconnects in the background
     """
     if PGHandler.connection_status == False:
-        try:
-            PGHandler.init_connection_pool()
-        except Exception as error:
-            print(str(error))
-            abort(504)
+        abort(504)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.profiler = RequestProfiler.start()
+
+
+@app.after_request
+def observe_request_time(response):
+    # NOTE: Streamed response bodies are generated after this - only the time to the response is observed
+    elapsed = time.perf_counter() - g.request_start
+    Metrics.observe(Metrics.request_seconds, elapsed, request.method, request.endpoint or 'none',
+                    str(response.status_code))
+    RequestProfiler.stop(g.profiler, elapsed, f"{request.method} {request.endpoint or 'none'}")
+    g.profiler = None
+    return response
+
+
+@app.teardown_request
+def stop_request_profiler(error):
+    # Requests failing with an unhandled exception skip after_request()
+    if g.get('profiler') is not None:
+        RequestProfiler.stop(g.profiler, time.perf_counter() - g.request_start,
+                             f"{request.method} {request.endpoint or 'none'}")
 
 
 @app.route("/")
@@ -49,15 +193,34 @@ def hello():
 
 @app.route("/jobdataextractor/api/v1.0/checkconnection/", methods=['GET'])
 def checkconnect():
-    return "Current connection status to database is: " + str(PGHandler.connection_status)
+    return jsonify({'connection_status': PGHandler.connection_status,
+                    'pool': PGHandler.connection_pool.stats()})
 
 @app.route("/jobdataextractor/api/v1.0/tryconnection/", methods=['GET'])
 def tryconnect():
+    # NOTE: No-op if the connection pool is already initialized (reconnects happen in the background)
     PGHandler.init_connection_pool()
     return "Current connection status to database is: " + str(PGHandler.connection_status)
 
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    # Histograms of the time spent on the API's hot paths, in the Prometheus text format
+    return Response(Metrics.render(), content_type=Metrics.CONTENT_TYPE)
+
+@app.route("/jobdataextractor/api/v1.0/stats/", methods=['GET'])
+def stats():
+    return jsonify({'lookup_cache': PGHandler.lookup_cache.stats(),
+                    'statements': PGHandler.statements.stats(),
+                    'response_cache': ResponseCache.stats(),
+                    'dedup_cache': DedupCache.stats(),
+                    'ingest_spool': IngestSpool.stats()})
+
 class JobListAPI(Resource):
     
+    # Number of jobs per page when listing jobs with ?after_id= / ?limit=
+    PAGE_LIMIT_DEFAULT = 100
+    PAGE_LIMIT_MAX = 1000
+    
     # Validation arguments for '/jobs' endpoint
     def __init__(self):
         self.reqparse = reqparse.RequestParser()
@@ -67,45 +230,288 @@ class JobListAPI(Resource):
         self.reqparse.add_argument('HTML', type=str, required=True,
                                    help='No HTML provided',
                                    location='json')
+        
+        # Query string arguments for listing jobs
+        self.list_reqparse = reqparse.RequestParser()
+        self.list_reqparse.add_argument('after_id', type=int, location='args')
+        self.list_reqparse.add_argument('limit', type=int, location='args')
+        self.list_reqparse.add_argument('format', choices=('json', 'ndjson'), default='json', location='args')
+        self.list_reqparse.add_argument('fields', type=str, location='args')
         super(JobListAPI, self).__init__()
         
         
     def get(self):
         # Verify connection, exit if failed
         attempt_connection()
-           
-        # Select data for all jobs (no id passed) from the Postgres database and store to appropriate dict
-        job_list = PGHandler.select_job()
         
-        if job_list == False:
-            abort(504)
-        elif job_list is None:
-            abort(404)
+        args = self.list_reqparse.parse_args()
+        # Only the requested fields (?fields=id,title,...) are selected from the database and yielded
+        output_fields, select_fields = parse_fields(args['fields'], job_fields)
+        
+        if args['format'] == 'ndjson':
+            # Stream the selected jobs as NDJSON, one job per line
+            job_iter = PGHandler.iter_jobs(after_id=args['after_id'], limit=args['limit'], fields=select_fields)
+            serializer = JobSerializer(output_fields)
+            return Response(stream_with_context(serializer.serialize(job) + '\n' for job in job_iter),
+                            mimetype='application/x-ndjson')
+        
+        elif args['after_id'] is None and args['limit'] is None:
+            # Stream data for all jobs from the Postgres database, in the same format as a page (below)
+            job_iter = PGHandler.iter_jobs(fields=select_fields)
+            return Response(stream_with_context(self.stream_job_list(job_iter, JobSerializer(output_fields))),
+                            mimetype='application/json')
+        
         else:
-            return {'job_list': [marshal(job, job_fields) for job in job_list]}, 200
+            # Select a page of jobs, starting after the given job id. The last job id of a full page is 
+            # returned as 'next_after_id', to be passed as ?after_id= to get the next page
+            limit = min(max(args['limit'] or self.PAGE_LIMIT_DEFAULT, 1), self.PAGE_LIMIT_MAX)
+            job_list = PGHandler.select_jobs_page(after_id=args['after_id'], limit=limit, fields=select_fields)
+            
+            if job_list is None:
+                abort(504)
+            
+            next_after_id = job_list[-1].id if len(job_list) == limit else None
+            return job_list_response(JobSerializer(output_fields), job_list, 'next_after_id', next_after_id)
+    
+    
+    def stream_job_list(self, job_iter, serializer):
+        """
+        Input:  Iterable of jobs' data from the database, and JobSerializer of the fields to yield
+        Output: Generator of the chunks of a {"job_list": [...]} JSON document
+        """
+        yield '{"job_list": ['
+        for i, job in enumerate(job_iter):
+            yield (', ' if i else '') + serializer.serialize(job)
+        yield ']}'
         
     
 
     def post(self):
+        # Verify connection, exit if failed - spooled job postings are accepted while the database is unavailable
+        if not IngestSpool.enabled:
+            attempt_connection()
+        
+        if request.mimetype == 'text/html':
+            # Incremental intake (as posted by the Chrome Extension) - the raw HTML is sent as the request body
+            # and the job id as a query parameter. The body stream is parsed as it is read (and decoded, if
+            # gzip-compressed - see request_decoding.py), in one of the extraction pool's task slots
+            job_id = request.args.get('id', type=int)
+            if job_id is None:
+                abort(400)
+            html = None
+        else:
+            with Metrics.timer(Metrics.request_stage_seconds, 'decode'):
+                args = self.reqparse.parse_args()
+            job_id, html = args['id'], args['HTML']
+
+        # Job ids must fit the database's id column (rejected before anything is spooled / extracted)
+        if not 0 < job_id <= MAX_JOB_ID:
+            abort(400)
+        
+        # Reject jobs already in the database / currently being processed before parsing their HTML (by job id
+        # only for 'text/html' request bodies, whose content is not held to be hashed)
+        with Metrics.timer(Metrics.request_stage_seconds, 'dedup'):
+            claimed = DedupCache.claim(job_id, html)
+        if claimed is not None:
+            abort(409)
+        
+        if IngestSpool.enabled:
+            try:
+                return self.spool_job(job_id, html)
+            finally:
+                DedupCache.release(job_id, html)
+        
+        stored = False
+        try:
+            # Assign the id and HTML received from the Chrome Extension into a JobData object, and have
+            # a worker from the extraction pool extract the relevant data fields from the raw HTML - the
+            # body stream is read (and decoded) as it is parsed, both are timed as the extraction
+            try:
+                with Metrics.timer(Metrics.request_stage_seconds, 'extraction'):
+                    if html is None:
+                        job_data = ExtractionPool.extract_stream(job_id, request.stream)
+                    else:
+                        job_data = ExtractionPool.extract({'id': job_id, 'html': html})
+            except PoolFullError:
+                return ({'message': 'Server is busy extracting other job postings, retry later'}, 503, 
+                        {'Retry-After': str(ExtractionPool.retry_after)})
+            except ExtractionTimeoutError:
+                abort(504)
+            
+            # Commit extracted data to the Postgres database and return HTML code
+            # NOTE: The job is in the database either way, unless the connection has not been established
+            with Metrics.timer(Metrics.request_stage_seconds, 'insert'):
+                inserted = PGHandler.insert_job(job_data)
+            stored = PGHandler.connection_status != False
+            if inserted:
+                return job_response(JobSerializer(job_fields), job_data, 201)
+            else:
+                abort(409)
+        finally:
+            DedupCache.release(job_id, html, stored=stored)
+    
+    
+    def spool_job(self, job_id, html):
+        """
+        Accept-then-process mode: store the job posting in the spool, to be extracted and committed to the
+        database by the spool's worker (see ingest_spool.py)
+        Inputs:  Integer job id, and string of the posted HTML (None for a 'text/html' request body)
+        Outputs: 202 response with the url of the posting's status, aborts with 409 if already spooled
+        """
+        if html is None:
+            # The body is read in full (and decoded, if gzip-compressed) to be stored
+            with Metrics.timer(Metrics.request_stage_seconds, 'decode'):
+                html = read_html_body()
+        
+        with Metrics.timer(Metrics.request_stage_seconds, 'spool'):
+            spooled = IngestSpool.enqueue(job_id, html)
+        if not spooled:
+            abort(409)
+        
+        status_uri = url_for('job_ingest', id=job_id)
+        return {'id': job_id, 'status': 'queued', 'status_uri': status_uri}, 202, {'Location': status_uri}
+
+
+class JobIngestAPI(Resource):
+    
+    def get(self, id):
+        # Status of a job posting spooled in accept-then-process mode (see ingest_spool.py)
+        if not IngestSpool.enabled:
+            abort(404)
+        
+        status = IngestSpool.status(id)
+        if status is None:
+            abort(404)
+        
+        response = {'job': marshal(status, ingest_fields)}
+        if status['status'] not in IngestSpool.DONE_STATUSES:
+            response['job']['uri'] = None
+        return response, 200
+
+
+class JobBatchAPI(Resource):
+    
+    def post(self):
+        # Verify connection, exit if failed
+        attempt_connection()
+        
+        # Bulk intake - the request body is NDJSON, one {"id": ..., "HTML": ...} object per line, read as
+        # it arrives. Jobs are extracted by the extraction pool and committed in batches of ?batch_size= jobs,
+        # and their results streamed back as NDJSON as each batch is committed
+        batch_size = request.args.get('batch_size', default=100, type=int)
+        if batch_size < 1:
+            abort(400)
+        
+        ingestor = BulkIngestor(extract_batch_with_pool, batch_size=batch_size)
+        return Response(stream_with_context(self.stream_results(ingestor)), mimetype='application/x-ndjson')
+    
+    
+    def stream_results(self, ingestor):
+        """
+        Input:  BulkIngestor of the request
+        Output: Generator of NDJSON lines - one per document's result, then a {"summary": {...}} line (with
+                the error which stopped the ingestion, if any - the response status is already sent)
+        """
+        summary = {}
+        try:
+            for result in ingestor.ingest(iter_ndjson_documents(request.stream)):
+                yield json.dumps(result) + '\n'
+        except HTTPException as error:
+            # e.g. invalid gzip-compressed body (see request_decoding.py)
+            summary['error'] = f"{error.code}: {error.description}"
+        except Exception as error:
+            logger.exception("Batch ingestion failed")
+            summary['error'] = f"{type(error).__name__}: {error}"
+        yield json.dumps({'summary': dict(ingestor.summary(), **summary)}) + '\n'
+
+
+class JobSearchAPI(Resource):
+    
+    # Number of jobs per page of search results
+    PAGE_LIMIT_DEFAULT = 20
+    PAGE_LIMIT_MAX = 100
+    
+    # Query string arguments for '/jobs/search' endpoint
+    def __init__(self):
+        self.reqparse = reqparse.RequestParser()
+        self.reqparse.add_argument('q', type=str, required=True,
+                                   help='No search query provided',
+                                   location='args')
+        for filter_field in ['seniority', 'employment_type', 'industry', 'function']:
+            self.reqparse.add_argument(filter_field, type=str, location='args')
+        self.reqparse.add_argument('limit', type=int, location='args')
+        self.reqparse.add_argument('offset', type=int, default=0, location='args')
+        self.reqparse.add_argument('fields', type=str, location='args')
+        super(JobSearchAPI, self).__init__()
+        
+        
+    def get(self):
         # Verify connection, exit if failed
         attempt_connection()
         
-        # Assign the id and HTML received from the Chrome Extension into a JobData object
         args = self.reqparse.parse_args()
-        job_args = {
-            'id': args['id'],
-            'html': args['HTML']
-        }
-        current_job = JobData(job_input_data=job_args)
-        
-        # Have the JobData object extract the relevant data fields from the raw HTML
-        current_job.extract_job_data()
-        
-        # Commit extracted data to the Postgres database and return HTML code
-        if PGHandler.insert_job(current_job.data):
-            return {'job': marshal(current_job.data, job_fields)}, 201
+        output_fields, select_fields = parse_fields(args['fields'], search_fields)
+        
+        # Ranked page of matching jobs - the offset of the next page is returned as 'next_offset', to be 
+        # passed as ?offset= (None once the last page / the last ranked match is reached)
+        limit = min(max(args['limit'] or self.PAGE_LIMIT_DEFAULT, 1), self.PAGE_LIMIT_MAX)
+        offset = args['offset']
+        if offset < 0 or offset >= PGHandler.search_max_candidates:
+            abort(400)
+        
+        job_list = PGHandler.search_jobs(args['q'], seniority=args['seniority'],
+                                         employment_type=args['employment_type'], industry=args['industry'],
+                                         function=args['function'], limit=limit, offset=offset,
+                                         fields=select_fields)
+        if job_list is None:
+            abort(504)
+        
+        next_offset = offset + limit
+        if len(job_list) < limit or next_offset >= PGHandler.search_max_candidates:
+            next_offset = None
+        return job_list_response(JobSerializer(output_fields), job_list, 'next_offset', next_offset)
+
+
+class JobRejectAPI(Resource):
+    
+    # Maximum number of job ids rejected per request
+    IDS_MAX = 1000
+    
+    # Validation arguments for '/jobs/reject' endpoint - either a list of job ids, or a title and company
+    def __init__(self):
+        self.reqparse = reqparse.RequestParser()
+        self.reqparse.add_argument('ids', type=int, action='append', location='json')
+        self.reqparse.add_argument('title', type=str, location='json')
+        self.reqparse.add_argument('company', type=str, location='json')
+        self.reqparse.add_argument('similar', type=inputs.boolean, default=False, location='json')
+        super(JobRejectAPI, self).__init__()
+        
+        
+    def post(self):
+        # Verify connection, exit if failed
+        attempt_connection()
+        
+        args = self.reqparse.parse_args()
+        
+        if args['ids'] is not None:
+            if len(args['ids']) > self.IDS_MAX:
+                abort(400)
+            rejected_jobs = PGHandler.reject_jobs(job_ids=args['ids'])
+        elif args['title'] is not None and args['company'] is not None:
+            # Rejects every job with that title and company (ignoring case), or similar ones if 'similar'
+            rejected_jobs = PGHandler.reject_jobs(title=args['title'], company=args['company'],
+                                                  similar=args['similar'])
         else:
-            abort(409)
+            abort(400)
+        
+        if rejected_jobs is None:
+            abort(504)
+        
+        response = {'job_list': [marshal(job, reject_fields) for job in rejected_jobs]}
+        if args['ids'] is not None:
+            found_ids = {job['id'] for job in rejected_jobs}
+            response['not_found'] = [job_id for job_id in args['ids'] if job_id not in found_ids]
+        return response, 200
 
 
 class JobAPI(Resource):
@@ -121,22 +527,64 @@ class JobAPI(Resource):
         
         
     def get(self, id):
+        # Only the requested fields (?fields=id,title,...) are selected - such responses are not cached
+        if request.args.get('fields') is not None:
+            output_fields, select_fields = parse_fields(request.args.get('fields'), job_fields)
+            attempt_connection()
+            selected_job = PGHandler.select_job(id, fields=select_fields)
+            if selected_job is None:
+                abort(404)
+            return job_response(JobSerializer(output_fields), selected_job)
+
+        # Serve the job's serialized response from the response cache if possible
+        cached = ResponseCache.get(id)
+        
+        if cached is not None:
+            body, etag = cached
+        else:
+            # Verify connection, exit if failed
+            attempt_connection()
+            
+            # Select data for the specific job id from the Postgres database and store to appropriate dict
+            cache_generation = ResponseCache.generation
+            selected_job = PGHandler.select_job(id)
+            
+            if selected_job == "Connection Failed":
+                abort(504)
+            elif selected_job is None:
+                abort(404)
+            
+            body = ('{"job": ' + JobSerializer(job_fields).serialize(selected_job) + '}\n').encode()
+            etag = ResponseCache.set(id, body, cache_generation)
+        
+        # Responds with 304 Not Modified (and no body) if the client's If-None-Match matches the ETag
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['X-Cache'] = 'HIT' if cached is not None else 'MISS'
+        return response.make_conditional(request)
+        
+        
+    def put(self, id):
         # Verify connection, exit if failed
         attempt_connection()
         
-        # Select data for the specific job id from the Postgres database and store to appropriate dict
-        selected_job = PGHandler.select_job(id)
+        # Flag the job as rejected
+        rejected_jobs = PGHandler.reject_jobs(job_ids=[id])
         
-        if selected_job == "Connection Failed":
+        if rejected_jobs is None:
             abort(504)
-        elif selected_job is None:
+        elif not rejected_jobs:
             abort(404)
-        else:
-            return {'job': marshal(selected_job, job_fields)}, 200
+        
+        return {'job': marshal(rejected_jobs[0], reject_fields)}, 200
         
         
 api.add_resource(JobListAPI, '/jobdataextractor/api/v1.0/jobs/', endpoint = 'jobs')
+api.add_resource(JobBatchAPI, '/jobdataextractor/api/v1.0/jobs/batch/', endpoint = 'jobs_batch')
+api.add_resource(JobSearchAPI, '/jobdataextractor/api/v1.0/jobs/search/', endpoint = 'jobs_search')
+api.add_resource(JobRejectAPI, '/jobdataextractor/api/v1.0/jobs/reject/', endpoint = 'jobs_reject')
 api.add_resource(JobAPI, '/jobdataextractor/api/v1.0/jobs/<int:id>', endpoint = 'job')
+api.add_resource(JobIngestAPI, '/jobdataextractor/api/v1.0/jobs/ingest/<int:id>', endpoint = 'job_ingest')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,239 @@
+"""
+Benchmark, correctness and regression check for the JobData parser backends.
+
+Runs JobData.extract_job_data() with every parser backend over a directory of saved LinkedIn job posting
+HTML files - by default the versioned fixture corpus in benchmarks/fixtures/pages (anonymized pages in the
+layout the extractors target, covering missing details, non-ASCII text, markup edge cases, CRLF line endings
+and a large page), so it runs offline - and:
+- checks every backend's output against the page's golden output (<page>.golden.json, next to the page), or
+  against the 'bs4' reference backend's output for pages without one
+- reports, per backend, the p50 / p95 extraction time per page (over --repeat passes), the throughput
+  (pages/s and MB/s of HTML) and the peak Python memory allocated extracting a page
+- with --baseline, compares p50 / p95 / peak memory to a baseline saved earlier (--save-baseline) on the
+  same machine, and flags any of them more than --threshold (fraction) above it
+
+Usage (from the repo's top-level directory):
+    python -m benchmarks.bench_extraction [html_dir] [--repeat N] [--baseline FILE] [--threshold 0.25]
+    python -m benchmarks.bench_extraction --save-baseline FILE    (e.g. on the main branch, before a change)
+    python -m benchmarks.bench_extraction --update-golden         (after an intended change of the output)
+Exits with a non-zero status on any output different from the golden / reference output, or regression.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+# Custom modules
+from html_processor import JobData
+from job_record import EXTRACTED_FIELDS
+
+
+REFERENCE_BACKEND = 'bs4'
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'pages')
+GOLDEN_SUFFIX = '.golden.json'
+# Fields compared to the golden outputs - id and url come from the job's input data, not from its page
+GOLDEN_FIELDS = [field for field in EXTRACTED_FIELDS if field not in ('id', 'url')]
+METRICS = ['p50_ms', 'p95_ms', 'peak_mb']
+
+
+def load_pages(html_dir):
+    """
+    Input:  Directory containing saved job posting HTML files
+    Output: List of (filename, HTML string) tuples, sorted by filename
+    """
+    pages = []
+    for filename in sorted(os.listdir(html_dir)):
+        if filename.endswith(('.html', '.htm')):
+            # newline='' - pages are extracted as saved, CRLF line endings included
+            with open(os.path.join(html_dir, filename), 'r', encoding='utf-8', newline='') as rf:
+                pages.append((filename, rf.read()))
+    return pages
+
+
+def golden_path(html_dir, filename):
+    return os.path.join(html_dir, os.path.splitext(filename)[0] + GOLDEN_SUFFIX)
+
+
+def load_golden(html_dir, filename):
+    """
+    Output: Dict of the page's golden output (GOLDEN_FIELDS), or None if it has none
+    """
+    try:
+        with open(golden_path(html_dir, filename), 'r', encoding='utf-8') as rf:
+            return json.load(rf)
+    except FileNotFoundError:
+        return None
+
+
+def save_golden(html_dir, filename, job_data):
+    with open(golden_path(html_dir, filename), 'w', encoding='utf-8') as wf:
+        json.dump(golden_output(job_data), wf, indent=2, ensure_ascii=False)
+        wf.write('\n')
+
+
+def golden_output(job_data):
+    """
+    Input:  Extracted JobRecord
+    Output: Dict of its GOLDEN_FIELDS, as stored in golden files
+    """
+    return {field: getattr(job_data, field) for field in GOLDEN_FIELDS}
+
+
+def extract(html, backend):
+    """
+    Input:  HTML string and parser backend name
+    Output: Extracted JobData.data JobRecord
+    """
+    job = JobData(job_input_data={'id': 0, 'html': html}, backend=backend)
+    job.extract_job_data()
+    return job.data
+
+
+def peak_memory(html, backend):
+    """
+    Input:  HTML string and parser backend name
+    Output: Peak memory (bytes) allocated by Python while extracting the page, excluding the HTML string itself
+            NOTE: Memory allocated by C libraries (e.g. lxml's libxml2 tree) is not traced
+    """
+    tracemalloc.start()
+    extract(html, backend)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def percentile(sorted_values, fraction):
+    """
+    Output: Nearest-rank percentile of the sorted values
+    """
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def check_outputs(html_dir, pages):
+    """
+    Check every backend's output against the pages' golden outputs (or the reference backend's output)
+    Output: Number of mismatching (backend, page) pairs
+    """
+    mismatches = 0
+    for filename, html in pages:
+        expected = load_golden(html_dir, filename)
+        source = 'golden'
+        if expected is None:
+            expected = golden_output(extract(html, REFERENCE_BACKEND))
+            source = REFERENCE_BACKEND
+        for backend in JobData.PARSER_BACKENDS:
+            # Round-trip through JSON, as golden outputs are stored
+            result = json.loads(json.dumps(golden_output(extract(html, backend))))
+            if result != expected:
+                mismatches += 1
+                print(f"MISMATCH [{backend}] {filename} (vs {source})")
+                for key in GOLDEN_FIELDS:
+                    if result.get(key) != expected.get(key):
+                        print(f"    {key}: {result.get(key)!r} != {expected.get(key)!r}")
+    return mismatches
+
+
+def measure(pages, backend, repeat):
+    """
+    Output: Dict of the backend's p50 / p95 time per page (ms), throughput (pages/s, MB/s) and
+            peak memory per page (MB)
+    """
+    # Untimed warm-up pass (imports, caches), then time from a clean heap
+    for _, html in pages:
+        extract(html, backend)
+    gc.collect()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, html in pages:
+            page_start = time.perf_counter()
+            extract(html, backend)
+            latencies.append(time.perf_counter() - page_start)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    total_bytes = repeat * sum(len(html.encode('utf-8')) for _, html in pages)
+    return {
+        'p50_ms': 1000 * percentile(latencies, 0.50),
+        'p95_ms': 1000 * percentile(latencies, 0.95),
+        'pages_per_s': len(latencies) / elapsed,
+        'mb_per_s': total_bytes / 1e6 / elapsed,
+        'peak_mb': max(peak_memory(html, backend) for _, html in pages) / 1e6,
+    }
+
+
+def check_regressions(results, baseline, threshold):
+    """
+    Output: Number of metrics (METRICS) more than threshold (fraction) above the baseline's
+    """
+    regressions = 0
+    for backend, metrics in results.items():
+        if backend not in baseline:
+            print(f"  {backend:>6}: no baseline")
+            continue
+        for metric in METRICS:
+            limit = baseline[backend][metric] * (1 + threshold)
+            if metrics[metric] > limit:
+                regressions += 1
+                print(f"REGRESSION [{backend}] {metric}: {metrics[metric]:.2f} > {limit:.2f} "
+                      f"(baseline {baseline[backend][metric]:.2f} +{100 * threshold:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('html_dir', nargs='?', default=FIXTURES_DIR, help='Directory of saved job posting HTML files')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of timed passes over the pages per backend')
+    parser.add_argument('--baseline', help='JSON file of a baseline saved with --save-baseline to compare to')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Fraction above the baseline at which p50 / p95 / peak memory is a regression '
+                             '(raise it on noisy, shared machines)')
+    parser.add_argument('--save-baseline', help='JSON file to save the results to, as a baseline')
+    parser.add_argument('--update-golden', action='store_true',
+                        help=f"(Re)write every page's golden output from the '{REFERENCE_BACKEND}' backend")
+    args = parser.parse_args()
+
+    pages = load_pages(args.html_dir)
+    if not pages:
+        sys.exit(f"No HTML files found in {args.html_dir}")
+
+    if args.update_golden:
+        for filename, html in pages:
+            save_golden(args.html_dir, filename, extract(html, REFERENCE_BACKEND))
+        print(f"Wrote {len(pages)} golden outputs from the '{REFERENCE_BACKEND}' backend - review them before committing")
+
+    mismatches = check_outputs(args.html_dir, pages)
+
+    total_bytes = sum(len(html.encode('utf-8')) for _, html in pages)
+    print(f"\n{len(pages)} pages, {total_bytes / 1e6:.2f} MB total, {args.repeat} passes")
+    results = {}
+    for backend in JobData.PARSER_BACKENDS:
+        results[backend] = metrics = measure(pages, backend, args.repeat)
+        print(f"{backend:>6}: p50 {metrics['p50_ms']:8.2f} ms, p95 {metrics['p95_ms']:8.2f} ms, "
+              f"{metrics['pages_per_s']:8.1f} pages/s, {metrics['mb_per_s']:6.2f} MB/s, "
+              f"peak Python allocations {metrics['peak_mb']:7.2f} MB/page")
+
+    regressions = 0
+    if args.baseline:
+        with open(args.baseline, 'r') as rf:
+            baseline = json.load(rf)
+        print(f"\nCompared to {args.baseline} (threshold +{100 * args.threshold:.0f}%)")
+        regressions = check_regressions(results, baseline, args.threshold)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as wf:
+            json.dump(results, wf, indent=2)
+        print(f"\nSaved the results to {args.save_baseline}")
+
+    errors = []
+    if mismatches:
+        errors.append(f"{mismatches} output(s) different from the golden / '{REFERENCE_BACKEND}' output")
+    if regressions:
+        errors.append(f"{regressions} regression(s) beyond +{100 * args.threshold:.0f}%")
+    if errors:
+        sys.exit("\n" + ", ".join(errors))
+    print("\nAll backends match the golden outputs" + (", no regressions" if args.baseline else ""))
+
+
+if __name__ == '__main__':
+    main()
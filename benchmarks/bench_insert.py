@@ -0,0 +1,193 @@
+"""
+Benchmark for PGHandler.insert_job against the original statement-per-value insert path.
+
+Inserts synthetic jobs through both paths, checks that both leave identical rows in the 'job', 'industry',
+'function' and junction tables (compared through PGHandler.select_job()), and reports the per-insert
+latency of each path - for PGHandler.insert_job, both with a warm and a cold (cleared before every insert)
+industry / function lookup cache.
+
+WARNING: Writes to (and cleans up after itself in) the database configured in the .env file - run it
+against a throwaway database initialized from DDL_job_data.sql, e.g. with POSTGRES_HOST=localhost.
+
+Usage (from the repo's top-level directory):
+    python -m benchmarks.bench_insert [--jobs N] [--values N]
+"""
+import argparse
+import statistics
+import sys
+import time
+# Psycopg2
+from psycopg2 import sql
+# Custom modules
+from postgres_handler import PGHandler
+from job_record import JobRecord, EXTRACTED_FIELDS
+
+
+# Synthetic job ids are allocated well above LinkedIn's 10-digit ids so they never collide with real jobs
+BASE_JOB_ID = 9 * 10**12
+
+
+def make_job(job_id, n_values):
+    """
+    Input:  Job id and number of industries / functions to generate
+    Output: Synthetic job data JobRecord, as extracted by JobData
+    """
+    return JobRecord(
+        id = job_id,
+        url = f"https://www.linkedin.com/jobs/view/{job_id}/",
+        title = "Benchmark Engineer",
+        company = "Benchmark Corp",
+        location = "Toronto, Ontario, Canada",
+        seniority = "Mid-Senior level",
+        industries = [f"Benchmark Industry {i}" for i in range(n_values)],
+        employment_type = "Full-time",
+        functions = [f"Benchmark Function {i}" for i in range(n_values)],
+        posting_text = "Benchmark posting text. " * 200,
+    )
+
+
+def insert_job_rowwise(job_data):
+    """
+    Original PGHandler.insert_job() statement sequence, kept here as the benchmark baseline:
+    existence check, job insert, then an INSERT / SELECT / junction INSERT per industry and function
+    """
+    if PGHandler.check_job_exists(job_data):
+        return False
+
+    job_data = {field: getattr(job_data, field) for field in EXTRACTED_FIELDS}
+    junc_data = {'industry': job_data.pop('industries'),
+                 'function': job_data.pop('functions')}
+    job_fields, job_values = zip(*job_data.items())
+
+    with PGHandler.get_cursor() as cur:
+        job_id = int(job_data['id'])
+        cur.execute(sql.SQL(PGHandler.text_insert_query).format(
+            table = sql.Identifier('job'),
+            fields = sql.SQL(",").join(map(sql.Identifier, job_fields)),
+            values = sql.SQL(",").join(sql.Placeholder() * len(job_fields)),
+            pkey = sql.Identifier('id')
+            ), job_values)
+
+        for table, values in junc_data.items():
+            junc_ids = ['job_id', table+'_id']
+            query_insert = sql.SQL(PGHandler.text_insert_query).format(
+                table = sql.Identifier(table),
+                fields = sql.Identifier('name'),
+                values = sql.Placeholder(),
+                pkey = sql.Identifier('name')
+                )
+            query_select = sql.SQL(PGHandler.text_select_query).format(
+                table = sql.Identifier(table),
+                field = sql.Identifier('id'),
+                field_where = sql.Identifier('name'),
+                value = sql.Placeholder()
+                )
+            query_insert_junction = sql.SQL(PGHandler.text_insert_query).format(
+                table = sql.Identifier('job_'+table),
+                fields = sql.SQL(",").join(sql.Identifier(n) for n in junc_ids),
+                values = sql.SQL(",").join(sql.Placeholder() * len(junc_ids)),
+                pkey = sql.SQL(",").join(sql.Identifier(n) for n in junc_ids),
+                )
+            if values is None:
+                cur.execute(query_insert_junction, (job_id, 1))
+            else:
+                for value in values:
+                    cur.execute(query_insert, (value,))
+                    cur.execute(query_select, (value,))
+                    current_id = cur.fetchone()['id']
+                    cur.execute(query_insert_junction, (job_id, current_id))
+    return True
+
+
+def insert_job_uncached(job_data):
+    """
+    PGHandler.insert_job() with the industry / function lookup cache cleared, so every name is resolved
+    through the database
+    """
+    PGHandler.lookup_cache.clear()
+    return PGHandler.insert_job(job_data)
+
+
+def normalize(job):
+    """
+    Input:  JobRecord returned by PGHandler.select_job()
+    Output: Comparable dict, without the fields that differ between two inserts of the same job
+    """
+    job = job._asdict()
+    for key in ['id', 'url', 'time_add']:
+        job.pop(key)
+    job['industries'] = sorted(job['industries'], key=str)
+    job['functions'] = sorted(job['functions'], key=str)
+    return job
+
+
+def time_inserts(insert, job_ids, n_values):
+    """
+    Output: List of per-insert latencies (seconds)
+    """
+    latencies = []
+    for job_id in job_ids:
+        job = make_job(job_id, n_values)
+        start = time.perf_counter()
+        insert(job)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def cleanup():
+    """
+    Remove every synthetic job (and its junction rows) and synthetic industry / function from the database
+    """
+    with PGHandler.get_cursor() as cur:
+        cur.execute("DELETE FROM job WHERE id >= %s;", (BASE_JOB_ID,))
+        cur.execute("DELETE FROM industry WHERE name LIKE 'Benchmark Industry %%';")
+        cur.execute("DELETE FROM function WHERE name LIKE 'Benchmark Function %%';")
+    # The deleted names' ids are no longer valid
+    PGHandler.lookup_cache.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=200, help='Number of jobs inserted through each path')
+    parser.add_argument('--values', type=int, default=3, help='Number of industries / functions per job')
+    args = parser.parse_args()
+
+    error = PGHandler.init_connection_pool()
+    if not PGHandler.connection_status:
+        sys.exit(error)
+    cleanup()
+
+    try:
+        # Correctness - the same job inserted through both paths must read back identically
+        PGHandler.insert_job(make_job(BASE_JOB_ID, args.values))
+        insert_job_rowwise(make_job(BASE_JOB_ID + 1, args.values))
+        # Jobs without industries / functions go through the default 'NULL' rows
+        PGHandler.insert_job(make_job(BASE_JOB_ID + 2, 0)._replace(industries=None, functions=None))
+        insert_job_rowwise(make_job(BASE_JOB_ID + 3, 0)._replace(industries=None, functions=None))
+
+        for batched_id, rowwise_id in [(BASE_JOB_ID, BASE_JOB_ID + 1), (BASE_JOB_ID + 2, BASE_JOB_ID + 3)]:
+            if normalize(PGHandler.select_job(batched_id)) != normalize(PGHandler.select_job(rowwise_id)):
+                sys.exit(f"MISMATCH between batched job {batched_id} and row-wise job {rowwise_id}")
+        print("Batched and row-wise inserts produce identical rows")
+
+        # Latency - alternate between fresh id ranges for each path
+        ids = range(BASE_JOB_ID + 10, BASE_JOB_ID + 10 + 3 * args.jobs)
+        results = {
+            'row-wise': time_inserts(insert_job_rowwise, ids[0::3], args.values),
+            'uncached': time_inserts(insert_job_uncached, ids[1::3], args.values),
+            'batched': time_inserts(PGHandler.insert_job, ids[2::3], args.values),
+        }
+
+        print(f"\n{args.jobs} inserts per path, {args.values} industries + {args.values} functions per job")
+        for name, latencies in results.items():
+            latencies.sort()
+            print(f"{name:>9}: mean {1000 * statistics.mean(latencies):7.2f} ms, "
+                  f"p50 {1000 * latencies[len(latencies) // 2]:7.2f} ms, "
+                  f"p95 {1000 * latencies[int(len(latencies) * 0.95)]:7.2f} ms")
+        print(f"\nLookup cache: {PGHandler.lookup_cache.stats()}")
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
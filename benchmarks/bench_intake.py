@@ -0,0 +1,134 @@
+"""
+Benchmark for the job posting intake of POST /jobs/ - the whole page as a JSON document (the Chrome Extension's
+original request) against the pruned page, gzip-compressed, as a 'text/html' body (see chrome_extension/content.js,
+background.js and request_decoding.py).
+
+For every saved page (by default the fixture corpus of bench_extraction.py), prunes it the way content.js does -
+the header card and the article tag - and checks the pruned page extracts to the same job data as the whole page.
+Then reports, per page and in total:
+- the bytes on the wire of both requests' bodies
+- the server's decode time: the JSON document parsed by the endpoint's reqparse (original) against the body
+  decoded by GzipRequestMiddleware as it is read (new)
+- the server's decode + extraction time: the whole page extracted by the extraction pool's default backend
+  (original) against the decoded body fed straight to the 'stream' backend (new)
+No database is required.
+
+Usage (from the repo's top-level directory):
+    python -m benchmarks.bench_intake [html_dir] [--repeat 20]
+"""
+import argparse
+import gzip
+import json
+import sys
+import time
+# lxml
+import lxml.html
+from lxml import etree
+# Werkzeug
+from werkzeug.test import EnvironBuilder
+# Custom modules
+from html_processor import JobData
+from request_decoding import GzipRequestMiddleware
+from benchmarks.bench_extraction import FIXTURES_DIR, load_pages, golden_output
+
+
+def prune(html):
+    """
+    Input:  HTML string of a whole job posting page
+    Output: HTML string of its header card and article tag, as posted by the Chrome Extension (see
+            prunedPostingHTML() in chrome_extension/content.js)
+    """
+    root = lxml.html.document_fromstring(html)
+    article = root.find('.//article')
+    header = next((div for div in root.iter('div') if div.get('class') is not None
+                   and all(c in JobData.HEADER_CLASSES for c in div.get('class').split())), None)
+    if article is None or header is None:
+        return html
+    return ('<html><body>' + etree.tostring(header, encoding='unicode', method='html', with_tail=False)
+            + etree.tostring(article, encoding='unicode', method='html', with_tail=False) + '</body></html>')
+
+
+def best_time(function, repeat):
+    """
+    Output: Best time (seconds) of repeated calls to the function
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('html_dir', nargs='?', default=FIXTURES_DIR, help='Directory of saved job posting HTML files')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of timed calls per page and path')
+    args = parser.parse_args()
+
+    pages = load_pages(args.html_dir)
+    if not pages:
+        sys.exit(f"No HTML files found in {args.html_dir}")
+
+    # The API initializes its database connection pool on import - only its request parsing is used here
+    from api_linkedin_extractor import app, JobListAPI
+
+    def decode_json(body):
+        with app.test_request_context('/jobdataextractor/api/v1.0/jobs/', method='POST', data=body,
+                                      content_type='application/json'):
+            return JobListAPI().reqparse.parse_args()['HTML']
+
+    def extract_json(body):
+        job = JobData(job_input_data={'id': 0, 'html': decode_json(body)})
+        job.extract_job_data()
+        return job.data
+
+    # Middleware around an application reading the decoded body with the function passed in the environ
+    middleware = GzipRequestMiddleware(lambda environ, start_response: environ['bench.read'](environ['wsgi.input']))
+
+    def through_middleware(body, read):
+        environ = EnvironBuilder(path='/jobdataextractor/api/v1.0/jobs/?id=0', method='POST', data=body,
+                                 headers={'Content-Type': 'text/html', 'Content-Encoding': 'gzip'}).get_environ()
+        environ['bench.read'] = read
+        return middleware(environ, None)
+
+    def extract_stream(stream):
+        job = JobData(job_input_data={'id': 0, 'html': stream}, backend='stream')
+        job.extract_job_data()
+        return job.data
+
+    mismatches = 0
+    totals = [0] * 6
+    print(f"{'page':>28} {'JSON body':>10} {'gzip body':>10}   decode: {'JSON':>8} {'gzip':>8}"
+          f"   + extract: {'JSON':>8} {'gzip':>8}")
+    for filename, html in pages:
+        json_body = json.dumps({'id': 0, 'HTML': html}).encode()
+        gzip_body = gzip.compress(prune(html).encode('utf-8'))
+
+        # The pruned page must extract to the same job data as the whole page
+        if golden_output(extract_json(json_body)) != golden_output(through_middleware(gzip_body, extract_stream)):
+            mismatches += 1
+            print(f"MISMATCH {filename}: the pruned page extracts to different job data")
+
+        results = [len(json_body), len(gzip_body),
+                   best_time(lambda: decode_json(json_body), args.repeat),
+                   best_time(lambda: through_middleware(gzip_body, lambda stream: stream.read()), args.repeat),
+                   best_time(lambda: extract_json(json_body), args.repeat),
+                   best_time(lambda: through_middleware(gzip_body, extract_stream), args.repeat)]
+        totals = [total + result for total, result in zip(totals, results)]
+        print(f"{filename[:28]:>28} {results[0] / 1024:7.1f} kB {results[1] / 1024:7.1f} kB   "
+              f"{1000 * results[2]:11.2f} ms {1000 * results[3]:5.2f} ms   {1000 * results[4]:14.2f} ms "
+              f"{1000 * results[5]:5.2f} ms")
+
+    print(f"{'total':>28} {totals[0] / 1024:7.1f} kB {totals[1] / 1024:7.1f} kB   "
+          f"{1000 * totals[2]:11.2f} ms {1000 * totals[3]:5.2f} ms   {1000 * totals[4]:14.2f} ms "
+          f"{1000 * totals[5]:5.2f} ms")
+    print(f"Bytes on the wire x{totals[0] / totals[1]:.1f} smaller, decode x{totals[2] / totals[3]:.1f} faster, "
+          f"decode + extract x{totals[4] / totals[5]:.1f} faster")
+
+    if mismatches:
+        sys.exit(f"{mismatches} pruned page(s) extract to different job data")
+
+
+if __name__ == '__main__':
+    main()
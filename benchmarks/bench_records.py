@@ -0,0 +1,151 @@
+"""
+Benchmark for JobRecord (job_record.py) against the dicts jobs' data used to be passed around as.
+
+Measures with tracemalloc, on synthetic jobs (see bench_select.seed(), ~5k character posting texts):
+- 'insert values' : the values of the insert_job statement built from an extracted job - originally a deep
+                    copy of the JobData.data dict (posting text included) to pop its industries / functions,
+                    now read from the JobRecord as-is (PGHandler.build_insert_query(), warm lookup cache)
+- 'page rows'     : a page of --limit jobs selected by the select_data_page statement - originally fetched
+                    through a RealDictCursor (a dict per row), now as JobRecords from a tuple cursor
+                    (PGHandler.select_jobs_page())
+and reports the peak memory allocated while building them, the memory they retain (per job), and the time
+per call. Then reports the peak memory allocated by whole requests through the API's test client
+(GET /jobs/?limit=, GET /jobs/<id> with the response cache off) - compare across revisions.
+
+WARNING: Writes to (and cleans up after itself in) the database configured in the .env file - run it
+against a throwaway database initialized from DDL_job_data.sql, e.g. with POSTGRES_HOST=localhost.
+
+Usage (from the repo's top-level directory):
+    python -m benchmarks.bench_records [--jobs 2000] [--limit 100] [--calls 200]
+"""
+import argparse
+import copy
+import gc
+import sys
+import time
+import tracemalloc
+# Custom modules
+from postgres_handler import PGHandler
+from response_cache import ResponseCache
+from benchmarks.bench_insert import BASE_JOB_ID, make_job, cleanup
+from benchmarks.bench_select import seed
+
+
+def insert_values_dict(cur, job_data):
+    """
+    Original PGHandler.build_insert_query() values, from a JobData.data dict
+    """
+    job_data = copy.deepcopy(job_data)
+    junc_data = {'industry': job_data.pop('industries'),
+                 'function': job_data.pop('functions')}
+    job_fields, job_values = zip(*job_data.items())
+    query_values = dict(zip(job_fields, job_values))
+    for table, values in junc_data.items():
+        query_values[table+'_ids'] = [1] if values is None else PGHandler.resolve_name_ids(cur, table, values)
+    return query_values
+
+
+def insert_values_record(cur, job_data):
+    return PGHandler.build_insert_query(cur, job_data)[1]
+
+
+def page_rows_dict(after_id, limit):
+    """
+    Original PGHandler.select_jobs_page(), rows fetched through a RealDictCursor
+    """
+    with PGHandler.get_cursor() as cur:
+        PGHandler.statements.execute(cur, 'select_data_page', {'after_id': after_id, 'limit': limit})
+        return cur.fetchall()
+
+
+def page_rows_record(after_id, limit):
+    return PGHandler.select_jobs_page(after_id=after_id, limit=limit)
+
+
+def measure(function, args_list):
+    """
+    Output: Tuple of (mean peak bytes allocated per call, mean bytes retained by each call's result,
+            mean seconds per call - timed without tracing)
+    """
+    peaks, retained = [], []
+    for args in args_list:
+        gc.collect()
+        tracemalloc.start()
+        start_size = tracemalloc.get_traced_memory()[0]
+        result = function(*args)
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak - start_size)
+        retained.append(size - start_size)
+        del result
+
+    start = time.perf_counter()
+    for args in args_list:
+        function(*args)
+    return (sum(peaks) / len(peaks), sum(retained) / len(retained),
+            (time.perf_counter() - start) / len(args_list))
+
+
+def measure_request(client, url, calls):
+    """
+    Output: Mean peak bytes allocated per request
+    """
+    peaks = []
+    for _ in range(calls):
+        gc.collect()
+        tracemalloc.start()
+        client.get(url).close()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=2000, help='Number of synthetic jobs')
+    parser.add_argument('--limit', type=int, default=100, help='Number of jobs per page')
+    parser.add_argument('--calls', type=int, default=200, help='Number of calls per path')
+    args = parser.parse_args()
+
+    error = PGHandler.init_connection_pool()
+    if not PGHandler.connection_status:
+        sys.exit(error)
+    cleanup()
+
+    try:
+        seed(0, args.jobs)
+        after_ids = [(BASE_JOB_ID + (i * args.limit) % (args.jobs - args.limit), args.limit)
+                     for i in range(args.calls)]
+        jobs = [make_job(BASE_JOB_ID + args.jobs + i, 3) for i in range(args.calls)]
+
+        print(f"{args.calls} calls per path (peak allocated / retained per call, time per call)")
+        with PGHandler.get_cursor() as cur:
+            # Warm the lookup cache, so neither path reaches the database
+            insert_values_record(cur, jobs[0])
+            results = {
+                'insert values, dict': measure(insert_values_dict, [(cur, job._asdict()) for job in jobs]),
+                'insert values, record': measure(insert_values_record, [(cur, job) for job in jobs]),
+            }
+        results[f'page of {args.limit} rows, dict'] = measure(page_rows_dict, after_ids)
+        results[f'page of {args.limit} rows, record'] = measure(page_rows_record, after_ids)
+        for name, (peak, retained, seconds) in results.items():
+            per_job = retained / args.limit if 'page' in name else retained
+            print(f"  {name:>28}: peak {peak / 1024:8.1f} kB, retained {per_job:8.0f} B / job, "
+                  f"{1e6 * seconds:8.1f} us")
+
+        # Whole requests, through the API
+        from api_linkedin_extractor import app
+        client = app.test_client()
+        # Serve every GET /jobs/<id> from the database (i.e. RESPONSE_CACHE_BACKEND=off)
+        ResponseCache.backend = None
+        prefix = '/jobdataextractor/api/v1.0/jobs/'
+        print(f"\nPeak allocated per request (mean of {args.calls // 10}):")
+        for url in [f"{prefix}?after_id={BASE_JOB_ID}&limit={args.limit}", f"{prefix}{BASE_JOB_ID}"]:
+            client.get(url).close()
+            print(f"  GET {url[len(prefix) - 6:]:>36}: {measure_request(client, url, args.calls // 10) / 1024:8.1f} kB")
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
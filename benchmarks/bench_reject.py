@@ -0,0 +1,106 @@
+"""
+Benchmark for PGHandler.reject_jobs (PUT /jobs/<id>, POST /jobs/reject/) as the number of jobs grows.
+
+Seeds the database with synthetic jobs in steps (e.g. 10k, 100k jobs, see bench_select.seed()), and reports the
+latency of rejects at every step:
+- 'ids'            : a batch of --batch job ids
+- 'title/company'  : a title and company, ignoring case (through the job_lower_title_company_idx index)
+- 'similar'        : a misspelled title and company, by trigram similarity (only if pg_trgm is installed)
+- 'original ILIKE' : the title / company lookup PGHandler.update_rejected() used to run, kept as the baseline
+Rejects should stay in milliseconds at every step, while the original lookup scans the whole job table.
+
+WARNING: Writes to (and cleans up after itself in) the database configured in the .env file - run it
+against a throwaway database initialized from DDL_job_data.sql, e.g. with POSTGRES_HOST=localhost.
+
+Usage (from the repo's top-level directory):
+    python -m benchmarks.bench_reject [--jobs 10000 100000] [--rejects N]
+"""
+import argparse
+import random
+import sys
+import time
+# Custom modules
+from postgres_handler import PGHandler
+from benchmarks.bench_insert import BASE_JOB_ID, cleanup
+from benchmarks.bench_select import seed
+
+
+# Original PGHandler.update_rejected() lookup, kept here as the benchmark baseline
+text_select_from_title_company = """
+SELECT id FROM job
+WHERE title ILIKE %(title)s
+AND company ILIKE %(company)s;
+"""
+
+
+def has_pg_trgm():
+    with PGHandler.get_cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm';")
+        return cur.fetchone() is not None
+
+
+def reject_original(title, company):
+    """
+    Original update_rejected() lookup, followed by the same reject
+    """
+    with PGHandler.get_cursor() as cur:
+        cur.execute(text_select_from_title_company, {'title': title, 'company': company})
+        job_ids = [row['id'] for row in cur.fetchall()]
+    return PGHandler.reject_jobs(job_ids=job_ids)
+
+
+def format_latencies(latencies):
+    latencies = sorted(latencies)
+    return (f"p50 {1000 * latencies[len(latencies) // 2]:8.2f} ms, "
+            f"p95 {1000 * latencies[int(len(latencies) * 0.95)]:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[10000, 100000],
+                        help='Number of synthetic jobs in the database at each step')
+    parser.add_argument('--rejects', type=int, default=50, help='Number of rejects per reject type and step')
+    parser.add_argument('--batch', type=int, default=100, help='Number of job ids per reject by ids')
+    args = parser.parse_args()
+
+    error = PGHandler.init_connection_pool()
+    if not PGHandler.connection_status:
+        sys.exit(error)
+    cleanup()
+
+    # Synthetic jobs are titled 'Benchmark Engineer <n>', at 'Benchmark Corp'
+    rejects = {
+        'ids': lambda n: PGHandler.reject_jobs(
+            job_ids=[BASE_JOB_ID + random.randrange(n) for _ in range(args.batch)]),
+        'title/company': lambda n: PGHandler.reject_jobs(
+            title=f"benchmark engineer {random.randrange(n)}", company='BENCHMARK CORP'),
+        'similar': lambda n: PGHandler.reject_jobs(
+            title=f"Benchmark Enginer {random.randrange(n)}", company='Benchmark Corporation', similar=True),
+        'original ILIKE': lambda n: reject_original(f"benchmark engineer {random.randrange(n)}", 'BENCHMARK CORP'),
+    }
+    if not has_pg_trgm():
+        print("pg_trgm extension not installed (see migrations/003_job_reject_indexes.sql), skipping 'similar'")
+        del rejects['similar']
+
+    try:
+        seeded = 0
+        for n_jobs in sorted(args.jobs):
+            seed(seeded, n_jobs)
+            seeded = n_jobs
+            with PGHandler.get_cursor() as cur:
+                cur.execute("ANALYZE job;")
+
+            print(f"\n{n_jobs} jobs:")
+            for name, reject in rejects.items():
+                latencies, n_matched = [], 0
+                for _ in range(args.rejects):
+                    start = time.perf_counter()
+                    n_matched += len(reject(n_jobs))
+                    latencies.append(time.perf_counter() - start)
+                print(f"  {name:>14}: {format_latencies(latencies)}, {n_matched / args.rejects:6.1f} jobs / reject")
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark for PGHandler.search_jobs (GET /jobs/search/) as the number of job postings grows.
+
+Seeds the database with synthetic postings in steps (e.g. 100k, 1M jobs) - posting texts of --words words drawn
+from a vocabulary of --vocabulary words with a Zipf-like distribution (a few words appear in almost every
+posting, most in very few) - and reports the latency of searches for words of each frequency band, with and
+without filters, at every step. Latencies should stay within the search's latency budget (SEARCH_TIMEOUT_MS
+in .env) at every step, as only the first SEARCH_MAX_CANDIDATES matches of a search are ranked.
+NOTE: Phrase searches of common words ('"w3 w5"') are the exception - the index finds the postings containing
+both words, but whether they are adjacent is only known from each posting's search_vector, so many postings
+may be read to find the candidates. Beyond the budget, the API cancels the search (504).
+
+WARNING: Writes to (and cleans up after itself in) the database configured in the .env file - run it
+against a throwaway database initialized from DDL_job_data.sql, e.g. with POSTGRES_HOST=localhost.
+Seeding 1M postings takes a while, and about 2GB of disk space.
+
+Usage (from the repo's top-level directory):
+    python -m benchmarks.bench_search [--jobs 100000 1000000] [--searches N]
+"""
+import argparse
+import random
+import sys
+import time
+# Psycopg2
+from psycopg2 import sql
+# Custom modules
+from postgres_handler import PGHandler
+from benchmarks.bench_insert import BASE_JOB_ID, cleanup
+from benchmarks.bench_select import N_NAMES
+
+
+SENIORITIES = ['Entry level', 'Associate', 'Mid-Senior level', 'Director']
+
+
+def seed(first, last, n_words, vocabulary, chunk_size=100000):
+    """
+    Insert synthetic jobs BASE_JOB_ID + first ... BASE_JOB_ID + last - 1 (and their junction rows, see
+    bench_select.seed()), with posting texts of n_words words 'w<k>', k drawn with P(k) ~ 1/k
+    """
+    with PGHandler.get_cursor() as cur:
+        for table in ['industry', 'function']:
+            cur.execute(sql.SQL("""
+                INSERT INTO {table} (name)
+                SELECT 'Benchmark ' || initcap({table_name}) || ' ' || g FROM generate_series(0, %s) g
+                ON CONFLICT (name) DO NOTHING;
+                """).format(table = sql.Identifier(table), table_name = sql.Literal(table)), (N_NAMES - 1,))
+
+    # Committed in chunks, so seeding does not hold a single long transaction
+    for chunk_first in range(first, last, chunk_size):
+        chunk_last = min(chunk_first + chunk_size, last)
+        values = {'base': BASE_JOB_ID, 'first': chunk_first, 'last': chunk_last, 'n': N_NAMES,
+                  'n_words': n_words, 'vocabulary': vocabulary, 'seniorities': SENIORITIES}
+        with PGHandler.get_cursor() as cur:
+            cur.execute("""
+                INSERT INTO job (id, url, title, company, location, seniority, employment_type, posting_text)
+                SELECT %(base)s + g, 'https://www.linkedin.com/jobs/view/' || (%(base)s + g) || '/',
+                       'Benchmark Engineer ' || g, 'Benchmark Corp', 'Toronto, Ontario, Canada',
+                       (%(seniorities)s::varchar[])[1 + g %% 4], 'Full-time',
+                       array_to_string(ARRAY(
+                           SELECT 'w' || floor(exp(random() * ln(%(vocabulary)s)))::int
+                           FROM generate_series(1, %(n_words)s)
+                           WHERE g IS NOT NULL), ' ')
+                FROM generate_series(%(first)s, %(last)s - 1) g;
+                """, values)
+
+            for table in ['industry', 'function']:
+                cur.execute(sql.SQL("""
+                    INSERT INTO {junction_table} (job_id, {junction_field})
+                    SELECT %(base)s + g, {table}.id
+                    FROM generate_series(%(first)s, %(last)s - 1) g
+                    INNER JOIN {table}
+                    ON {table}.name IN ('Benchmark ' || initcap({table_name}) || ' ' || (g %% %(n)s),
+                                        'Benchmark ' || initcap({table_name}) || ' ' || ((g + 1) %% %(n)s));
+                    """).format(junction_table = sql.Identifier('job_'+table),
+                                junction_field = sql.Identifier(table+'_id'),
+                                table = sql.Identifier(table),
+                                table_name = sql.Literal(table)), values)
+        print(f"  seeded {chunk_last} jobs", flush=True)
+
+    with PGHandler.get_cursor() as cur:
+        cur.execute("ANALYZE job, job_industry, job_function;")
+
+
+def word(low, high):
+    """
+    Output: Random vocabulary word of rank in [low, high) - the lower the rank, the more frequent the word
+    """
+    return f"w{random.randrange(low, high)}"
+
+
+def make_searches(vocabulary):
+    """
+    Output: Dict of search name: function returning the keyword arguments of a random search
+    """
+    rare = (vocabulary // 2, vocabulary)
+    medium = (500, 2000)
+    common = (1, 10)
+    return {
+        'rare word': lambda: {'query': word(*rare)},
+        'medium word': lambda: {'query': word(*medium)},
+        'common word': lambda: {'query': word(*common)},
+        'two medium words': lambda: {'query': f"{word(*medium)} {word(*medium)}"},
+        'phrase': lambda: {'query': f'"{word(*common)} {word(*common)}"'},
+        'common + seniority': lambda: {'query': word(*common), 'seniority': random.choice(SENIORITIES)},
+        'medium + industry': lambda: {'query': word(*medium),
+                                      'industry': f"Benchmark Industry {random.randrange(N_NAMES)}"},
+        'common, page 50': lambda: {'query': word(*common), 'offset': 49 * 20},
+    }
+
+
+def format_latencies(latencies, budget):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95)]
+    return (f"p50 {1000 * latencies[len(latencies) // 2]:8.2f} ms, p95 {1000 * p95:8.2f} ms"
+            + ("" if p95 <= budget else "  OVER BUDGET"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[100000, 1000000],
+                        help='Number of synthetic jobs in the database at each step')
+    parser.add_argument('--searches', type=int, default=50, help='Number of searches per search type and step')
+    parser.add_argument('--words', type=int, default=150, help='Number of words per posting text')
+    parser.add_argument('--vocabulary', type=int, default=50000, help='Number of distinct words')
+    args = parser.parse_args()
+
+    error = PGHandler.init_connection_pool()
+    if not PGHandler.connection_status:
+        sys.exit(error)
+    cleanup()
+
+    # Time searches to completion, and compare them to the budget they are cancelled after by the API
+    budget = PGHandler.search_timeout_ms / 1000
+    PGHandler.search_timeout_ms = 0
+    searches = make_searches(args.vocabulary)
+
+    try:
+        seeded = 0
+        for n_jobs in sorted(args.jobs):
+            seed(seeded, n_jobs, args.words, args.vocabulary)
+            seeded = n_jobs
+
+            print(f"\n{n_jobs} jobs (budget {1000 * budget:.0f} ms, "
+                  f"{PGHandler.search_max_candidates} candidates ranked at most):")
+            for name, make_search in searches.items():
+                latencies, n_results = [], 0
+                for _ in range(args.searches):
+                    search = make_search()
+                    start = time.perf_counter()
+                    n_results += len(PGHandler.search_jobs(**search))
+                    latencies.append(time.perf_counter() - start)
+                print(f"  {name:>19}: {format_latencies(latencies, budget)}, "
+                      f"{n_results / args.searches:5.1f} results / search")
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
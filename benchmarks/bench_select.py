@@ -0,0 +1,190 @@
+"""
+Benchmark for PGHandler.select_job against the original whole-database aggregate query.
+
+Seeds the database with synthetic jobs in steps (e.g. 10k, 50k, 100k jobs), checks that both queries return
+identical rows, and reports the latency of single job lookups through each query (and of a page of jobs
+through PGHandler.select_jobs_page()) at every step - lookups through PGHandler should stay flat as the
+number of jobs grows.
+Lookups are also timed as prepared statements with a generic plan (i.e. planned without the job id's value,
+as with server-side prepared statements), where the original query's job id filter cannot be pushed down
+into its aggregates.
+
+WARNING: Writes to (and cleans up after itself in) the database configured in the .env file - run it
+against a throwaway database initialized from DDL_job_data.sql, e.g. with POSTGRES_HOST=localhost.
+
+Usage (from the repo's top-level directory):
+    python -m benchmarks.bench_select [--jobs 10000 50000 100000] [--lookups N]
+"""
+import argparse
+import random
+import sys
+import time
+# Psycopg2
+from psycopg2 import sql
+# Custom modules
+from postgres_handler import PGHandler
+from benchmarks.bench_insert import BASE_JOB_ID, cleanup
+
+
+# Original PGHandler.select_job() query, kept here as the benchmark baseline
+text_select_all_data_query = """
+SELECT job.*, sub_f.functions, sub_i.industries
+FROM job
+INNER JOIN
+    (SELECT job_function.job_id, array_agg(function.name) as functions
+    FROM job_function
+    INNER JOIN function
+    ON function.id = job_function.function_id
+    GROUP BY job_function.job_id) sub_f
+ON job.id = sub_f.job_id
+INNER JOIN
+    (SELECT job_industry.job_id, array_agg(industry.name) as industries
+    FROM job_industry
+    INNER JOIN industry
+    ON industry.id = job_industry.industry_id
+    GROUP BY job_industry.job_id) sub_i
+ON job.id = sub_i.job_id
+WHERE ({value} IS NULL OR job.id = {value});
+"""
+
+# Synthetic jobs are linked to 2 of N_NAMES industries and functions each
+N_NAMES = 50
+
+
+def seed(first, last):
+    """
+    Insert synthetic jobs BASE_JOB_ID + first ... BASE_JOB_ID + last - 1 (and their junction rows)
+    """
+    with PGHandler.get_cursor() as cur:
+        for table in ['industry', 'function']:
+            cur.execute(sql.SQL("""
+                INSERT INTO {table} (name)
+                SELECT 'Benchmark ' || initcap({table_name}) || ' ' || g FROM generate_series(0, %s) g
+                ON CONFLICT (name) DO NOTHING;
+                """).format(table = sql.Identifier(table), table_name = sql.Literal(table)), (N_NAMES - 1,))
+
+        cur.execute("""
+            INSERT INTO job (id, url, title, company, location, seniority, employment_type, posting_text)
+            SELECT %(base)s + g, 'https://www.linkedin.com/jobs/view/' || (%(base)s + g) || '/',
+                   'Benchmark Engineer ' || g, 'Benchmark Corp', 'Toronto, Ontario, Canada',
+                   'Mid-Senior level', 'Full-time', repeat('Benchmark posting text. ', 200)
+            FROM generate_series(%(first)s, %(last)s - 1) g;
+            """, {'base': BASE_JOB_ID, 'first': first, 'last': last})
+
+        for table in ['industry', 'function']:
+            cur.execute(sql.SQL("""
+                INSERT INTO {junction_table} (job_id, {junction_field})
+                SELECT job.id, {table}.id
+                FROM generate_series(%(first)s, %(last)s - 1) g
+                INNER JOIN job ON job.id = %(base)s + g
+                INNER JOIN {table}
+                ON {table}.name IN ('Benchmark ' || initcap({table_name}) || ' ' || (g %% %(n)s),
+                                    'Benchmark ' || initcap({table_name}) || ' ' || ((g + 1) %% %(n)s));
+                """).format(junction_table = sql.Identifier('job_'+table),
+                            junction_field = sql.Identifier(table+'_id'),
+                            table = sql.Identifier(table),
+                            table_name = sql.Literal(table)),
+                {'base': BASE_JOB_ID, 'first': first, 'last': last, 'n': N_NAMES})
+        cur.execute("ANALYZE job, job_industry, job_function;")
+
+
+def select_job_legacy(job_id):
+    """
+    Original PGHandler.select_job() for a single job id
+    """
+    with PGHandler.get_cursor() as cur:
+        cur.execute(sql.SQL(text_select_all_data_query).format(value = sql.Placeholder()), (job_id, job_id))
+        return cur.fetchone()
+
+
+def time_prepared(query_text, job_ids):
+    """
+    Input:  Single job query (with a {value} placeholder for the job id) and list of (job id,) tuples
+    Output: List of per-lookup latencies (seconds) of the query as a generically planned prepared statement
+    """
+    columns, junctions = PGHandler.build_select_columns()
+    query = sql.SQL(query_text.strip().rstrip(';')).format(value = sql.SQL("$1"), columns = columns,
+                                                           junctions = junctions)
+    with PGHandler.get_cursor() as cur:
+        cur.execute("SET LOCAL plan_cache_mode = force_generic_plan;")
+        cur.execute(sql.SQL("PREPARE bench_select (bigint) AS ") + query)
+        latencies = time_calls(lambda job_id: (cur.execute("EXECUTE bench_select (%s);", (job_id,)),
+                                               cur.fetchall()), job_ids)
+        cur.execute("DEALLOCATE bench_select;")
+    return latencies
+
+
+def normalize(job):
+    """
+    Input:  Row returned by the original query, or JobRecord returned by PGHandler.select_job()
+    Output: Comparable dict (array_agg does not guarantee the order of industries / functions, the original
+            query's job.* includes the search_vector column, and JobRecords a search's rank)
+    """
+    job = dict(job) if isinstance(job, dict) else job._asdict()
+    job.pop('search_vector', None)
+    job.pop('rank', None)
+    job['industries'] = sorted(job['industries'], key=str)
+    job['functions'] = sorted(job['functions'], key=str)
+    return job
+
+
+def time_calls(function, args_list):
+    """
+    Output: List of per-call latencies (seconds)
+    """
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        function(*args)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def format_latencies(latencies):
+    latencies = sorted(latencies)
+    return (f"p50 {1000 * latencies[len(latencies) // 2]:8.2f} ms, "
+            f"p95 {1000 * latencies[int(len(latencies) * 0.95)]:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[10000, 50000, 100000],
+                        help='Number of synthetic jobs in the database at each step')
+    parser.add_argument('--lookups', type=int, default=100, help='Number of single job lookups per step')
+    args = parser.parse_args()
+
+    error = PGHandler.init_connection_pool()
+    if not PGHandler.connection_status:
+        sys.exit(error)
+    cleanup()
+
+    try:
+        seeded = 0
+        for n_jobs in sorted(args.jobs):
+            seed(seeded, n_jobs)
+            seeded = n_jobs
+            job_ids = [(BASE_JOB_ID + random.randrange(n_jobs),) for _ in range(args.lookups)]
+
+            # Correctness - both queries must return the same rows
+            for job_id, in job_ids[:10]:
+                if normalize(select_job_legacy(job_id)) != normalize(PGHandler.select_job(job_id)):
+                    sys.exit(f"MISMATCH between the original and current query for job {job_id}")
+
+            legacy = time_calls(select_job_legacy, job_ids[:max(1, args.lookups // 10)])
+            current = time_calls(PGHandler.select_job, job_ids)
+            legacy_prepared = time_prepared(text_select_all_data_query, job_ids[:max(1, args.lookups // 10)])
+            current_prepared = time_prepared(PGHandler.text_select_job_data_query, job_ids)
+            page = time_calls(lambda job_id: PGHandler.select_jobs_page(after_id=job_id, limit=100), job_ids)
+
+            print(f"\n{n_jobs} jobs:")
+            print(f"  select_job (original): {format_latencies(legacy)}")
+            print(f"  select_job           : {format_latencies(current)}")
+            print(f"  prepared (original)  : {format_latencies(legacy_prepared)}")
+            print(f"  prepared             : {format_latencies(current_prepared)}")
+            print(f"  select_jobs_page(100): {format_latencies(page)}")
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark for JobSerializer (job_serializer.py) against Flask-RESTful's marshal() + json.dumps(), the way the API
+serialized job responses before.
+
+Serializes pages of synthetic jobs (with junction lists, missing values as None, non-ASCII text) through both
+paths - as JobRecords for the serializer, as dicts (i.e. the database rows the API used to marshal) for
+marshal() - within a request context of the API, and reports:
+- whether both paths output the same bytes, for every job and for the 'rank' / projected field sets
+- the time per page of --limit jobs and per job, for every field and for a list view's fields
+No database is required.
+
+Usage (from the repo's top-level directory):
+    python -m benchmarks.bench_serialize [--limit 100] [--pages 200] [--chars 4000]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+# Flask-RESTful
+from flask_restful import marshal
+# Custom modules
+from job_serializer import JobSerializer
+from job_record import JobRecord
+
+
+def make_job(job_id, n_chars):
+    """
+    Output: Synthetic job's data, as selected from the database
+    """
+    return JobRecord(
+        id = job_id,
+        url = f"https://www.linkedin.com/jobs/view/{job_id}/",
+        title = f"Benchmark Engineer {job_id} – Données \"Senior\"",
+        company = random.choice(['Benchmark Corp', 'Société Générale', None]),
+        location = 'Montréal, Québec, Canada',
+        seniority = random.choice(['Entry level', 'Mid-Senior level', None]),
+        employment_type = 'Full-time',
+        industries = random.choice([['Benchmark Industry 1', 'Benchmark Industry 2'], [], None]),
+        functions = ['Engineering', 'Information Technology', None],
+        posting_text = ("About the role:\n\tBuild data pipelines – café, naïve, 日本語 \\ "
+                        * (n_chars // 60 + 1))[:n_chars],
+        rank = random.choice([random.random(), 0.0, 1e-7, None]),
+    )
+
+
+def marshal_page(jobs, output_fields):
+    return json.dumps({'job_list': [marshal(job, output_fields) for job in jobs], 'next_after_id': None}) + '\n'
+
+
+def serialize_page(jobs, output_fields):
+    serializer = JobSerializer(output_fields)
+    return '{"job_list": ' + serializer.serialize_list(jobs) + ', "next_after_id": ' + json.dumps(None) + '}\n'
+
+
+def time_pages(function, pages, output_fields):
+    """
+    Output: Mean seconds per page
+    """
+    start = time.perf_counter()
+    for jobs in pages:
+        function(jobs, output_fields)
+    return (time.perf_counter() - start) / len(pages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--limit', type=int, default=100, help='Number of jobs per page')
+    parser.add_argument('--pages', type=int, default=200, help='Number of pages serialized per path')
+    parser.add_argument('--chars', type=int, default=4000, help='Characters per posting text')
+    parser.add_argument('--fields', default='id,title,company,location', help="A list view's fields")
+    args = parser.parse_args()
+
+    # The API initializes its database connection pool on import - only its routes and fields are used here
+    from api_linkedin_extractor import app, job_fields, search_fields
+
+    pages = [[make_job(1000 * page + i, args.chars) for i in range(args.limit)] for page in range(args.pages)]
+    dict_pages = [[job._asdict() for job in jobs] for jobs in pages]
+    field_sets = {
+        'every field': job_fields,
+        'with rank': search_fields,
+        args.fields: {field: job_fields[field] for field in args.fields.split(',')},
+    }
+
+    mismatches = 0
+    with app.test_request_context('/jobdataextractor/api/v1.0/jobs/'):
+        for name, output_fields in field_sets.items():
+            for jobs, dict_jobs in zip(pages[:10], dict_pages[:10]):
+                if marshal_page(dict_jobs, output_fields).encode() != serialize_page(jobs, output_fields).encode():
+                    mismatches += 1
+                    print(f"MISMATCH ({name}):\n  {marshal_page(dict_jobs, output_fields)[:300]}\n"
+                          f"  {serialize_page(jobs, output_fields)[:300]}")
+                    break
+
+        print(f"Pages of {args.limit} jobs, {args.chars} characters per posting text:")
+        for name, output_fields in field_sets.items():
+            marshal_time = time_pages(marshal_page, dict_pages, output_fields)
+            serialize_time = time_pages(serialize_page, pages, output_fields)
+            print(f"  {name:>26}: marshal {1000 * marshal_time:7.2f} ms / page "
+                  f"({1e6 * marshal_time / args.limit:6.1f} us / job), "
+                  f"serializer {1000 * serialize_time:7.2f} ms / page "
+                  f"({1e6 * serialize_time / args.limit:6.1f} us / job), x{marshal_time / serialize_time:.1f}")
+
+    if mismatches:
+        sys.exit(f"{mismatches} field sets serialized differently")
+    print("Both paths output the same bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Benchmark for PGHandler's statement registry (see statement_registry.py) against composing queries on every call.
+
+Times the statements behind GET /jobs/<id> (select_job) and POST /jobs/ (insert_job) through three paths:
+- 'composed' : sql.SQL(...).format(...) composed and rendered on every call, as before the registry
+- 'registry' : composed once, rendered to bytes once per connection
+- 'prepared' : registry with server-side prepared statements (PREPARE once per connection, then EXECUTE)
+and reports the client CPU time and wall time per call, and the server's planning time per call (from
+EXPLAIN ANALYZE of the query / of the EXECUTE of the prepared statement).
+
+WARNING: Writes to (and cleans up after itself in) the database configured in the .env file - run it
+against a throwaway database initialized from DDL_job_data.sql, e.g. with POSTGRES_HOST=localhost.
+
+Usage (from the repo's top-level directory):
+    python -m benchmarks.bench_statements [--calls N]
+"""
+import argparse
+import itertools
+import sys
+import time
+# Psycopg2
+from psycopg2 import sql
+# Custom modules
+from postgres_handler import PGHandler
+from job_record import EXTRACTED_FIELDS
+from benchmarks.bench_insert import BASE_JOB_ID, make_job, cleanup
+
+
+def select_job_composed(cur, job_id):
+    """
+    PGHandler.select_job() statement, composed on every call
+    """
+    columns, junctions = PGHandler.build_select_columns()
+    cur.execute(sql.SQL(PGHandler.text_select_job_data_query).format(
+        columns = columns, junctions = junctions, value = sql.Placeholder()), (job_id,))
+    return cur.fetchone()
+
+
+def select_job_registry(cur, job_id):
+    PGHandler.statements.execute(cur, 'select_job_data', {'job_id': job_id})
+    return cur.fetchone()
+
+
+def insert_job_composed(cur, job_data):
+    """
+    PGHandler.insert_job() statement, composed on every call
+    """
+    job_data = {field: getattr(job_data, field) for field in EXTRACTED_FIELDS}
+    junc_data = {'industry': job_data.pop('industries'),
+                 'function': job_data.pop('functions')}
+    job_fields, job_values = zip(*job_data.items())
+    query = sql.SQL(PGHandler.text_insert_job_query).format(
+        fields = sql.SQL(",").join(map(sql.Identifier, job_fields)),
+        values = sql.SQL(",").join(sql.Placeholder() * len(job_fields)),
+        industry_ids = sql.Placeholder(),
+        function_ids = sql.Placeholder()
+        )
+    cur.execute(query, list(job_values) + [PGHandler.resolve_name_ids(cur, table, values)
+                                          for table, values in junc_data.items()])
+    return cur.fetchone()
+
+
+def insert_job_registry(cur, job_data):
+    PGHandler.statements.execute(cur, *PGHandler.build_insert_query(cur, job_data))
+    return cur.fetchone()
+
+
+def time_calls(function, args_list):
+    """
+    Output: Tuple of (client CPU seconds, wall seconds) of the calls, made in a single transaction
+    """
+    with PGHandler.get_cursor() as cur:
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        for args in args_list:
+            function(cur, args)
+        return time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+
+def planning_time(cur, query, values, n=20):
+    """
+    Inputs:  Query (string / bytes) and its values
+    Output:  Mean planning time (seconds) reported by EXPLAIN ANALYZE over n runs (last run's plan cached)
+    """
+    times = []
+    for _ in range(n):
+        cur.execute(b"EXPLAIN (ANALYZE, FORMAT JSON) " + query, values)
+        times.append(cur.fetchone()['QUERY PLAN'][0]['Planning Time'] / 1000)
+    # Prepared statements are planned for their values the first 5 executions, before a generic plan is
+    # considered - only average the runs after that
+    return sum(times[6:]) / len(times[6:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=2000, help='Number of calls per path and statement')
+    parser.add_argument('--round-size', type=int, default=100, help='Number of calls per transaction')
+    args = parser.parse_args()
+
+    error = PGHandler.init_connection_pool()
+    if not PGHandler.connection_status:
+        sys.exit(error)
+    cleanup()
+
+    job_ids = itertools.count(BASE_JOB_ID)
+    paths = {
+        'composed': (select_job_composed, insert_job_composed, False),
+        'registry': (select_job_registry, insert_job_registry, False),
+        'prepared': (select_job_registry, insert_job_registry, True),
+    }
+    results = {name: {'select_job': [0, 0], 'insert_job': [0, 0]} for name in paths}
+
+    try:
+        # Warm the lookup cache, and seed the jobs selected by every path
+        seed_ids = [next(job_ids) for _ in range(100)]
+        time_calls(insert_job_registry, [make_job(job_id, 3) for job_id in seed_ids])
+
+        # Alternate between the paths in rounds, so they all run against the same database state
+        for i in range(0, args.calls, args.round_size):
+            for name, (select_job, insert_job, use_prepared) in paths.items():
+                PGHandler.statements.use_prepared = use_prepared
+                calls = [(select_job, [seed_ids[j % len(seed_ids)] for j in range(i, i + args.round_size)]),
+                         (insert_job, [make_job(next(job_ids), 3) for _ in range(args.round_size)])]
+                for statement_name, (function, args_list) in zip(['select_job', 'insert_job'], calls):
+                    cpu, wall = time_calls(function, args_list)
+                    results[name][statement_name][0] += cpu / args.calls
+                    results[name][statement_name][1] += wall / args.calls
+
+        # Server planning time of the select_job statement - as a query, and as a prepared statement
+        with PGHandler.get_cursor() as cur:
+            statement = PGHandler.statements.statements['select_job_data']
+            query = statement.query.as_string(cur.connection).strip().rstrip(';').encode()
+            plan_query = planning_time(cur, query, {'job_id': seed_ids[0]})
+            PGHandler.statements.use_prepared = True
+            select_job_registry(cur, seed_ids[0])
+            plan_prepared = planning_time(cur, statement.execute_query, [seed_ids[0]])
+
+        print(f"{args.calls} calls per path and statement (client CPU / wall time per call)")
+        for statement_name in ['select_job', 'insert_job']:
+            for name, result in results.items():
+                cpu, wall = result[statement_name]
+                print(f"  {statement_name} {name:>9}: CPU {1e6 * cpu:7.1f} us, wall {1e6 * wall:7.1f} us")
+        print(f"\nServer planning time per select_job call: query {1e6 * plan_query:6.1f} us, "
+              f"prepared {1e6 * plan_prepared:6.1f} us")
+        print(f"\nStatement registry: {PGHandler.statements.stats()}")
+    finally:
+        PGHandler.statements.use_prepared = False
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Benchmark for the job table's storage (migrations/004_job_storage.sql) and GET /jobs/?fields= projections.
+
+Seeds the database with synthetic jobs with posting texts of about --chars characters of English-like text, and
+reports for the job table's current storage settings:
+- the size of the job table's heap (read by every job selected) and TOAST table (read for posting texts only)
+- per page of --limit jobs (GET /jobs/?after_id=&limit=, through the API's test client), for every field and
+  for a list view's fields (?fields=, see --fields): the latency, the blocks read by the page's query
+  (from pg_statio_user_tables, requires Postgres 15+) and the response size
+Run it before and after applying migrations/004_job_storage.sql to compare.
+
+WARNING: Writes to (and cleans up after itself in) the database configured in the .env file - run it
+against a throwaway database initialized from DDL_job_data.sql, e.g. with POSTGRES_HOST=localhost.
+
+Usage (from the repo's top-level directory):
+    python -m benchmarks.bench_storage [--jobs 100000] [--chars 4000] [--fields id,title,company,location]
+"""
+import argparse
+import random
+import sys
+import time
+# Psycopg2
+import psycopg2.extras
+# Custom modules
+from postgres_handler import PGHandler
+from benchmarks.bench_insert import BASE_JOB_ID, cleanup
+from benchmarks.bench_select import seed as seed_junctions
+
+
+# Words posting texts are made of, drawn with P(k) ~ 1/k so the text compresses about as well as English
+VOCABULARY = """the and to of a in with for our you we is are on as will be team experience work data
+or an your skills business at this that years development support including ability build across
+design new product customer management software systems knowledge strong working help role opportunity
+environment engineering communication about from have all related technical solutions join who time
+company projects industry services requirements processes technology position please qualifications
+responsibilities learning great tools apply best benefits equal employer candidates diverse culture
+growth develop ensure provide using cloud python sql analysis performance quality clients teams high
+within other degree science computer preferred required modern scalable platform infrastructure
+""".split()
+
+
+def seed(n_jobs, n_chars):
+    """
+    Insert synthetic jobs BASE_JOB_ID ... BASE_JOB_ID + n_jobs - 1 with posting texts of about n_chars
+    characters (and their junction rows, see bench_select.seed())
+    """
+    seed_junctions(0, n_jobs)
+    n_words = n_chars // 7
+    with PGHandler.get_cursor() as cur:
+        # Posting texts are rewritten, so they are stored as the job table's current settings dictate
+        cur.execute("""
+            UPDATE job
+            SET posting_text = array_to_string(ARRAY(
+                SELECT (%(vocabulary)s::varchar[])[floor(exp(random() * ln(%(n)s)))::int]
+                FROM generate_series(1, %(n_words)s)
+                WHERE job.id IS NOT NULL), ' ')
+            WHERE id >= %(base)s;
+            """, {'vocabulary': VOCABULARY, 'n': len(VOCABULARY) + 1, 'n_words': n_words, 'base': BASE_JOB_ID})
+    # Reclaim the space of the rows replaced by the update, as a freshly loaded table would
+    con = PGHandler.connection_pool.getconn()
+    try:
+        con.autocommit = True
+        with con.cursor() as cur:
+            cur.execute("VACUUM FULL ANALYZE job;")
+    finally:
+        con.autocommit = False
+        PGHandler.connection_pool.putconn(con)
+
+
+def storage_settings(cur):
+    """
+    Output: String of the job table's storage options, and the storage / compression of its large columns
+    """
+    cur.execute("""
+        SELECT c.reloptions, a.attname, a.attstorage, a.attcompression
+        FROM pg_class c
+        INNER JOIN pg_attribute a
+        ON a.attrelid = c.oid
+        WHERE c.relname = 'job' AND a.attname IN ('posting_text', 'search_vector');
+        """)
+    rows = cur.fetchall()
+    columns = ", ".join(f"{row['attname']}: storage {row['attstorage']}, compression {row['attcompression'] or 'default'}"
+                        for row in rows)
+    return f"options {rows[0]['reloptions'] or 'default'} - {columns}"
+
+
+def relation_sizes(cur):
+    """
+    Output: Tuple of the job table's heap and TOAST table sizes (bytes)
+    """
+    cur.execute("""
+        SELECT pg_relation_size(c.oid) AS heap, pg_relation_size(c.reltoastrelid) AS toast
+        FROM pg_class c
+        WHERE c.relname = 'job';
+        """)
+    row = cur.fetchone()
+    return row['heap'], row['toast']
+
+
+def read_blocks(cur):
+    """
+    Output: Number of blocks (8kB pages) of the user tables, their indexes and their TOAST tables read so far
+            (from the buffer cache or not), as flushed to the statistics by this connection
+    """
+    cur.execute("SELECT pg_stat_force_next_flush();")
+    cur.connection.commit()
+    cur.execute("""
+        SELECT sum(heap_blks_read + heap_blks_hit + coalesce(idx_blks_read + idx_blks_hit, 0)
+                   + coalesce(toast_blks_read + toast_blks_hit, 0) + coalesce(tidx_blks_read + tidx_blks_hit, 0))
+        AS blocks
+        FROM pg_statio_user_tables;
+        """)
+    blocks = cur.fetchone()['blocks']
+    cur.connection.commit()
+    return blocks
+
+
+def page_blocks(fields, after_id, limit):
+    """
+    Output: Number of blocks read by the select_data_page statement for the fields (output values included,
+            e.g. posting texts read from the TOAST table) - requires Postgres 15+
+    """
+    key = PGHandler.register_select_statements(PGHandler.select_columns(fields))['select_data_page']
+    con = PGHandler.connection_pool.getconn()
+    try:
+        with con.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            start = read_blocks(cur)
+            PGHandler.statements.execute(cur, key, {'after_id': after_id, 'limit': limit})
+            cur.fetchall()
+            con.commit()
+            return read_blocks(cur) - start
+    finally:
+        PGHandler.connection_pool.putconn(con)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=100000, help='Number of synthetic jobs')
+    parser.add_argument('--chars', type=int, default=4000, help='Characters per posting text')
+    parser.add_argument('--limit', type=int, default=100, help='Number of jobs per page')
+    parser.add_argument('--pages', type=int, default=50, help='Number of pages selected per set of fields')
+    parser.add_argument('--fields', default='id,title,company,location', help="A list view's fields")
+    args = parser.parse_args()
+
+    error = PGHandler.init_connection_pool()
+    if not PGHandler.connection_status:
+        sys.exit(error)
+    cleanup()
+
+    from api_linkedin_extractor import app
+    client = app.test_client()
+    field_sets = {'every field': None, args.fields: args.fields.split(',')}
+
+    try:
+        seed(args.jobs, args.chars)
+        with PGHandler.get_cursor() as cur:
+            print(f"{args.jobs} jobs, {args.chars} characters per posting text")
+            print(f"  job table: {storage_settings(cur)}")
+            heap, toast = relation_sizes(cur)
+            print(f"  heap {heap / 2**20:8.1f} MB, TOAST {toast / 2**20:8.1f} MB")
+
+        print(f"\nPages of {args.limit} jobs:")
+        for name, fields in field_sets.items():
+            after_ids = [BASE_JOB_ID + random.randrange(args.jobs - args.limit) for _ in range(args.pages)]
+            latencies, sizes = [], []
+            for after_id in after_ids:
+                url = f"/jobdataextractor/api/v1.0/jobs/?after_id={after_id}&limit={args.limit}"
+                start = time.perf_counter()
+                response = client.get(url + ("" if fields is None else "&fields=" + ",".join(fields)))
+                latencies.append(time.perf_counter() - start)
+                sizes.append(len(response.data))
+            blocks = sum(page_blocks(fields, after_id, args.limit) for after_id in after_ids[:10]) / 10
+            latencies.sort()
+            print(f"  {name:>26}: p50 {1000 * latencies[len(latencies) // 2]:7.2f} ms, "
+                  f"{blocks:7.1f} blocks read, response {sum(sizes) / len(sizes) / 1024:7.1f} kB")
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,514 @@
+"""
+Offline load-testing harness for the whole API - how many POSTs / sec the gevent server (api_gevent_server.py)
+and PGHandler sustain, and at which concurrency the latency or the database connection pool's waits blow up,
+without a database or a server set up beforehand:
+1. Starts a throwaway Postgres - a cluster initialized in a temporary directory, listening on a free local port,
+   with the job_data database created from DDL_job_data.sql. Requires the Postgres server binaries (initdb,
+   pg_ctl, psql - found with --pg-bin, pg_config or the PATH), and initdb refuses to run as root
+2. Starts the API server against it on a free port - api_gevent_server.py, or api_asgi_server.py with
+   --server asgi - with the .env file's settings overridden by --server-env (e.g. POSTGRES_POOL_MAX_SIZE=5)
+3. For each --concurrency level, posts job pages for --duration seconds from as many concurrent clients (see
+   load_test.py), under new job ids: the saved pages of html_dir (by default the fixture corpus of
+   bench_extraction.py), and --synthetic variants of each page with a golden output (new title and company).
+   With --post-ratio below 1, the other requests get jobs posted earlier
+4. Reports, per level, the throughput, p50 / p95 / p99 latency, error rate and status counts of the posts (and
+   gets), and the time waited for a database connection (from the server's /metrics - gevent server only)
+The server and the cluster are then stopped, and the cluster deleted. The results are written as JSON
+(--output, by default load_results/<time>_<server>.json) - compare a run with an earlier one with --compare.
+
+Usage (from the repo's top-level directory):
+    python -m benchmarks.load_harness [html_dir] [--server gevent] [--concurrency 1,8,32,64] [--duration 20]
+                                      [--intake json] [--server-env KEY=VALUE ...] [--compare <earlier run>.json]
+"""
+import argparse
+import glob
+import gzip
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+# Custom modules
+from benchmarks.bench_extraction import FIXTURES_DIR, load_pages, load_golden
+from benchmarks.bench_insert import BASE_JOB_ID
+from benchmarks.bench_intake import prune
+from benchmarks.load_test import API_PREFIX, Client, percentile
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, 'load_results')
+SERVERS = {'gevent': 'api_gevent_server.py', 'asgi': 'api_asgi_server.py'}
+# Request bodies of POST /jobs/: the JSON document, the raw page ('text/html'), or the pruned, gzip-compressed
+# page posted by the Chrome Extension
+INTAKES = ['json', 'html', 'gzip']
+POOL_WAIT_HISTOGRAM = 'jobdataextractor_db_pool_wait_seconds'
+
+
+def free_port():
+    """
+    Output: Number of a local TCP port free at the time of the call
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def find_pg_bin(pg_bin):
+    """
+    Input:  Directory of the Postgres server binaries passed on the command line (or None)
+    Output: Directory of the Postgres server binaries - passed, given by pg_config, or of initdb on the PATH
+    """
+    candidates = [pg_bin] if pg_bin else []
+    if not pg_bin:
+        if shutil.which('pg_config'):
+            candidates.append(subprocess.run(['pg_config', '--bindir'], capture_output=True, text=True).stdout.strip())
+        if shutil.which('initdb'):
+            candidates.append(os.path.dirname(shutil.which('initdb')))
+        # Debian / Ubuntu packages do not put the server binaries on the PATH
+        candidates.extend(sorted(glob.glob('/usr/lib/postgresql/*/bin'), reverse=True))
+    for candidate in candidates:
+        if os.path.isfile(os.path.join(candidate, 'initdb')) or os.path.isfile(os.path.join(candidate, 'initdb.exe')):
+            return candidate
+    sys.exit("Postgres server binaries (initdb, pg_ctl) not found - pass their directory with --pg-bin")
+
+
+
+class ThrowawayPostgres:
+    """
+    Postgres cluster initialized in a temporary directory for the duration of a load test, listening on a free
+    local port, with the job_data database created from DDL_job_data.sql - deleted when stopped
+    """
+    USER = 'loadtest'
+    DATABASE = 'job_data'
+
+    def __init__(self, bin_dir):
+        self.bin_dir = bin_dir
+        self.directory = None
+        self.port = None
+
+
+    def run(self, program, *arguments):
+        result = subprocess.run([os.path.join(self.bin_dir, program)] + list(arguments),
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"{program} failed:\n{result.stdout}")
+        return result.stdout
+
+
+    def psql(self, database, *arguments):
+        return self.run('psql', '-X', '-q', '-v', 'ON_ERROR_STOP=1', '-h', '127.0.0.1', '-p', str(self.port),
+                        '-U', self.USER, '-d', database, *arguments)
+
+
+    def start(self):
+        if hasattr(os, 'geteuid') and os.geteuid() == 0:
+            sys.exit("initdb cannot be run as root - run the load test as an unprivileged user")
+
+        self.directory = tempfile.mkdtemp(prefix='jobdataextractor_pg_')
+        data_dir = os.path.join(self.directory, 'data')
+        self.run('initdb', '-D', data_dir, '-U', self.USER, '--auth=trust', '--encoding=UTF8', '--no-locale',
+                 '--no-sync')
+        self.port = free_port()
+        self.run('pg_ctl', '-D', data_dir, '-l', os.path.join(self.directory, 'postgres.log'), '-w', '-o',
+                 f"-p {self.port} -k {self.directory} -c listen_addresses=127.0.0.1 -c max_connections=200",
+                 'start')
+        self.psql('postgres', '-c', f'CREATE DATABASE {self.DATABASE}')
+        self.psql(self.DATABASE, '-f', os.path.join(REPO_DIR, 'DDL_job_data.sql'))
+
+
+    def stop(self):
+        if self.directory is None:
+            return
+        if self.port is not None:
+            subprocess.run([os.path.join(self.bin_dir, 'pg_ctl'), '-D', os.path.join(self.directory, 'data'),
+                            '-m', 'fast', '-w', 'stop'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory = None
+
+
+    def version(self):
+        return self.run('postgres', '--version').strip()
+
+
+    def environment(self):
+        """
+        Output: Environment variables connecting the API to the cluster (libpq and asyncpg read PGPORT)
+        """
+        return {'POSTGRES_HOST': '127.0.0.1', 'PGPORT': str(self.port), 'POSTGRES_USER': self.USER,
+                'POSTGRES_PASSWORD': self.USER, 'POSTGRES_DB': self.DATABASE}
+
+
+    def __enter__(self):
+        try:
+            self.start()
+        except BaseException:
+            self.stop()
+            raise
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+
+class ApiServer:
+    """
+    API server run as a subprocess (in its own process group, with the extraction pool's workers) on a free
+    local port, its output written to a log file
+    """
+    def __init__(self, server, environment, log_path):
+        self.script = SERVERS[server]
+        self.environment = environment
+        self.log_path = log_path
+        self.process = None
+        self.port = None
+
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+
+    def start(self, timeout):
+        """
+        Start the server, and wait up to timeout seconds for it to be connected to the database
+        """
+        self.port = free_port()
+        environment = dict(os.environ, **self.environment, API_PORT=str(self.port))
+        with open(self.log_path, 'wb') as log:
+            self.process = subprocess.Popen([sys.executable, self.script], cwd=REPO_DIR, env=environment,
+                                            stdout=log, stderr=subprocess.STDOUT,
+                                            start_new_session=hasattr(os, 'killpg'))
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.script} exited with code {self.process.returncode}, see {self.log_path}")
+            try:
+                status, body = get(self.url, f"{API_PREFIX}/checkconnection/")
+                if status == 200 and json.loads(body).get('connection_status'):
+                    return
+            except (OSError, http.client.HTTPException, ValueError):
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"{self.script} not ready after {timeout} seconds, see {self.log_path}")
+
+
+    def stop(self):
+        if self.process is None or self.process.poll() is not None:
+            return
+        if hasattr(os, 'killpg'):
+            os.killpg(self.process.pid, signal.SIGTERM)
+        else:
+            self.process.terminate()
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            if hasattr(os, 'killpg'):
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+            self.process.wait()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def get(url, path):
+    """
+    Output: Tuple of (HTTP status code, response body) of a GET request to the server
+    """
+    connection = http.client.HTTPConnection(url.split('://', 1)[1], timeout=10)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def synthetic_page(html, golden, index):
+    """
+    Inputs: HTML string of a saved page, its golden output (see bench_extraction.py) and the variant's number
+    Output: HTML string of the page with a new job title and company - i.e. new job data and a new content hash
+    """
+    return (html.replace(golden['title'], f"{golden['title']} {index}")
+                .replace(golden['company'], f"Synthetic {index} {golden['company']}"))
+
+
+def build_payloads(html_dir, synthetic, intake):
+    """
+    Output: List of (page name, encoded page) tuples - encoded once for the requests' bodies (see request())
+    """
+    payloads = []
+    for filename, html in load_pages(html_dir):
+        golden = load_golden(html_dir, filename)
+        variants = [(filename, html)]
+        if golden and golden['title'] and golden['company']:
+            variants += [(f"{filename}#{index}", synthetic_page(html, golden, index))
+                         for index in range(1, synthetic + 1)]
+        for name, page in variants:
+            if intake == 'json':
+                payloads.append((name, json.dumps(page).encode()))
+            elif intake == 'html':
+                payloads.append((name, page.encode('utf-8')))
+            else:
+                payloads.append((name, gzip.compress(prune(page).encode('utf-8'))))
+    return payloads
+
+
+def request(intake, payload, job_id):
+    """
+    Output: Tuple of (path, body, headers) of the POST /jobs/ request posting the encoded page under the job id
+    """
+    if intake == 'json':
+        return (f"{API_PREFIX}/jobs/", b'{"id": %d, "HTML": ' % job_id + payload + b'}',
+                {'Content-Type': 'application/json'})
+    headers = {'Content-Type': 'text/html; charset=utf-8'}
+    if intake == 'gzip':
+        headers['Content-Encoding'] = 'gzip'
+    return f"{API_PREFIX}/jobs/?id={job_id}", payload, headers
+
+
+def run_client(url, args, payloads, new_ids, posted_ids, stop_time, results, lock):
+    """
+    Send requests until stop_time, then add the (status, latency, kind) results to the shared results list
+    """
+    client = Client(url, timeout=args.timeout)
+    local_results = []
+    rng = random.Random()
+
+    while time.perf_counter() < stop_time:
+        if posted_ids and rng.random() >= args.post_ratio:
+            status, latency = client.request('GET', f"{API_PREFIX}/jobs/{rng.choice(posted_ids)}")
+            local_results.append((status, latency, 'get'))
+            continue
+
+        with lock:
+            job_id = next(new_ids)
+        path, body, headers = request(args.intake, rng.choice(payloads)[1], job_id)
+        status, latency = client.request('POST', path, body=body, headers=headers)
+        local_results.append((status, latency, 'post'))
+        if status == 201:
+            with lock:
+                posted_ids.append(job_id)
+
+    with lock:
+        results.extend(local_results)
+
+
+def pool_wait_histogram(url):
+    """
+    Output: Dict of the server's database pool wait histogram ('buckets': {upper bound: cumulative count},
+            'sum', 'count'), scraped from /metrics - None if the server does not export it
+    """
+    try:
+        status, body = get(url, '/metrics')
+    except (OSError, http.client.HTTPException):
+        return None
+    if status != 200:
+        return None
+
+    histogram = {'buckets': {}, 'sum': 0.0, 'count': 0}
+    for line in body.decode().splitlines():
+        if not line.startswith(POOL_WAIT_HISTOGRAM):
+            continue
+        name, value = line.rsplit(' ', 1)
+        if name.startswith(POOL_WAIT_HISTOGRAM + '_bucket'):
+            histogram['buckets'][float(name.split('le="', 1)[1].split('"', 1)[0])] = int(value)
+        elif name == POOL_WAIT_HISTOGRAM + '_sum':
+            histogram['sum'] = float(value)
+        elif name == POOL_WAIT_HISTOGRAM + '_count':
+            histogram['count'] = int(value)
+    return histogram if histogram['buckets'] else None
+
+
+def pool_wait_stats(before, after):
+    """
+    Inputs: Pool wait histograms scraped before and after a concurrency level (see pool_wait_histogram())
+    Output: Dict of the number of connection checkouts during the level, their mean wait, and the upper bound
+            of the bucket of their p99 wait (None if not exported)
+    """
+    if before is None or after is None:
+        return None
+    count = after['count'] - before['count']
+    p99 = None
+    for bound in sorted(after['buckets']):
+        if after['buckets'][bound] - before['buckets'].get(bound, 0) >= 0.99 * count:
+            p99 = bound
+            break
+    return {'checkouts': count,
+            'mean_ms': round(1000 * (after['sum'] - before['sum']) / count, 3) if count else 0.0,
+            'p99_le_ms': None if p99 is None or p99 == float('inf') else round(1000 * p99, 3)}
+
+
+def summarize(results, elapsed):
+    """
+    Output: Dict of the throughput (all / successful requests), latency percentiles, error rate and status counts
+            of a kind of requests
+    """
+    latencies = sorted(r[1] for r in results)
+    statuses = Counter(str(r[0]) for r in results)
+    errors = sum(count for status, count in statuses.items() if not status.startswith(('2', '3')))
+    return {'requests': len(results),
+            'throughput_rps': round(len(results) / elapsed, 1),
+            'success_rps': round((len(results) - errors) / elapsed, 1),
+            'p50_ms': round(1000 * percentile(latencies, 0.5), 2),
+            'p95_ms': round(1000 * percentile(latencies, 0.95), 2),
+            'p99_ms': round(1000 * percentile(latencies, 0.99), 2),
+            'error_rate': round(errors / len(results), 4),
+            'status': dict(statuses)}
+
+
+def run_level(server, args, payloads, concurrency, new_ids, posted_ids):
+    """
+    Output: Dict of the results of a concurrency level (see summarize() and pool_wait_stats())
+    """
+    results = []
+    lock = threading.Lock()
+    pool_wait_before = pool_wait_histogram(server.url)
+    stop_time = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=run_client,
+                                args=(server.url, args, payloads, new_ids, posted_ids, stop_time, results, lock))
+               for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    level = {'concurrency': concurrency, 'elapsed_s': round(elapsed, 2), 'requests': len(results),
+             'throughput_rps': round(len(results) / elapsed, 1)}
+    for kind in ['post', 'get']:
+        kind_results = [r for r in results if r[2] == kind]
+        level[kind] = summarize(kind_results, elapsed) if kind_results else None
+    level['pool_wait'] = pool_wait_stats(pool_wait_before, pool_wait_histogram(server.url))
+    return level
+
+
+def print_level(level):
+    print(f"  {level['concurrency']:>4} clients: {level['requests']} requests, {level['throughput_rps']:8.1f} req/s")
+    for kind in ['post', 'get']:
+        stats = level[kind]
+        if stats:
+            print(f"        {kind:>4}: {stats['throughput_rps']:8.1f} req/s ({stats['success_rps']:.1f} ok), "
+                  f"p50 {stats['p50_ms']:7.1f} ms, p95 {stats['p95_ms']:7.1f} ms, p99 {stats['p99_ms']:7.1f} ms, "
+                  f"errors {100 * stats['error_rate']:5.1f}%, status {stats['status']}")
+    if level['pool_wait']:
+        pool_wait = level['pool_wait']
+        p99 = f"<= {pool_wait['p99_le_ms']} ms" if pool_wait['p99_le_ms'] is not None else 'beyond the buckets'
+        print(f"        pool: {pool_wait['checkouts']} checkouts, wait mean {pool_wait['mean_ms']:.2f} ms, p99 {p99}")
+
+
+def change(before, after):
+    return f"{before} -> {after}" + (f" ({100 * (after / before - 1):+.1f}%)" if before else '')
+
+
+def compare(run, earlier):
+    """
+    Print the change in successful post throughput, latency and error rate of each concurrency level against an
+    earlier run (levels run by both only)
+    """
+    earlier_levels = {level['concurrency']: level for level in earlier['levels']}
+    print(f"Against {earlier['started']} ({earlier.get('git_commit') or 'unknown commit'}):")
+    for level in run['levels']:
+        before = earlier_levels.get(level['concurrency'])
+        if not before or not before['post'] or not level['post']:
+            continue
+        changes = ', '.join(f"{metric} {change(before['post'][metric], level['post'][metric])}"
+                            for metric in ['success_rps', 'p50_ms', 'p99_ms', 'error_rate'])
+        print(f"  {level['concurrency']:>4} clients: {changes}")
+
+
+def git_commit():
+    result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('html_dir', nargs='?', default=FIXTURES_DIR, help='Directory of saved job posting HTML files')
+    parser.add_argument('--server', choices=list(SERVERS), default='gevent', help='API server to load test')
+    parser.add_argument('--concurrency', default='1,8,32,64',
+                        help='Comma-separated numbers of concurrent clients, each level run in turn')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds to send requests for, per level')
+    parser.add_argument('--post-ratio', type=float, default=1.0,
+                        help='Fraction of posts - the other requests get jobs posted earlier')
+    parser.add_argument('--intake', choices=INTAKES, default='json', help='Request body of the posts')
+    parser.add_argument('--synthetic', type=int, default=4,
+                        help='Number of synthetic variants of each page with a golden output')
+    parser.add_argument('--timeout', type=float, default=60, help='Seconds before a request times out')
+    parser.add_argument('--server-env', action='append', default=[], metavar='KEY=VALUE',
+                        help="Setting of the server overriding the .env file's (repeatable)")
+    parser.add_argument('--pg-bin', help='Directory of the Postgres server binaries (initdb, pg_ctl, psql)')
+    parser.add_argument('--startup-timeout', type=float, default=60, help='Seconds to wait for the server')
+    parser.add_argument('--output', help='JSON file the results are written to')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    server_env = dict(setting.split('=', 1) for setting in args.server_env)
+    earlier = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as rf:
+            earlier = json.load(rf)
+    payloads = build_payloads(args.html_dir, args.synthetic, args.intake)
+    if not payloads:
+        sys.exit(f"No HTML files found in {args.html_dir}")
+
+    run = {'started': datetime.now().isoformat(timespec='seconds'), 'git_commit': git_commit(),
+           'server': args.server, 'intake': args.intake, 'post_ratio': args.post_ratio, 'duration_s': args.duration,
+           'server_env': server_env, 'pages': len(payloads), 'html_dir': os.path.relpath(args.html_dir, REPO_DIR),
+           'python': platform.python_version(), 'cpu_count': os.cpu_count(), 'levels': []}
+    new_ids = itertools.count(BASE_JOB_ID + 2 * 10**6)
+    posted_ids = []
+
+    bin_dir = find_pg_bin(args.pg_bin)
+    with ThrowawayPostgres(bin_dir) as postgres:
+        run['postgres'] = postgres.version()
+        log_path = os.path.join(postgres.directory, 'server.log')
+        with ApiServer(args.server, dict(postgres.environment(), **server_env), log_path) as server:
+            try:
+                server.start(args.startup_timeout)
+            except RuntimeError:
+                with open(log_path, 'r', encoding='utf-8', errors='replace') as rf:
+                    print(rf.read()[-4000:], file=sys.stderr)
+                raise
+
+            print(f"{SERVERS[args.server]} on {server.url} against {run['postgres']} (port {postgres.port}) - "
+                  f"{len(payloads)} pages posted as {args.intake}, {args.duration:.0f} s per level")
+            for concurrency in levels:
+                level = run_level(server, args, payloads, concurrency, new_ids, posted_ids)
+                run['levels'].append(level)
+                print_level(level)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%dT%H%M%S}_{args.server}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as wf:
+        json.dump(run, wf, indent=2)
+    print(f"Results written to {output}")
+
+    if earlier:
+        compare(run, earlier)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Load test for a running API server - compares the throughput of the gevent server (api_gevent_server.py) and
+the ASGI server (api_asgi_server.py) when run against each in turn.
+
+Sends requests from concurrent clients (native threads, one keep-alive connection each) for a fixed duration:
+- 'get'   : GET /jobs/<id> for ids of jobs already in the database
+- 'post'  : POST /jobs/ of a saved job posting page, under new synthetic job ids
+- 'mixed' : --post-ratio of the requests are posts, the rest are gets
+and reports the throughput (requests / sec), latency percentiles and response status counts.
+
+WARNING: 'post' / 'mixed' insert synthetic jobs (ids from BASE_JOB_ID, see bench_insert.py) into the database
+the server is connected to - run it against a throwaway database, and remove them afterwards with --cleanup.
+
+Usage (from the repo's top-level directory, with a server running):
+    python -m benchmarks.load_test --url http://localhost:5000 [--scenario mixed] [--concurrency 32]
+                                   [--duration 20] [--html html_files/<saved page>.html] [--cleanup]
+"""
+import argparse
+import http.client
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+# Custom modules
+from benchmarks.bench_insert import BASE_JOB_ID
+
+
+API_PREFIX = '/jobdataextractor/api/v1.0'
+
+
+class Client:
+    """
+    HTTP client holding a keep-alive connection to the server, reconnecting after connection errors
+    """
+    def __init__(self, url, timeout):
+        self.netloc = urlsplit(url).netloc
+        self.timeout = timeout
+        self.connection = None
+
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        Output: Tuple of (HTTP status code or exception name, latency in seconds)
+        """
+        start = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+            self.connection.request(method, path, body=body, headers=headers or {})
+            response = self.connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException) as error:
+            self.connection.close()
+            self.connection = None
+            status = type(error).__name__
+        return status, time.perf_counter() - start
+
+
+def fetch_job_ids(url, limit):
+    """
+    Output: List of ids of (up to limit) jobs in the database, through GET /jobs/?limit=
+    """
+    client = Client(url, timeout=60)
+    client.connection = http.client.HTTPConnection(client.netloc, timeout=60)
+    client.connection.request('GET', f"{API_PREFIX}/jobs/?limit={limit}")
+    response = client.connection.getresponse()
+    if response.status != 200:
+        sys.exit(f"Could not list jobs: HTTP {response.status}")
+    return [job['id'] for job in json.loads(response.read())['job_list']]
+
+
+def run_client(args, job_ids, html, new_ids, stop_time, results, lock):
+    """
+    Send requests until stop_time, then add the (status, latency, kind) results to the shared results list
+    """
+    client = Client(args.url, timeout=args.timeout)
+    local_results = []
+    rng = random.Random()
+
+    while time.perf_counter() < stop_time:
+        if args.scenario == 'post' or (args.scenario == 'mixed' and rng.random() < args.post_ratio):
+            with lock:
+                job_id = next(new_ids)
+            body = json.dumps({'id': job_id, 'HTML': html})
+            status, latency = client.request('POST', f"{API_PREFIX}/jobs/", body=body,
+                                             headers={'Content-Type': 'application/json'})
+            local_results.append((status, latency, 'post'))
+        else:
+            status, latency = client.request('GET', f"{API_PREFIX}/jobs/{rng.choice(job_ids)}")
+            local_results.append((status, latency, 'get'))
+
+    with lock:
+        results.extend(local_results)
+
+
+def percentile(latencies, fraction):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+def cleanup():
+    """
+    Remove every synthetic job from the database configured in the .env file
+    """
+    from benchmarks.bench_insert import cleanup as cleanup_jobs
+    from postgres_handler import PGHandler
+    error = PGHandler.init_connection_pool()
+    if not PGHandler.connection_status:
+        sys.exit(error)
+    cleanup_jobs()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000', help='Base url of the API server')
+    parser.add_argument('--scenario', choices=['get', 'post', 'mixed'], default='mixed')
+    parser.add_argument('--post-ratio', type=float, default=0.1, help="Fraction of posts in the 'mixed' scenario")
+    parser.add_argument('--concurrency', type=int, default=32, help='Number of concurrent clients')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds to send requests for')
+    parser.add_argument('--timeout', type=float, default=60, help='Seconds before a request times out')
+    parser.add_argument('--html', help="Saved job posting page posted by the 'post' / 'mixed' scenarios")
+    parser.add_argument('--first-id', type=int, default=BASE_JOB_ID + 10**6,
+                        help='First synthetic job id used for posts (use a new range for every run)')
+    parser.add_argument('--cleanup', action='store_true', help='Remove the synthetic jobs afterwards')
+    args = parser.parse_args()
+
+    if args.scenario != 'get' and args.html is None:
+        parser.error("--html is required by the 'post' and 'mixed' scenarios")
+    html = open(args.html, 'r', encoding='utf-8').read() if args.html else None
+
+    job_ids = fetch_job_ids(args.url, 1000)
+    if args.scenario != 'post' and not job_ids:
+        sys.exit("No jobs in the database to get - post some jobs first")
+
+    results = []
+    lock = threading.Lock()
+    new_ids = itertools.count(args.first_id)
+    stop_time = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=run_client, args=(args, job_ids, html, new_ids, stop_time, results, lock))
+               for _ in range(args.concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.url} - scenario '{args.scenario}', {args.concurrency} clients, {elapsed:.1f} s")
+    print(f"  total: {len(results)} requests, {len(results) / elapsed:8.1f} req/s")
+    for kind in ['get', 'post']:
+        kind_results = [r for r in results if r[2] == kind]
+        if kind_results:
+            latencies = sorted(r[1] for r in kind_results)
+            statuses = Counter(r[0] for r in kind_results)
+            print(f"  {kind:>5}: {len(kind_results)} requests, {len(kind_results) / elapsed:8.1f} req/s, "
+                  f"p50 {1000 * percentile(latencies, 0.5):7.1f} ms, p95 {1000 * percentile(latencies, 0.95):7.1f} ms, "
+                  f"p99 {1000 * percentile(latencies, 0.99):7.1f} ms, status {dict(statuses)}")
+
+    if args.cleanup:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""
+Bulk ingestion of saved LinkedIn job posting pages.
+
+Streams many job postings through JobData.extract_job_data() in parallel and commits them to the database
+in batched transactions, skipping jobs already in the database. Used by the API's NDJSON batch endpoint,
+and as a command line tool for backfilling the database from archives of saved pages:
+
+    python bulk_ingest.py PATH [PATH ...] [--workers N] [--batch-size N] [--report results.ndjson]
+
+Each PATH can be a directory of saved .html pages (searched recursively), a tarball of saved pages
+(.tar / .tar.gz / .tgz / .tar.bz2 / .tar.xz), or an NDJSON file with one {"id": ..., "HTML": ...} object per line.
+For saved pages, the job id is read from the file name, or else from the job posting url in the page.
+"""
+# Utility
+import os
+import re
+import sys
+import json
+import time
+import tarfile
+import argparse
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+# Gevent (optional, to extract a batch concurrently with the API's ExtractionPool - see extract_batch_with_pool())
+try:
+    from gevent.pool import Pool as GeventPool
+except ImportError:
+    GeventPool = None
+# Custom modules
+from extraction_pool import ExtractionPool, PoolFullError, extract_job
+from postgres_handler import PGHandler
+from structured_logging import configure_logging
+
+
+# Job id in a saved page's file name (e.g. '1234567890.html') or in a LinkedIn job posting url
+FILENAME_ID_REGEX = re.compile(r'(\d{6,})')
+URL_ID_REGEX = re.compile(r'linkedin\.com/jobs/view/(\d+)')
+
+HTML_EXTENSIONS = ('.html', '.htm')
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+
+# Extraction errors worth retrying the document for later (see extract_document()) - e.g. the API's extraction
+# pool being full of single job POST requests
+RETRYABLE_ERRORS = (PoolFullError,)
+# Seconds waited before the first / at most between retries of a document refused by a full extraction pool
+POOL_RETRY_DELAY = 0.05
+POOL_RETRY_MAX_DELAY = 1
+
+
+def make_document(source, job_id=None, html=None, error=None):
+    """
+    Input:  Description of where the document came from (file name / line number), and its job id and HTML
+            or the reason it could not be read
+    Output: Document dict, as consumed by BulkIngestor.ingest()
+    """
+    return {'source': source, 'id': job_id, 'html': html, 'error': error}
+
+
+def document_from_page(source, html):
+    """
+    Input:  File name and HTML content of a saved job posting page
+    Output: Document dict, with the job id taken from the file name or the job posting url in the page
+    """
+    id_match = FILENAME_ID_REGEX.search(os.path.basename(source)) or URL_ID_REGEX.search(html[:4096])
+    if id_match is None:
+        return make_document(source, error="No job id found in the file name or page url")
+    return make_document(source, job_id=int(id_match.group(1)), html=html)
+
+
+def iter_ndjson_documents(lines, source='line'):
+    """
+    Input:  Iterable of NDJSON lines (str or bytes), each a {"id": ..., "HTML": ...} object
+    Output: Generator of document dicts
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        line_source = f"{source} {line_number}"
+        try:
+            job_input = json.loads(line)
+            yield make_document(line_source, job_id=int(job_input['id']), html=str(job_input['HTML']))
+        except (ValueError, TypeError, KeyError) as error:
+            yield make_document(line_source, error=f"Invalid document: {type(error).__name__}: {error}")
+
+
+def iter_path_documents(path):
+    """
+    Input:  Path to a directory of saved pages, a tarball of saved pages or an NDJSON file
+    Output: Generator of document dicts
+    """
+    if os.path.isdir(path):
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.lower().endswith(HTML_EXTENSIONS):
+                    filepath = os.path.join(dirpath, filename)
+                    with open(filepath, 'r', encoding='utf-8', errors='replace') as rf:
+                        yield document_from_page(filepath, rf.read())
+
+    elif path.lower().endswith(NDJSON_EXTENSIONS):
+        with open(path, 'r', encoding='utf-8') as rf:
+            yield from iter_ndjson_documents(rf, source=f"{path} line")
+
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path, 'r:*') as tar:
+            for member in tar:
+                if member.isfile() and member.name.lower().endswith(HTML_EXTENSIONS):
+                    html = tar.extractfile(member).read().decode('utf-8', errors='replace')
+                    yield document_from_page(f"{path}:{member.name}", html)
+
+    else:
+        yield make_document(path, error="Not a directory, tarball or NDJSON file")
+
+
+def extract_document(document, extract=extract_job):
+    """
+    Extract the job data from a single document. Runs inside the extraction workers.
+    Inputs:  Document dict, and the function used to extract it (default: directly in the calling process)
+    Outputs: Tuple of (job id, JobRecord of the extracted data or None, error message or None, boolean
+             indicating whether the error is transient - see RETRYABLE_ERRORS)
+    """
+    try:
+        return document['id'], extract({'id': document['id'], 'html': document['html']}), None, False
+    except Exception as error:
+        return document['id'], None, f"{type(error).__name__}: {error}", isinstance(error, RETRYABLE_ERRORS)
+
+
+def extract_with_pool_retries(job_input_data):
+    """
+    Extract the job data from a LinkedIn job posting using the API's ExtractionPool - while the pool is full,
+    retried with exponential backoff for up to the pool's timeout
+    Inputs:  Dict with the 'id' and 'html' fields, as expected by JobData
+    Outputs: JobRecord (JobData.data) populated with the extracted job data
+             Raises PoolFullError if the pool stays full, ExtractionTimeoutError (see ExtractionPool.extract())
+    """
+    delay = POOL_RETRY_DELAY
+    deadline = time.monotonic() + (ExtractionPool.timeout or 0)
+    while True:
+        try:
+            return ExtractionPool.extract(job_input_data)
+        except PoolFullError:
+            if time.monotonic() + delay > deadline:
+                raise
+            # Yields to other greenlets under the gevent server (see PGHandler.use_gevent())
+            PGHandler.pool_primitives['sleep'](delay)
+            delay = min(2 * delay, POOL_RETRY_MAX_DELAY)
+
+
+def extract_batch_with_pool(documents):
+    """
+    Extract a batch of documents using the API's ExtractionPool (see extraction_pool.py)
+    At most one document per pool worker is submitted at a time, so the pool's queue stays available to
+    the regular single job POST requests - one document at a time if gevent is not installed. Documents
+    refused by a full pool are retried (see extract_with_pool_retries())
+    Inputs:  List of document dicts
+    Outputs: List of extract_document() results
+    """
+    extract = partial(extract_document, extract=extract_with_pool_retries)
+    if GeventPool is None:
+        return [extract(document) for document in documents]
+    return GeventPool(ExtractionPool.workers or 1).map(extract, documents)
+
+
+class BulkIngestor:
+    """
+    BulkIngestor objects stream documents through extraction and into the database in batches:
+    1. Jobs already in the database (or repeated within the batch) are skipped before extraction
+    2. The remaining documents are extracted in parallel by the given extract_batch function
+    3. The extracted jobs are committed in a single transaction (see PGHandler.insert_jobs())
+    Documents which could not be extracted for a transient reason (see RETRYABLE_ERRORS) get the 'retry'
+    status instead of 'failed', to be ingested again later.
+    Keeps running counts of the results, used to report throughput.
+    """
+    STATUSES = ['inserted', 'exists', 'failed', 'retry']
+
+    def __init__(self, extract_batch, batch_size=100):
+        # extract_batch: function taking a list of document dicts and returning their extract_document() results
+        self.extract_batch = extract_batch
+        self.batch_size = batch_size
+        self.counts = dict.fromkeys(['documents'] + self.STATUSES, 0)
+        self.start_time = time.perf_counter()
+
+
+    def ingest(self, documents):
+        """
+        Input:  Iterable of document dicts (see make_document())
+        Output: Generator of per-document result dicts - {'source', 'id', 'status', 'error'}
+        """
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= self.batch_size:
+                yield from self.ingest_batch(batch)
+                batch = []
+        if batch:
+            yield from self.ingest_batch(batch)
+
+
+    def ingest_batch(self, batch):
+        """
+        Input:  List of document dicts
+        Output: List of per-document result dicts, in the same order as the batch
+        """
+        results = [None] * len(batch)
+
+        # Skip unreadable documents and jobs already in the database before spending time extracting them
+        seen_ids = PGHandler.select_existing_ids([d['id'] for d in batch if d['error'] is None]) or set()
+        to_extract = []
+        for i, document in enumerate(batch):
+            if document['error'] is not None:
+                results[i] = self.make_result(document, 'failed', document['error'])
+            elif document['id'] in seen_ids:
+                results[i] = self.make_result(document, 'exists')
+            else:
+                seen_ids.add(document['id'])
+                to_extract.append(i)
+
+        # Extract in parallel, then commit every successfully extracted job in a single transaction
+        extracted = self.extract_batch([batch[i] for i in to_extract])
+        insert_status = PGHandler.insert_jobs([job_data for _, job_data, error, _ in extracted if error is None])
+
+        for i, (job_id, job_data, error, retryable) in zip(to_extract, extracted):
+            if error is not None:
+                results[i] = self.make_result(batch[i], 'retry' if retryable else 'failed', error)
+            else:
+                status = insert_status.get(job_id, 'failed: Not committed to the database')
+                if status.startswith('failed'):
+                    results[i] = self.make_result(batch[i], 'failed', status[len('failed: '):])
+                else:
+                    results[i] = self.make_result(batch[i], status)
+
+        for result in results:
+            self.counts['documents'] += 1
+            self.counts[result['status']] += 1
+        return results
+
+
+    def make_result(self, document, status, error=None):
+        """
+        Output: Per-document result dict
+        """
+        return {'source': document['source'], 'id': document['id'], 'status': status, 'error': error}
+
+
+    def summary(self):
+        """
+        Output: Dict of result counts, elapsed time and throughput (documents per second)
+        """
+        elapsed = time.perf_counter() - self.start_time
+        return dict(self.counts, seconds=round(elapsed, 3),
+                    docs_per_sec=round(self.counts['documents'] / elapsed, 2) if elapsed > 0 else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='Directories / tarballs of saved pages, or NDJSON files')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of extraction processes')
+    parser.add_argument('--batch-size', type=int, default=200, help='Number of jobs committed per transaction')
+    parser.add_argument('--report', help='Write per-document results to this NDJSON file')
+    args = parser.parse_args()
+
+    configure_logging()
+    error = PGHandler.init_connection_pool()
+    if not PGHandler.connection_status:
+        sys.exit(error)
+
+    report = open(args.report, 'w', encoding='utf-8') if args.report else None
+
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        chunksize = max(1, args.batch_size // (4 * args.workers))
+        ingestor = BulkIngestor(lambda documents: list(executor.map(extract_document, documents, chunksize=chunksize)),
+                                batch_size=args.batch_size)
+
+        documents = (document for path in args.paths for document in iter_path_documents(path))
+        for n_results, result in enumerate(ingestor.ingest(documents), start=1):
+            if report is not None:
+                report.write(json.dumps(result) + '\n')
+            if result['status'] == 'failed':
+                print(f"FAILED {result['source']} (id: {result['id']}): {result['error']}")
+            # Counts are updated a batch at a time - report progress after the last result of each batch
+            if n_results == ingestor.counts['documents']:
+                print("Progress: {documents} documents ({inserted} inserted, {exists} already in database, "
+                      "{failed} failed) - {docs_per_sec} docs/sec".format(**ingestor.summary()))
+
+    if report is not None:
+        report.close()
+    print("Done: {documents} documents ({inserted} inserted, {exists} already in database, {failed} failed) "
+          "in {seconds} s - {docs_per_sec} docs/sec".format(**ingestor.summary()))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,19 +7,31 @@ chrome.runtime.onMessage.addListener(
         // Compile data and request for fetch, based on request type
         if (msg.instruction === 'POST') {
 
-            // Compile data and endpoint for POST request
-            let data = JSON.stringify({id: msg.id, HTML: msg.HTML})
-            let endpoint = hostUrl + "/jobs/"
-
-            // Create our request constructor with all the parameters we need
-            var request = new Request(endpoint, {
-                method: 'POST', 
-                body: data, 
-                headers: {'Content-Type': 'application/json'}
-            });
-
-            // Initiate POST request through fetch function
-            fetchFromServer(request, msg, sendResponse);
+            // Compile data and endpoint for POST request - the HTML is sent as the gzip-compressed request body,
+            // and read by the server as it arrives (see request_decoding.py). Falls back to the uncompressed
+            // JSON document if the browser does not support CompressionStream
+            if (typeof CompressionStream === 'undefined') {
+                var request = new Request(hostUrl + "/jobs/", {
+                    method: 'POST',
+                    body: JSON.stringify({id: msg.id, HTML: msg.HTML}),
+                    headers: {'Content-Type': 'application/json'}
+                });
+                fetchFromServer(request, msg, sendResponse);
+            }
+            else {
+                let endpoint = hostUrl + "/jobs/?id=" + encodeURIComponent(msg.id)
+                gzipText(msg.HTML).then(function(data) {
+                    // Create our request constructor with all the parameters we need
+                    var request = new Request(endpoint, {
+                        method: 'POST',
+                        body: data,
+                        headers: {'Content-Type': 'text/html; charset=utf-8', 'Content-Encoding': 'gzip'}
+                    });
+
+                    // Initiate POST request through fetch function
+                    fetchFromServer(request, msg, sendResponse);
+                });
+            }
         }
 
         if (msg.instruction === 'GET') {
@@ -55,6 +67,13 @@ chrome.runtime.onMessage.addListener(
 )
 
 
+// Compress a string (UTF-8 encoded) with gzip - resolves to an ArrayBuffer
+function gzipText(text) {
+    let stream = new Blob([text]).stream().pipeThrough(new CompressionStream('gzip'));
+    return new Response(stream).arrayBuffer();
+}
+
+
 // Wrapper function for fetch from server
 function fetchFromServer(request, message, sendResponse) {
     fetch(request)
@@ -1,3 +1,8 @@
+// Classes of the job posting's header card, which holds the job title, company and location
+// (must match JobData.HEADER_CLASSES in html_processor.py)
+var HEADER_CLASSES = ['mt6', 'ml5', 'flex-grow-1'];
+
+
 // Listen for messages
 chrome.runtime.onMessage.addListener(
     function (msg, sender, sendResponse) {
@@ -7,9 +12,9 @@ chrome.runtime.onMessage.addListener(
               "Hint: URL should begin with 'https://www.linkedin.com/jobs/view'");
     }
     if (msg.instruction === 'startPostRequest') {
-        // Send a message containing the webpage's HTML to the background script for POST to server
+        // Send a message containing the job posting's HTML to the background script for POST to server
         // Has a callback - user alert message
-        var webpageDOM = document.all[0].outerHTML
+        var webpageDOM = prunedPostingHTML()
         chrome.runtime.sendMessage({instruction: 'POST', id: msg.job_id, HTML: webpageDOM}, alertComplete);
     }
     if (msg.instruction === 'startGetRequest') {
@@ -25,6 +30,22 @@ chrome.runtime.onMessage.addListener(
 });
 
 
+// Get the HTML of the parts of the webpage the server extracts the job data from - the header card and the
+// main article tag - instead of the whole page and its scripts / styles, a small fraction of its size
+// Falls back to the whole page if either is missing
+function prunedPostingHTML() {
+    var article = document.querySelector('article');
+    // First div tag with only header card classes, as searched by the server
+    var header = Array.prototype.find.call(document.querySelectorAll('div[class]'), function (div) {
+        return Array.prototype.every.call(div.classList, function (c) { return HEADER_CLASSES.includes(c); });
+    });
+    if (article === null || header === undefined) {
+        return document.all[0].outerHTML;
+    }
+    return '<html><body>' + header.outerHTML + article.outerHTML + '</body></html>';
+}
+
+
 // Display alert message to user on successful/failed request to server
 function alertComplete(status) {
     let alertText = ''
@@ -0,0 +1,277 @@
+# Utility
+import time
+import threading
+from collections import deque
+# Psycopg2
+import psycopg2
+import psycopg2.extensions
+from psycopg2 import pool
+# Custom modules
+from metrics import Metrics
+
+
+class PoolTimeoutError(pool.PoolError):
+    """
+    Raised when no connection of the ManagedConnectionPool becomes available within the checkout timeout
+    """
+    pass
+
+
+# Blocking / concurrency primitives used by the pool - native threads by default, replaced by their gevent
+# equivalents by PGHandler.use_gevent() so greenlets waiting on the pool do not block the gevent hub
+THREAD_PRIMITIVES = {
+    'semaphore': threading.BoundedSemaphore,
+    'spawn': lambda function: threading.Thread(target=function, daemon=True).start(),
+    'sleep': time.sleep,
+}
+
+
+class ManagedConnectionPool:
+    """
+    ManagedConnectionPool objects manage a pool of connections to the Postgres database, safe to share between
+    threads (or greenlets, see THREAD_PRIMITIVES):
+    - min_size connections are opened upfront, and up to max_size on demand
+    - Callers wait up to checkout_timeout seconds for a connection when all max_size are in use
+    - Connections idle for ping_after seconds or more are validated (pre-pinged) on checkout, broken ones are
+      evicted and replaced
+    - When the database cannot be reached, the pool is marked unhealthy and reconnects in the background with
+      exponential backoff (status_callback is called with the pool's health whenever it changes)
+    Keeps metrics of its usage, see stats().
+    """
+    def __init__(self, min_size, max_size, checkout_timeout, ping_after, status_callback=None,
+                 primitives=THREAD_PRIMITIVES, **connect_kwargs):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.ping_after = ping_after
+        self.status_callback = status_callback
+        self.primitives = primitives
+        self.connect_kwargs = connect_kwargs
+
+        self.slots = primitives['semaphore'](max_size)  # One slot per connection that can be checked out
+        self.lock = threading.Lock()                     # Guards the attributes below, never held while blocking
+        self.idle = deque()                              # Tuples of (connection, time returned to the pool)
+        self.size = 0                                    # Open connections, idle or in use
+        self.in_use = 0
+        self.waiters = 0
+        self.healthy = False
+        self.reconnecting = False
+        self.closed = False
+        self.metrics = {'checkouts': 0, 'timeouts': 0, 'connects': 0, 'failed_connects': 0, 'evictions': 0,
+                        'reconnects': 0, 'wait_time_total': 0.0, 'wait_time_max': 0.0}
+
+
+    def open(self):
+        """
+        Open min_size connections, or mark the pool unhealthy (and start reconnecting) if the database
+        cannot be reached
+        Outputs: None if successful, else the connection error
+        """
+        try:
+            while self.size < self.min_size:
+                self.add_idle(self.connect())
+        except psycopg2.OperationalError as error:
+            return error
+        self.set_healthy(True)
+
+
+    def connect(self):
+        """
+        Output: New connection to the database (marks the pool unhealthy if the connection fails)
+        """
+        try:
+            con = psycopg2.connect(**self.connect_kwargs)
+        except psycopg2.OperationalError:
+            with self.lock:
+                self.metrics['failed_connects'] += 1
+            self.mark_unhealthy()
+            raise
+        with self.lock:
+            self.size += 1
+            self.metrics['connects'] += 1
+        return con
+
+
+    def getconn(self):
+        """
+        Check out a connection, waiting up to checkout_timeout seconds for one to become available
+        Outputs: Connection (raises PoolTimeoutError on timeout, or psycopg2.OperationalError if a new
+                 connection is needed and the database cannot be reached)
+        """
+        if self.closed:
+            raise pool.PoolError("Connection pool is closed")
+
+        start = time.monotonic()
+        with self.lock:
+            self.waiters += 1
+        try:
+            acquired = self.slots.acquire(timeout=self.checkout_timeout)
+        finally:
+            wait_time = time.monotonic() - start
+            with self.lock:
+                self.waiters -= 1
+                self.metrics['wait_time_total'] += wait_time
+                self.metrics['wait_time_max'] = max(self.metrics['wait_time_max'], wait_time)
+            Metrics.observe(Metrics.db_pool_wait_seconds, wait_time)
+
+        if not acquired:
+            with self.lock:
+                self.metrics['timeouts'] += 1
+            raise PoolTimeoutError(f"No database connection available after {self.checkout_timeout} seconds "
+                                   f"({self.max_size} connections in use)")
+
+        try:
+            con = self.checkout_idle()
+            if con is None:
+                con = self.connect()
+        except Exception:
+            self.slots.release()
+            raise
+
+        with self.lock:
+            self.in_use += 1
+            self.metrics['checkouts'] += 1
+        return con
+
+
+    def checkout_idle(self):
+        """
+        Output: Most recently used idle connection that is still alive, None if there are none
+        """
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                con, returned_time = self.idle.pop()
+
+            if con.closed:
+                self.evict(con)
+                continue
+
+            if time.monotonic() - returned_time >= self.ping_after:
+                try:
+                    with con.cursor() as cur:
+                        cur.execute("SELECT 1;")
+                    con.rollback()
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    self.evict(con)
+                    continue
+            return con
+
+
+    def putconn(self, con, close=False):
+        """
+        Return a checked out connection to the pool
+        Inputs:  Connection, and boolean to close it (e.g. if it turned out to be broken) rather than reuse it
+        """
+        if not close and not con.closed:
+            # Never hand out a connection in the middle of (or after a failed) transaction
+            if con.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    con.rollback()
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    close = True
+
+        with self.lock:
+            self.in_use -= 1
+
+        if close or con.closed or self.closed:
+            self.evict(con)
+        else:
+            self.add_idle(con)
+        self.slots.release()
+
+
+    def add_idle(self, con):
+        with self.lock:
+            self.idle.append((con, time.monotonic()))
+
+
+    def evict(self, con):
+        """
+        Close a connection and remove it from the pool
+        """
+        try:
+            con.close()
+        except psycopg2.Error:
+            pass
+        with self.lock:
+            self.size -= 1
+            self.metrics['evictions'] += 1
+
+
+    def evict_idle(self):
+        """
+        Close every idle connection (e.g. after one of them turned out broken, as the others likely are too)
+        """
+        with self.lock:
+            idle, self.idle = list(self.idle), deque()
+        for con, _ in idle:
+            self.evict(con)
+
+
+    def set_healthy(self, healthy):
+        with self.lock:
+            changed = healthy != self.healthy
+            self.healthy = healthy
+        if changed and self.status_callback is not None:
+            self.status_callback(healthy)
+
+
+    def mark_unhealthy(self):
+        """
+        Mark the pool unhealthy, drop its idle connections and start reconnecting in the background
+        """
+        with self.lock:
+            if self.reconnecting or self.closed:
+                return
+            self.reconnecting = True
+        self.set_healthy(False)
+        self.evict_idle()
+        self.primitives['spawn'](self.reconnect)
+
+
+    def reconnect(self, initial_delay=1, max_delay=30):
+        """
+        Attempt to connect to the database until successful, doubling the delay between attempts every time
+        (runs in the background, see mark_unhealthy())
+        """
+        delay = initial_delay
+        while not self.closed:
+            self.primitives['sleep'](delay)
+            try:
+                con = psycopg2.connect(**self.connect_kwargs)
+            except psycopg2.OperationalError:
+                with self.lock:
+                    self.metrics['failed_connects'] += 1
+                delay = min(2 * delay, max_delay)
+                continue
+
+            with self.lock:
+                self.size += 1
+                self.metrics['connects'] += 1
+                self.metrics['reconnects'] += 1
+                self.reconnecting = False
+            self.add_idle(con)
+            self.set_healthy(True)
+            return
+
+
+    def closeall(self):
+        """
+        Close the pool - idle connections are closed now, checked out ones when returned
+        """
+        self.closed = True
+        self.evict_idle()
+
+
+    def stats(self):
+        """
+        Output: Dict of the pool's configuration, current state and usage metrics
+        """
+        with self.lock:
+            checkouts = self.metrics['checkouts'] + self.metrics['timeouts']
+            return dict(self.metrics,
+                        min_size=self.min_size, max_size=self.max_size, size=self.size, idle=len(self.idle),
+                        in_use=self.in_use, waiters=self.waiters, healthy=self.healthy,
+                        wait_time_avg=self.metrics['wait_time_total'] / checkouts if checkouts else 0.0)
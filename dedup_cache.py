@@ -0,0 +1,144 @@
+# Utility
+import os
+import hashlib
+import threading
+from collections import deque, OrderedDict
+from dotenv import load_dotenv, find_dotenv
+
+
+class DedupCache:
+    """
+    DedupCache class lets the API reject job postings it has already stored (or is currently extracting)
+    before parsing their HTML, without a database round trip:
+    - Known job ids: bounded set of the most recently stored job ids, seeded from the database at startup and
+      updated by PGHandler as jobs are inserted (see init_cache())
+    - In-flight job ids: jobs currently being extracted / inserted by this process (e.g. repeated clicks on
+      the Chrome Extension while the first request is still being processed)
+    - Content hashes (optional): hashes of recently stored postings' HTML, to reject the same page posted
+      under a different job id
+    Ids missing from the bounded sets fall through to the regular path, where PGHandler.insert_job()
+    checks the database.
+    """
+    max_known_ids = 0
+    known_ids = set()
+    known_ids_order = deque()  # Known ids in insertion order, oldest first (evicted first)
+    in_flight_ids = set()
+    content_hashes = None      # OrderedDict of content hash: job id, oldest first, if enabled
+    max_content_hashes = 0
+    rejected = {'known': 0, 'in_flight': 0, 'content': 0}
+    lock = threading.Lock()
+
+
+    @classmethod
+    def init_cache(cls, recent_ids_loader=None, job_change_hook=None):
+        """
+        Initialize the dedup cache
+        Inputs:  Reads the following (optional) environment variables from the .env file:
+                 DEDUP_KNOWN_IDS      - Maximum number of known job ids kept in memory (default: 100000, 0: off)
+                 DEDUP_CONTENT_HASHES - Maximum number of content hashes kept in memory (default: 0, i.e. off)
+                 Function taking a number n and returning the ids of the n most recently inserted jobs
+                 (i.e. PGHandler.select_recent_ids)
+                 Function registering a callback to be called with the ids of inserted / updated jobs
+                 (i.e. PGHandler.add_job_change_listener)
+        Outputs: DedupCache class attributes
+        """
+        load_dotenv(find_dotenv())
+
+        with cls.lock:
+            cls.max_known_ids = int(os.environ.get("DEDUP_KNOWN_IDS") or 100000)
+            cls.max_content_hashes = int(os.environ.get("DEDUP_CONTENT_HASHES") or 0)
+            cls.known_ids = set()
+            cls.known_ids_order = deque()
+            cls.content_hashes = OrderedDict() if cls.max_content_hashes > 0 else None
+            cls.rejected = dict.fromkeys(cls.rejected, 0)
+
+        if cls.max_known_ids > 0 and recent_ids_loader is not None:
+            # Loaded most recent first - add oldest first so the most recent ids are the last to be evicted
+            recent_ids = recent_ids_loader(cls.max_known_ids)
+            cls.add_known_ids(reversed(recent_ids or []))
+        if job_change_hook is not None:
+            job_change_hook(cls.add_known_ids)
+
+
+    @classmethod
+    def add_known_ids(cls, job_ids):
+        """
+        Input:  Iterable of ids of jobs stored in the database
+        """
+        if cls.max_known_ids <= 0:
+            return
+        with cls.lock:
+            for job_id in job_ids:
+                if job_id not in cls.known_ids:
+                    cls.known_ids.add(job_id)
+                    cls.known_ids_order.append(job_id)
+            while len(cls.known_ids_order) > cls.max_known_ids:
+                cls.known_ids.discard(cls.known_ids_order.popleft())
+
+
+    @staticmethod
+    def hash_content(html):
+        """
+        Input:  String of the posted HTML
+        Output: Bytes digest of the HTML
+        """
+        return hashlib.blake2b(html.encode('utf-8', errors='surrogatepass'), digest_size=16).digest()
+
+
+    @classmethod
+    def claim(cls, job_id, html=None):
+        """
+        Check whether a posted job is a duplicate and, if not, mark it as in flight - every successful claim
+        must be followed by a call to release()
+        Inputs:  Integer job id, and (optionally) string of the posted HTML
+        Outputs: None if the job was claimed, else the reason it is a duplicate: 'known' (already in the
+                 database), 'in_flight' (currently being processed) or 'content' (same HTML already stored)
+        """
+        content_hash = None
+        if html is not None and cls.content_hashes is not None:
+            content_hash = cls.hash_content(html)
+
+        with cls.lock:
+            if job_id in cls.known_ids:
+                reason = 'known'
+            elif job_id in cls.in_flight_ids:
+                reason = 'in_flight'
+            elif content_hash is not None and content_hash in cls.content_hashes:
+                reason = 'content'
+            else:
+                cls.in_flight_ids.add(job_id)
+                return None
+            cls.rejected[reason] += 1
+            return reason
+
+
+    @classmethod
+    def release(cls, job_id, html=None, stored=False):
+        """
+        Release a job claimed with claim()
+        Inputs:  Integer job id, (optionally) string of the posted HTML, and boolean indicating whether the
+                 job is now in the database (inserted, or found to exist already)
+        """
+        content_hash = None
+        if stored and html is not None and cls.content_hashes is not None:
+            content_hash = cls.hash_content(html)
+
+        with cls.lock:
+            cls.in_flight_ids.discard(job_id)
+            if content_hash is not None:
+                cls.content_hashes[content_hash] = job_id
+                while len(cls.content_hashes) > cls.max_content_hashes:
+                    cls.content_hashes.popitem(last=False)
+        if stored:
+            cls.add_known_ids([job_id])
+
+
+    @classmethod
+    def stats(cls):
+        """
+        Output: Dict of the number of ids / hashes held and of the duplicates rejected
+        """
+        return {'known_ids': len(cls.known_ids), 'max_known_ids': cls.max_known_ids,
+                'in_flight_ids': len(cls.in_flight_ids),
+                'content_hashes': len(cls.content_hashes) if cls.content_hashes is not None else None,
+                'rejected': dict(cls.rejected)}
@@ -0,0 +1,294 @@
+# Utility
+import os
+import time
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dotenv import load_dotenv, find_dotenv
+# Gevent (required by the 'thread' pool type, and to wait on worker processes without blocking the server)
+try:
+    from gevent import get_hub
+    from gevent.threadpool import ThreadPool
+    from gevent import Timeout as GeventTimeout
+except ImportError:
+    get_hub = None
+    ThreadPool = None
+    GeventTimeout = None
+# Custom modules
+from html_processor import JobData
+from metrics import Metrics
+
+
+class PoolFullError(Exception):
+    """
+    Raised when a task is submitted to the ExtractionPool while all of its task slots are taken
+    """
+    pass
+
+
+class ExtractionTimeoutError(Exception):
+    """
+    Raised when a task submitted to the ExtractionPool does not complete within its timeout
+    """
+    pass
+
+
+def extract_job(job_input_data):
+    """
+    Extract the job data from a LinkedIn job posting. Runs inside the pool's workers.
+    Inputs:  Dict with the 'id' and 'html' fields, as expected by JobData
+    Outputs: JobRecord (JobData.data) populated with the extracted job data
+    """
+    current_job = JobData(job_input_data=job_input_data)
+    current_job.extract_job_data()
+    return current_job.data
+
+
+def extract_job_timed(job_input_data, backend=None):
+    """
+    Same as extract_job(), also returning the time spent in each stage of the extraction - metrics recorded in
+    a worker process would not reach the API's /metrics, they are recorded by the caller (see ExtractionPool)
+    Inputs:  Dict with the 'id' and 'html' fields, as expected by JobData, and parser backend (default: see
+             JobData.PARSER_BACKENDS)
+    Outputs: Tuple of (JobRecord, parser backend, list of (stage, seconds) tuples - see JobData.timings)
+    """
+    current_job = JobData(job_input_data=job_input_data, backend=backend)
+    current_job.extract_job_data()
+    return current_job.data, current_job.backend, current_job.timings
+
+
+class DeadlineReader:
+    """
+    Binary file-like wrapper of a stream (e.g. a request body) raising ExtractionTimeoutError when read past its
+    deadline - bounds the time spent feeding it to the 'stream' parser backend, chunk by chunk
+    """
+    def __init__(self, stream, deadline, timeout_msg):
+        """
+        Inputs: Stream, time.monotonic() value of the deadline, and message of the ExtractionTimeoutError
+        """
+        self.stream = stream
+        self.deadline = deadline
+        self.timeout_msg = timeout_msg
+
+
+    def read(self, size=-1):
+        if time.monotonic() > self.deadline:
+            raise ExtractionTimeoutError(self.timeout_msg)
+        return self.stream.read(size)
+
+
+class ExtractionPool:
+    """
+    ExtractionPool class offloads the CPU-bound JobData.extract_job_data() calls made by the API to a pool
+    of worker processes (or native threads), so parsing a large page does not stall every other request
+    served by the gevent server.
+    The pool accepts a bounded number of tasks (running + queued); tasks submitted beyond that are refused
+    with a PoolFullError so the API can tell the client to retry later.
+    """
+    # Pool types, selectable through the EXTRACTION_POOL environment variable (see .env)
+    # 'process' - Pool of worker processes, extraction runs on all available cores
+    # 'thread'  - Gevent's pool of native threads, only lxml's C code runs in parallel (GIL)
+    # 'inline'  - No pool, extraction runs in the calling greenlet (original behaviour)
+    # NOTE: Streamed postings (see extract_stream()) are parsed in the calling greenlet with any pool type, in one
+    # of the pool's task slots
+    POOL_TYPES = ['process', 'thread', 'inline']
+
+    pool_type = 'inline'
+    workers = None
+    executor = None
+    thread_executor = None  # Native thread pool used by extract_async() for the 'thread' / 'inline' pool types
+    task_slots = None
+    timeout = None
+    retry_after = None
+
+
+    @classmethod
+    def init_pool(cls):
+        """
+        Initialize the extraction pool
+        Inputs:  Reads the following (optional) environment variables from the .env file:
+                 EXTRACTION_POOL        - Pool type, one of POOL_TYPES (default: 'process')
+                 EXTRACTION_WORKERS     - Number of workers (default: number of CPU cores)
+                 EXTRACTION_QUEUE_SIZE  - Number of tasks allowed to wait for a worker (default: 2 x workers)
+                 EXTRACTION_TIMEOUT     - Seconds to wait for a task's result (default: 30)
+                 EXTRACTION_RETRY_AFTER - Seconds clients are told to wait when the pool is full (default: 5)
+        Outputs: ExtractionPool class attributes (worker processes / threads are started on first use)
+        """
+        load_dotenv(find_dotenv())
+
+        pool_type = os.environ.get("EXTRACTION_POOL", "process")
+        if pool_type not in cls.POOL_TYPES:
+            raise ValueError(f"Unknown extraction pool type: {pool_type}")
+        if pool_type == 'thread' and ThreadPool is None:
+            raise ImportError("The 'thread' extraction pool requires the gevent package to be installed")
+
+        cls.shutdown()
+        cls.pool_type = pool_type
+        cls.workers = int(os.environ.get("EXTRACTION_WORKERS") or os.cpu_count())
+        queue_size = int(os.environ.get("EXTRACTION_QUEUE_SIZE") or 2 * cls.workers)
+        cls.timeout = float(os.environ.get("EXTRACTION_TIMEOUT") or 30)
+        cls.retry_after = int(os.environ.get("EXTRACTION_RETRY_AFTER") or 5)
+        cls.task_slots = threading.BoundedSemaphore(cls.workers + queue_size)
+        
+        # Results from worker processes are waited on in the gevent hub's native threads (see extract()),
+        # make sure there are enough of them for every task slot
+        if cls.pool_type == 'process' and get_hub is not None:
+            hub_threadpool = get_hub().threadpool
+            hub_threadpool.maxsize = max(hub_threadpool.maxsize, cls.workers + queue_size)
+
+
+    @classmethod
+    def get_executor(cls):
+        """
+        Lazily create the pool's executor, so importing the API (e.g. in a spawned worker) starts no workers
+        Outputs: ProcessPoolExecutor / gevent ThreadPool
+        """
+        if cls.executor is None:
+            if cls.pool_type == 'process':
+                # 'spawn' gives workers a clean interpreter, without the parent's gevent hub / db connections
+                cls.executor = ProcessPoolExecutor(max_workers=cls.workers,
+                                                   mp_context=multiprocessing.get_context('spawn'))
+            else:
+                cls.executor = ThreadPool(cls.workers)
+        return cls.executor
+
+
+    @classmethod
+    def extract(cls, job_input_data):
+        """
+        Extract the job data from a LinkedIn job posting using the pool's workers
+        Inputs:  Dict with the 'id' and 'html' fields, as expected by JobData
+        Outputs: JobRecord (JobData.data) populated with the extracted job data
+                 Raises PoolFullError if the pool cannot accept more tasks, ExtractionTimeoutError if the
+                 task does not complete within the configured timeout
+        """
+        if cls.pool_type == 'inline':
+            return cls.record_timings(extract_job_timed(job_input_data))
+
+        if not cls.task_slots.acquire(blocking=False):
+            raise PoolFullError(f"Extraction pool is full ({cls.pool_type}, {cls.workers} workers)")
+
+        # Task slots are released when the task completes, not when the caller stops waiting for it -
+        # a task which timed out still occupies its worker until it is done
+        try:
+            if cls.pool_type == 'process':
+                future = cls.get_executor().submit(extract_job_timed, job_input_data)
+                future.add_done_callback(lambda f: cls.task_slots.release())
+            else:
+                result = cls.get_executor().spawn(extract_job_timed, job_input_data)
+                result.rawlink(lambda r: cls.task_slots.release())
+        except Exception:
+            cls.task_slots.release()
+            raise
+
+        timeout_msg = f"Job id: {job_input_data['id']} extraction timed out after {cls.timeout} seconds"
+        if cls.pool_type == 'process':
+            try:
+                # Future.result() blocks the calling thread - under gevent, block one of the hub's native
+                # threads instead so other greenlets keep being served in the meantime
+                if get_hub is not None:
+                    return cls.record_timings(get_hub().threadpool.apply(future.result, (cls.timeout,)))
+                return cls.record_timings(future.result(timeout=cls.timeout))
+            except FutureTimeoutError:
+                future.cancel()
+                raise ExtractionTimeoutError(timeout_msg)
+        else:
+            try:
+                return cls.record_timings(result.get(timeout=cls.timeout))
+            except GeventTimeout:
+                raise ExtractionTimeoutError(timeout_msg)
+
+
+    @classmethod
+    def extract_stream(cls, job_id, stream):
+        """
+        Extract the job data from a LinkedIn job posting read from a stream (e.g. the request body), with the
+        'stream' parser backend - the page is parsed as it is read, and never held in full
+        The stream cannot be handed to the pool's workers: it is parsed in the calling greenlet, but only in one
+        of the pool's task slots, and within the pool's timeout (checked before every chunk is read, and while
+        waiting on the stream under gevent)
+        Inputs:  Integer job id, and binary file-like object of the posting's HTML
+        Outputs: JobRecord (JobData.data) populated with the extracted job data
+                 Raises PoolFullError if the pool cannot accept more tasks, ExtractionTimeoutError if the
+                 task does not complete within the configured timeout
+        """
+        job_input_data = {'id': job_id, 'html': stream}
+        if cls.pool_type == 'inline':
+            return cls.record_timings(extract_job_timed(job_input_data, backend='stream'))
+
+        if not cls.task_slots.acquire(blocking=False):
+            raise PoolFullError(f"Extraction pool is full ({cls.pool_type}, {cls.workers} workers)")
+
+        timeout_msg = f"Job id: {job_id} extraction timed out after {cls.timeout} seconds"
+        job_input_data['html'] = DeadlineReader(stream, time.monotonic() + cls.timeout, timeout_msg)
+        try:
+            if GeventTimeout is None:
+                return cls.record_timings(extract_job_timed(job_input_data, backend='stream'))
+            with GeventTimeout(cls.timeout, ExtractionTimeoutError(timeout_msg)):
+                return cls.record_timings(extract_job_timed(job_input_data, backend='stream'))
+        finally:
+            cls.task_slots.release()
+
+
+    @classmethod
+    async def extract_async(cls, job_input_data):
+        """
+        Extract the job data from a LinkedIn job posting using the pool's workers, without blocking the 
+        asyncio event loop (used by the ASGI server, see api_asgi_server.py)
+        With the 'thread' and 'inline' pool types, extraction runs in a pool of native threads (gevent's
+        thread pool is not usable from asyncio, and extracting inline would block the event loop)
+        Inputs:  Dict with the 'id' and 'html' fields, as expected by JobData
+        Outputs: JobRecord (JobData.data) populated with the extracted job data
+                 Raises PoolFullError if the pool cannot accept more tasks, ExtractionTimeoutError if the
+                 task does not complete within the configured timeout
+        """
+        if not cls.task_slots.acquire(blocking=False):
+            raise PoolFullError(f"Extraction pool is full ({cls.pool_type}, {cls.workers} workers)")
+        
+        try:
+            if cls.pool_type == 'process':
+                future = cls.get_executor().submit(extract_job_timed, job_input_data)
+            else:
+                if cls.thread_executor is None:
+                    cls.thread_executor = ThreadPoolExecutor(max_workers=cls.workers)
+                future = cls.thread_executor.submit(extract_job_timed, job_input_data)
+            future.add_done_callback(lambda f: cls.task_slots.release())
+        except Exception:
+            cls.task_slots.release()
+            raise
+        
+        try:
+            return cls.record_timings(await asyncio.wait_for(asyncio.wrap_future(future), cls.timeout))
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise ExtractionTimeoutError(f"Job id: {job_input_data['id']} extraction timed out after "
+                                         f"{cls.timeout} seconds")
+    
+    
+    @classmethod
+    def record_timings(cls, result):
+        """
+        Input:  Result of extract_job_timed()
+        Output: JobRecord of the extracted job data, once the extraction's timings are recorded in Metrics
+        """
+        job_data, backend, timings = result
+        Metrics.observe_extraction(backend, timings)
+        return job_data
+    
+    
+    @classmethod
+    def shutdown(cls):
+        """
+        Stop the pool's workers, if any have been started
+        """
+        if cls.thread_executor is not None:
+            cls.thread_executor.shutdown(wait=False)
+            cls.thread_executor = None
+        if cls.executor is not None:
+            if cls.pool_type == 'process':
+                cls.executor.shutdown(wait=False)
+            else:
+                cls.executor.kill()
+            cls.executor = None
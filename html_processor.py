@@ -1,40 +1,131 @@
 import os
+import time
+import codecs
 # BeautifulSoup
 from bs4 import BeautifulSoup
 from bs4 import Comment
+from bs4.element import CData
+from bs4.builder import HTMLTreeBuilder
+from bs4.builder._htmlparser import BeautifulSoupHTMLParser
+# lxml (only required by the 'lxml' parser backend)
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    etree = None
+    lxml_html = None
+# Custom modules
+from job_record import JobRecord
+
+
+# Tags whose strings BeautifulSoup does not count as text in get_text() (Script / Stylesheet / TemplateString)
+NON_TEXT_TAGS = {'script', 'style', 'template'}
+# Tags inside which BeautifulSoup keeps whitespace-only strings as-is instead of collapsing them
+PRESERVE_WHITESPACE_TAGS = {'pre', 'textarea'}
+# Characters BeautifulSoup considers whitespace when collapsing whitespace-only strings
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+# Precompiled XPath queries used by the 'lxml' backend, mirroring the BeautifulSoup searches in
+# JobData.locate_text_bs4()
+if etree is not None:
+    XPATH_ARTICLE = etree.XPath("(//article)[1]")
+    XPATH_POSTING_TEXT = etree.XPath(".//div[@id='job-details']")
+    XPATH_DETAILS = etree.XPath(".//div[contains(concat(' ', normalize-space(@class), ' '), ' jobs-box__group ')]")
+    # Narrows down the candidates for the header card; the exact class check is done in Python
+    XPATH_HEADER_CANDIDATES = etree.XPath("//div[@class][normalize-space(@class) = '' "
+                                          "or contains(@class, 'mt6') "
+                                          "or contains(@class, 'ml5') "
+                                          "or contains(@class, 'flex-grow-1')]")
+    XPATH_FIRST_H1 = etree.XPath("(.//h1)[1]")
+    XPATH_FIRST_H3 = etree.XPath("(.//h3)[1]")
 
 
 class JobData:
     """
     JobData objects handle the extraction and storage of relevant job data from the LinkedIn HTML file
     currently being parsed.
-    Builds on top of BeautifulSoup objects and methods.
+    Builds on top of BeautifulSoup objects and methods (or lxml, see PARSER_BACKENDS).
     """
-    # Initialize dict for storing extracted data from each job posting
-    # NOTE: 'rejected' boolean field is not extracted and defaults to 'false' when committing
-    # a job to the db (see DDL_job_data.sql)
-    DATA_FIELDS = ['id', 'url', 'title', 'company', 'location', 'seniority', 
-                   'industries', 'employment_type', 'functions', 'posting_text']
+    # Classes of the div tag which contains the job name, company name, and job location text
+    HEADER_CLASSES = ['mt6', 'ml5', 'flex-grow-1']
+    
+    # Parser backends available to extract_job_data(), selectable per process through the
+    # HTML_PARSER_BACKEND environment variable (see .env)
+    # 'bs4'  - Builds a full BeautifulSoup tree of the page (reference implementation)
+    # 'lxml'   - Builds an lxml tree and locates only the required tags through precompiled XPath queries
+    #            (NOTE: libxml2 parses some malformed markup differently, see tests/test_html_processor.py)
+    # 'stream' - Feeds the page to an incremental parser in chunks, keeping only the text of the required
+    #            tags and stopping as soon as all of them have been read (see StreamingJobParser)
+    PARSER_BACKENDS = ['bs4', 'lxml', 'stream']
+    DEFAULT_PARSER_BACKEND = 'bs4'
+    
+    # Number of characters (or bytes, when reading from a file-like object) fed to the 'stream' backend at a time
+    FEED_CHUNK_SIZE = 64 * 1024
     
     # job_input_data is a dict recevied from the Chrome extension consisting of the 'id' and 'HTML' fields
-    def __init__(self, job_input_data, fields=DATA_FIELDS):
-        self.data = dict.fromkeys(fields)
+    # NOTE: 'html' may also be a binary / text file-like object (e.g. a request body stream), which is
+    # read incrementally by the 'stream' backend instead of being loaded whole
+    # Extracted data is stored as a JobRecord (see job_record.py), built once all of it is extracted
+    # The time spent in each stage of the extraction is recorded in self.timings, as (stage, seconds) tuples -
+    # 'read' (file-like input), 'parse', 'locate', then each field (see Metrics.extraction_stage_seconds)
+    # NOTE: 'rejected' boolean field is not extracted and defaults to 'false' when committing
+    # a job to the db (see DDL_job_data.sql)
+    def __init__(self, job_input_data, backend=None):
+        job_id = job_input_data['id']
+        self.data = JobRecord(id=job_id, url="https://www.linkedin.com/jobs/view/" + str(job_id) + "/")
         self.html = job_input_data['html']
-        self.data['id'] = job_input_data['id']
-        self.data['url'] = "https://www.linkedin.com/jobs/view/" + str(self.data['id']) + "/"
+        self.timings = []
+        self.backend = backend or os.environ.get("HTML_PARSER_BACKEND", self.DEFAULT_PARSER_BACKEND)
+        
+        if self.backend not in self.PARSER_BACKENDS:
+            raise ValueError(f"Unknown HTML parser backend: {self.backend}")
+        if self.backend == 'lxml' and etree is None:
+            raise ImportError("The 'lxml' parser backend requires the lxml package to be installed")
         
     
     def extract_job_data(self):
         """
         Input:  HTML content of a LinkedIn job posting
-        Output: self.data dict populated with relevant job data (as Strings or lists of Strings)
+        Output: self.data JobRecord populated with relevant job data (as Strings or lists of Strings)
+        """
+        # Only the 'stream' backend reads file-like input incrementally, the others need the whole page
+        if self.backend != 'stream' and hasattr(self.html, 'read'):
+            start = time.perf_counter()
+            self.html = self.html.read()
+            if isinstance(self.html, bytes):
+                self.html = self.html.decode('utf-8', errors='replace')
+            self.record_timing('read', start)
+        
+        # Each backend locates the relevant tags and returns their raw text, which is then processed
+        # identically regardless of the backend used
+        if self.backend == 'lxml':
+            raw_text = self.locate_text_lxml()
+        elif self.backend == 'stream':
+            raw_text = self.locate_text_stream()
+        else:
+            raw_text = self.locate_text_bs4()
+        
+        # The raw HTML is no longer needed once extracted, release it instead of holding on to it for the
+        # lifetime of the object
+        self.html = None
+        
+        self.store_raw_text(*raw_text)
+    
+    
+    def locate_text_bs4(self):
+        """ Utility function used in extract_job_data() - 'bs4' backend
+        Input:  HTML content of a LinkedIn job posting
+        Output: Tuple of raw text for the posting, the list of detail tags, the job title and the
+                company / location tag (see store_raw_text())
         """
         # # Read in the target HTML file
         # with open(self.filepath, 'r', encoding='utf-8') as rf:
         #     html_corpus = rf.read()
 
         # Create BS4 soup object    
+        start = time.perf_counter()
         soup = BeautifulSoup(self.html, 'html.parser')
+        start = self.record_timing('parse', start)
 
         # Extract all comment tags from the main soup object
         # comments = soup.find_all(string=lambda text: isinstance(text, Comment))
@@ -46,57 +137,203 @@ class JobData:
         # Find the div tag inside the main article tag which contatins the job posting text
         posting_text_tag = soup.find('article').find_all('div', {'id': 'job-details'})
         
-        # Extract job posting text from the tag
-        self.data['posting_text'] = self.process_text(posting_text_tag[0].get_text(separator=' '), 
-                                                      return_as_string=True)
-        
-        
         # Find the div tags inside the main article tag which contain the additional job details
         detail_tags = soup.find('article').find_all("div", {"class": "jobs-box__group"})
         
+        # Extract all div tags from the main soup object
+        tags_all = soup.find_all('div')
+
+        # Search for the tag which contains the job name, company name, and job location text
+        # Tag attributes are {'class': ['mt6', 'ml5', 'flex-grow-1']}
+        for t in tags_all:
+            if 'class' in t.attrs:
+                if all(x in self.HEADER_CLASSES for x in t.attrs['class']):
+                    tag_target = t
+                    break
+        
+        raw_text = (posting_text_tag[0].get_text(separator=' '),
+                    [tag.get_text(separator=' ') for tag in detail_tags],
+                    tag_target.find('h1').text,
+                    tag_target.find('h3').text)
+        self.record_timing('locate', start)
+        return raw_text
+    
+    
+    def locate_text_lxml(self):
+        """ Utility function used in extract_job_data() - 'lxml' backend
+        Input:  HTML content of a LinkedIn job posting
+        Output: Same as locate_text_bs4(), without building a BeautifulSoup tree of the whole page
+        """
+        start = time.perf_counter()
+        root = lxml_html.document_fromstring(self.html)
+        start = self.record_timing('parse', start)
+        
+        # Find the main article tag, then the posting text and detail tags inside it
+        article = XPATH_ARTICLE(root)
+        if not article:
+            raise AttributeError("No <article> tag found in the job posting HTML")
+        posting_text_tag = XPATH_POSTING_TEXT(article[0])
+        detail_tags = XPATH_DETAILS(article[0])
+        
+        # Search for the tag which contains the job name, company name, and job location text
+        for t in XPATH_HEADER_CANDIDATES(root):
+            if all(x in self.HEADER_CLASSES for x in t.get('class').split()):
+                tag_target = t
+                break
+        
+        raw_text = (self.get_text_lxml(posting_text_tag[0], separator=' '),
+                    [self.get_text_lxml(tag, separator=' ') for tag in detail_tags],
+                    self.get_text_lxml(XPATH_FIRST_H1(tag_target)[0]),
+                    self.get_text_lxml(XPATH_FIRST_H3(tag_target)[0]))
+        self.record_timing('locate', start)
+        return raw_text
+    
+    
+    def locate_text_stream(self):
+        """ Utility function used in extract_job_data() - 'stream' backend
+        Input:  HTML content of a LinkedIn job posting (string or file-like object)
+        Output: Same as locate_text_bs4(), reading the page in chunks and stopping once all tags are found
+        """
+        # Reading (and decoding) the input, parsing and keeping the text of the relevant tags are interleaved -
+        # all of it is recorded as 'parse'
+        start = time.perf_counter()
+        parser = StreamingJobParser()
+        
+        for chunk in self.iter_html_chunks():
+            parser.feed(chunk)
+            if parser.soup.is_complete():
+                break
+        else:
+            parser.close()
+        start = self.record_timing('parse', start)
+        
+        raw_text = parser.soup.get_raw_text()
+        self.record_timing('locate', start)
+        return raw_text
+    
+    
+    def iter_html_chunks(self):
+        """ Utility function used in locate_text_stream()
+        Input:  self.html (string, or binary / text file-like object)
+        Output: Generator of strings of at most FEED_CHUNK_SIZE characters
+        """
+        if isinstance(self.html, str):
+            for i in range(0, len(self.html), self.FEED_CHUNK_SIZE):
+                yield self.html[i:i + self.FEED_CHUNK_SIZE]
+            return
+        
+        # Binary streams are decoded incrementally so multi-byte characters split across chunks are preserved
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        while True:
+            chunk = self.html.read(self.FEED_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        yield decoder.decode(b'', final=True)
+    
+    
+    def store_raw_text(self, posting_text, detail_texts, title_text, company_location_text):
+        """ Utility function used in extract_job_data()
+        Input:  Raw text located by one of the parser backends
+        Output: self.data JobRecord populated with relevant job data (as Strings or lists of Strings)
+        """
+        # Extract job posting text from the tag
+        start = time.perf_counter()
+        posting_text = self.process_text(posting_text, return_as_string=True)
+        start = self.record_timing('posting_text', start)
+        
         # Parse through each tag and store data in an auxiliary dict
         detail_dict = dict.fromkeys(['Seniority Level', 'Industry', 'Employment Type', 'Job Functions'])
         
-        for tag in detail_tags:
-            detail_list = self.process_text(tag.get_text(separator=' '), return_as_string=False)
+        for detail_text in detail_texts:
+            detail_list = self.process_text(detail_text, return_as_string=False)
             # Determine if extracted header corresponds to one of the detail categories we care about
             if detail_list[0] in detail_dict.keys():
                 detail_dict[detail_list[0]] = detail_list[1:]
 
-        # Preprocess and extract relevant data from their respective tags
-        self.data['industries'] = detail_dict['Industry']
-        self.data['functions'] = detail_dict['Job Functions']
-        
         # Try/Except block needed to handle None if no Seniority or Employment Type in job description
         try:
-            self.data['seniority'] = detail_dict['Seniority Level'][0]        # pylint: disable=unsubscriptable-object
+            seniority = detail_dict['Seniority Level'][0]        # pylint: disable=unsubscriptable-object
         except TypeError:
-            self.data['seniority'] = None
+            seniority = None
         
         try:
-            self.data['employment_type'] = detail_dict['Employment Type'][0]  # pylint: disable=unsubscriptable-object
+            employment_type = detail_dict['Employment Type'][0]  # pylint: disable=unsubscriptable-object
         except TypeError:
-            self.data['employment_type'] = None
+            employment_type = None
+        start = self.record_timing('details', start)
         
-        
-        # Extract all div tags from the main soup object
-        tags_all = soup.find_all('div')
-
-        # Search for the tag which contains the job name, company name, and job location text
-        # Tag attributes are {'class': ['mt6', 'ml5', 'flex-grow-1']}
-        for t in tags_all:
-            if 'class' in t.attrs:
-                if all(x in ['mt6', 'ml5', 'flex-grow-1'] for x in t.attrs['class']):
-                    tag_target = t
-                    break
-
-        # Extract the relevant information from the found tag            
-        self.data['title'] = self.process_text(tag_target.find('h1').text, return_as_string=True)
-
         # Tag locations for other items are not consistent - so we have to parse and process the raw text directly
-        company_location_list = self.process_text(tag_target.find('h3').text)
-        self.data['company'] = company_location_list[1]
-        self.data['location'] = company_location_list[3]
+        company_location_list = self.process_text(company_location_text)
+        start = self.record_timing('company_location', start)
+        
+        title = self.process_text(title_text, return_as_string=True)
+        self.record_timing('title', start)
+        
+        # Preprocess and extract relevant data from their respective tags, into a single new record
+        self.data = self.data._replace(
+            title = title,
+            company = company_location_list[1],
+            location = company_location_list[3],
+            seniority = seniority,
+            employment_type = employment_type,
+            industries = detail_dict['Industry'],
+            functions = detail_dict['Job Functions'],
+            posting_text = posting_text
+            )
+    
+    
+    def record_timing(self, stage, start):
+        """ Utility function used in extract_job_data()
+        Input:  Name of the stage of the extraction, and time.perf_counter() value at its start
+        Output: time.perf_counter() value at its end (i.e. the start of the next stage)
+        """
+        end = time.perf_counter()
+        self.timings.append((stage, end - start))
+        return end
+    
+    
+    def get_text_lxml(self, element, separator=''):
+        """ Utility function used in locate_text_lxml()
+        Input:  lxml element
+        Output: Text of the element, identical to BeautifulSoup's tag.get_text(separator) for the same tag
+                (i.e: comments and script / style / template contents are skipped, whitespace-only
+                strings are collapsed to a single space / newline)
+        """
+        preserve_whitespace = any(t.tag in PRESERVE_WHITESPACE_TAGS for t in element.iterancestors())
+        return separator.join(self.iter_strings_lxml(element, preserve_whitespace))
+    
+    
+    def iter_strings_lxml(self, element, preserve_whitespace=False):
+        """ Utility function used in get_text_lxml()
+        Input:  lxml element
+        Output: Generator of the text strings inside the element, in document order
+        """
+        # Comments and processing instructions have a non-string tag, their own text is never yielded
+        if not isinstance(element.tag, str) or element.tag in NON_TEXT_TAGS:
+            return
+        
+        preserve_whitespace = preserve_whitespace or element.tag in PRESERVE_WHITESPACE_TAGS
+        
+        if element.text:
+            yield self.collapse_whitespace(element.text, preserve_whitespace)
+        
+        for child in element:
+            yield from self.iter_strings_lxml(child, preserve_whitespace)
+            # Text following a child tag is a separate string belonging to the current element
+            if child.tail:
+                yield self.collapse_whitespace(child.tail, preserve_whitespace)
+    
+    
+    def collapse_whitespace(self, text, preserve_whitespace=False):
+        """ Utility function used in iter_strings_lxml()
+        Input:  A single text string
+        Output: The same string, or a single newline / space if the string only contains whitespace
+                (mirrors BeautifulSoup's handling of whitespace-only strings)
+        """
+        if preserve_whitespace or text.strip(ASCII_SPACES):
+            return text
+        return '\n' if '\n' in text else ' '
     
     
     def process_text(self, text, ignore_first=False, return_as_string=False):
@@ -118,12 +355,203 @@ class JobData:
             return text_list
         
         
-    def reset_job_data(self, fields=DATA_FIELDS):
+    def reset_job_data(self):
         """
         Resets all values in self.data back to default (None)
         """
-        self.data = dict.fromkeys(fields)
+        self.data = JobRecord()
     
+
+
+class StreamingJobParser(BeautifulSoupHTMLParser):
+    """
+    Incremental (SAX-style) HTML parser used by the 'stream' backend of JobData.
+    Reuses BeautifulSoup's own html.parser event handling (entities, empty-element tags etc.), but hands
+    the events to a JobTextCollector instead of a BeautifulSoup object, so no tree is ever built.
+    NOTE: BeautifulSoupHTMLParser is private to bs4 (pinned in requirements.txt) - upgrading bs4 must keep
+    tests/test_html_processor.py passing
+    """
+    def __init__(self):
+        super(StreamingJobParser, self).__init__(convert_charrefs=False)
+        self.soup = JobTextCollector()
+
+
+class JobTextCollector:
+    """
+    Stand-in for the BeautifulSoup object driven by StreamingJobParser.
+    Tracks the open tags and builds strings exactly like BeautifulSoup does, but only keeps the strings
+    inside the tags JobData.locate_text_bs4() searches for:
+    - The first div with id 'job-details' inside the first article tag (posting text)
+    - Every div with class 'jobs-box__group' inside the first article tag (job details)
+    - The first h1 / h3 tags inside the first div with only HEADER_CLASSES classes (header card)
+    """
+    # Required by BeautifulSoupHTMLParser.handle_charref() (input is always decoded text)
+    original_encoding = None
+    
+    def __init__(self):
+        # Stack of open tags, each stored as [tag name, list of string collectors opened by this tag]
+        self.tag_stack = []
+        self.current_data = []
+        # String collectors which receive every string found while they are open
+        self.open_collectors = []
+        # Number of open tags affecting how strings are stored (see endData())
+        self.non_text_depth = 0
+        self.preserve_whitespace_depth = 0
+        
+        # State of the tags being searched for: None (not found yet), 'open' or 'closed'
+        self.article_state = None
+        self.header_state = None
+        
+        # String collectors for each of the searched tags
+        self.posting_strings = None
+        self.detail_strings = []
+        self.title_strings = None
+        self.company_location_strings = None
+    
+    
+    def is_complete(self):
+        """
+        Output: True once the article and header card have both been closed, i.e. no further input can
+                change the collected text
+        """
+        return self.article_state == 'closed' and self.header_state == 'closed'
+    
+    
+    def get_raw_text(self):
+        """
+        Output: Tuple of raw text in the same format as JobData.locate_text_bs4()
+                (raises the same exceptions as locate_text_bs4() if a tag was not found)
+        """
+        if self.article_state is None:
+            raise AttributeError("No <article> tag found in the job posting HTML")
+        if self.header_state is None:
+            raise UnboundLocalError("No header card tag found in the job posting HTML")
+        if self.posting_strings is None:
+            raise IndexError("No job-details tag found in the job posting article")
+        if self.title_strings is None or self.company_location_strings is None:
+            raise AttributeError("No h1 / h3 tag found in the job posting header card")
+        
+        return (' '.join(self.posting_strings),
+                [' '.join(strings) for strings in self.detail_strings],
+                ''.join(self.title_strings),
+                ''.join(self.company_location_strings))
+    
+    
+    def handle_starttag(self, name, namespace, nsprefix, attrs, sourceline=None, sourcepos=None):
+        """
+        Called by StreamingJobParser when a tag is opened. Starts collecting strings if the tag is one of
+        the tags being searched for.
+        Outputs: Object with the is_empty_element attribute expected by BeautifulSoupHTMLParser
+        """
+        self.endData()
+        
+        classes = attrs['class'].split() if 'class' in attrs else None
+        collectors = []
+        
+        if name == 'article' and self.article_state is None:
+            self.article_state = 'open'
+            collectors.append('article')
+        
+        elif name == 'div':
+            if self.article_state == 'open':
+                if attrs.get('id') == 'job-details' and self.posting_strings is None:
+                    self.posting_strings = []
+                    collectors.append(self.posting_strings)
+                if classes is not None and ('jobs-box__group' in classes or attrs['class'] == 'jobs-box__group'):
+                    self.detail_strings.append([])
+                    collectors.append(self.detail_strings[-1])
+            
+            if (self.header_state is None and classes is not None
+                    and all(x in JobData.HEADER_CLASSES for x in classes)):
+                self.header_state = 'open'
+                collectors.append('header')
+        
+        elif self.header_state == 'open':
+            if name == 'h1' and self.title_strings is None:
+                self.title_strings = []
+                collectors.append(self.title_strings)
+            elif name == 'h3' and self.company_location_strings is None:
+                self.company_location_strings = []
+                collectors.append(self.company_location_strings)
+        
+        self.tag_stack.append([name, collectors])
+        self.open_collectors.extend(c for c in collectors if isinstance(c, list))
+        if name in NON_TEXT_TAGS:
+            self.non_text_depth += 1
+        if name in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_whitespace_depth += 1
+        
+        return OpenTag(name)
+    
+    
+    def handle_endtag(self, name, nsprefix=None):
+        """
+        Called by StreamingJobParser when a tag is closed. Like BeautifulSoup, pops every open tag up to
+        and including the most recent tag with the same name (or every open tag, if there is none).
+        """
+        self.endData()
+        
+        while self.tag_stack:
+            tag_name, collectors = self.tag_stack.pop()
+            
+            for collector in collectors:
+                if collector == 'article':
+                    self.article_state = 'closed'
+                elif collector == 'header':
+                    self.header_state = 'closed'
+                else:
+                    # Removed by identity - nested collectors (e.g. a job-details div inside a jobs-box__group
+                    # div) can hold equal strings
+                    index = next(i for i, c in enumerate(self.open_collectors) if c is collector)
+                    del self.open_collectors[index]
+            if tag_name in NON_TEXT_TAGS:
+                self.non_text_depth -= 1
+            if tag_name in PRESERVE_WHITESPACE_TAGS:
+                self.preserve_whitespace_depth -= 1
+            
+            if tag_name == name:
+                break
+    
+    
+    def handle_data(self, data):
+        """
+        Called by StreamingJobParser for each piece of text, which is buffered until the string ends
+        """
+        self.current_data.append(data)
+    
+    
+    def endData(self, containerClass=None):
+        """
+        Called by StreamingJobParser at the end of a string. Stores the string in every open collector,
+        unless it is a comment / declaration or the contents of a script / style / template tag.
+        """
+        if not self.current_data:
+            return
+        
+        current_data = ''.join(self.current_data)
+        self.current_data = []
+        
+        if not self.open_collectors or self.non_text_depth or containerClass not in (None, CData):
+            return
+        
+        # Whitespace-only strings are collapsed to a single newline / space (see JobData.collapse_whitespace())
+        if not self.preserve_whitespace_depth and not current_data.strip(ASCII_SPACES):
+            current_data = '\n' if '\n' in current_data else ' '
+        
+        for collector in self.open_collectors:
+            collector.append(current_data)
+
+
+class OpenTag:
+    """
+    Minimal tag returned to BeautifulSoupHTMLParser by JobTextCollector.handle_starttag()
+    """
+    __slots__ = ['name', 'is_empty_element']
+    
+    def __init__(self, name):
+        self.name = name
+        self.is_empty_element = name in HTMLTreeBuilder.empty_element_tags
+
         
 ### TODO
 
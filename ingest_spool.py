@@ -0,0 +1,312 @@
+# Utility
+import os
+import time
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv, find_dotenv
+# Custom modules
+from postgres_handler import PGHandler
+from bulk_ingest import BulkIngestor, make_document
+from extraction_pool import ExtractionPool
+
+
+logger = logging.getLogger(__name__)
+
+
+class IngestSpool:
+    """
+    IngestSpool class is the write-behind queue of the API's accept-then-process mode (INGEST_MODE=spool):
+    POST /jobs/ stores the posted job id and HTML in a durable local SQLite journal and responds 202 with the
+    url of the posting's status, and a background worker extracts the spooled postings and commits them to the
+    database in batches (see BulkIngestor) - neither the extraction nor the database's latency is part of the
+    request, and postings are accepted while the database is unavailable.
+    Spooled postings go through the following statuses:
+    - 'queued'              : waiting for the worker (or for its next attempt, after a failed one)
+    - 'processing'          : in the worker's current batch - re-queued on startup if the API stopped mid-batch
+    - 'inserted' / 'exists' : committed to the database / already in it - the posting's HTML is dropped
+    - 'failed'              : failed INGEST_MAX_ATTEMPTS times (its last error is kept) - posting the job again
+                              re-queues it
+    Attempts are not counted while the database is unavailable, nor when the extraction pool stays full: the
+    postings wait in the spool until the connection pool reconnects / the extraction pool has room. Completed
+    postings are kept INGEST_KEEP_HOURS for their status to be looked up.
+    NOTE: A spool file is processed by a single API process - give every process its own INGEST_SPOOL_PATH
+    """
+    MODES = ['sync', 'spool']
+    DONE_STATUSES = ('inserted', 'exists')
+    MAX_RETRY_DELAY = 300
+    PRUNE_INTERVAL = 60
+
+    create_table_query = """
+    CREATE TABLE IF NOT EXISTS spool (
+        job_id INTEGER PRIMARY KEY,
+        html TEXT,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        time_received REAL NOT NULL,
+        time_updated REAL NOT NULL,
+        next_attempt REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS spool_queue_idx ON spool (status, next_attempt);
+    """
+
+    # A job is spooled unless already in the spool - postings which failed for good are re-queued
+    enqueue_query = """
+    INSERT INTO spool (job_id, html, status, attempts, error, time_received, time_updated, next_attempt)
+    VALUES (?, ?, 'queued', 0, NULL, ?, ?, ?)
+    ON CONFLICT (job_id) DO UPDATE SET
+        html = excluded.html, status = 'queued', attempts = 0, error = NULL, time_received = excluded.time_received,
+        time_updated = excluded.time_updated, next_attempt = excluded.next_attempt
+    WHERE spool.status = 'failed'
+    """
+
+    enabled = False
+    path = None
+    batch_size = 50
+    poll_interval = 1.0
+    max_attempts = 5
+    retry_delay = 5.0
+    keep_seconds = 24 * 3600
+    connection = None
+    ingestor = None
+    last_prune = 0.0
+    lock = threading.Lock()
+
+
+    @classmethod
+    def init_spool(cls, extract_batch):
+        """
+        Initialize the spool, re-queue the postings interrupted by a restart and start the background worker
+        Inputs:  Reads the following (optional) environment variables from the .env file:
+                 INGEST_MODE          - 'sync' (extract and insert during POST /jobs/, default) or 'spool'
+                 INGEST_SPOOL_PATH    - Path of the SQLite spool file (default: 'ingest_spool.sqlite3')
+                 INGEST_BATCH_SIZE    - Maximum number of postings extracted / committed per batch (default: 50)
+                 INGEST_POLL_INTERVAL - Seconds between checks of an empty spool (default: 1)
+                 INGEST_MAX_ATTEMPTS  - Attempts at a posting before it is marked 'failed' (default: 5)
+                 INGEST_RETRY_DELAY   - Seconds before a failed posting's next attempt, doubled after every
+                                        attempt (default: 5)
+                 INGEST_KEEP_HOURS    - Hours completed postings are kept in the spool (default: 24)
+                 Function taking a list of document dicts and returning their extract_document() results
+                 (i.e. bulk_ingest.extract_batch_with_pool)
+        Outputs: IngestSpool class attributes
+        """
+        load_dotenv(find_dotenv())
+
+        mode = os.environ.get("INGEST_MODE") or 'sync'
+        if mode not in cls.MODES:
+            raise ValueError(f"Unknown ingest mode: {mode}")
+        cls.enabled = mode == 'spool'
+        if not cls.enabled or cls.connection is not None:
+            return
+
+        cls.path = os.environ.get("INGEST_SPOOL_PATH") or 'ingest_spool.sqlite3'
+        cls.batch_size = int(os.environ.get("INGEST_BATCH_SIZE") or 50)
+        cls.poll_interval = float(os.environ.get("INGEST_POLL_INTERVAL") or 1)
+        cls.max_attempts = int(os.environ.get("INGEST_MAX_ATTEMPTS") or 5)
+        cls.retry_delay = float(os.environ.get("INGEST_RETRY_DELAY") or 5)
+        cls.keep_seconds = float(os.environ.get("INGEST_KEEP_HOURS") or 24) * 3600
+
+        # Autocommit (transactions are explicit), and every commit synced to disk before a posting is accepted
+        connection = sqlite3.connect(cls.path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=FULL")
+        connection.executescript(cls.create_table_query)
+        recovered = connection.execute("UPDATE spool SET status = 'queued' WHERE status = 'processing'").rowcount
+        if recovered:
+            logger.warning("Re-queued spooled job postings interrupted by a restart", extra={'jobs': recovered})
+
+        cls.connection = connection
+        cls.ingestor = BulkIngestor(extract_batch, batch_size=cls.batch_size)
+        # Runs as a greenlet under the gevent server (see PGHandler.use_gevent()), a native thread otherwise
+        PGHandler.pool_primitives['spawn'](cls.run_worker)
+
+
+    @classmethod
+    def enqueue(cls, job_id, html):
+        """
+        Inputs:  Integer job id, and string of the posted HTML
+        Outputs: True if the posting was spooled, False if the job is already in the spool (queued, being
+                 processed or completed)
+        """
+        now = time.time()
+        with cls.lock:
+            return cls.connection.execute(cls.enqueue_query, (job_id, html, now, now, now)).rowcount == 1
+
+
+    @classmethod
+    def status(cls, job_id):
+        """
+        Input:  Integer job id
+        Output: Dict of the spooled posting's status, attempts, last error and times received / last updated,
+                None if the job is not in the spool
+        """
+        with cls.lock:
+            row = cls.connection.execute("SELECT job_id, status, attempts, error, time_received, time_updated "
+                                         "FROM spool WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {'id': row[0], 'status': row[1], 'attempts': row[2], 'error': row[3],
+                'time_received': datetime.fromtimestamp(row[4], timezone.utc),
+                'time_updated': datetime.fromtimestamp(row[5], timezone.utc)}
+
+
+    @classmethod
+    def claim_batch(cls):
+        """
+        Output: List of (job id, HTML, attempts) tuples of the next postings due, oldest first - marked as
+                being processed
+        """
+        now = time.time()
+        with cls.lock:
+            cls.connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = cls.connection.execute(
+                    "SELECT job_id, html, attempts + 1 FROM spool WHERE status = 'queued' AND next_attempt <= ? "
+                    "ORDER BY time_received LIMIT ?", (now, cls.batch_size)).fetchall()
+                cls.connection.executemany(
+                    "UPDATE spool SET status = 'processing', attempts = attempts + 1, time_updated = ? "
+                    "WHERE job_id = ?", [(now, row[0]) for row in rows])
+                cls.connection.execute("COMMIT")
+            except BaseException:
+                cls.connection.execute("ROLLBACK")
+                raise
+        return rows
+
+
+    @classmethod
+    def complete_batch(cls, results, attempts):
+        """
+        Record the outcome of a batch: completed postings are marked as such, failed ones are re-queued with a
+        delay - or marked 'failed' after their last attempt
+        Inputs: List of BulkIngestor result dicts, and dict of job id: attempts made so far
+        """
+        now = time.time()
+        updates = []
+        for result in results:
+            job_id = result['id']
+            if result['status'] in cls.DONE_STATUSES:
+                updates.append(("UPDATE spool SET status = ?, html = NULL, error = NULL, time_updated = ? "
+                                "WHERE job_id = ?", (result['status'], now, job_id)))
+            elif attempts[job_id] >= cls.max_attempts:
+                updates.append(("UPDATE spool SET status = 'failed', error = ?, time_updated = ? WHERE job_id = ?",
+                                (result['error'], now, job_id)))
+                logger.error("Spooled job posting failed", extra={'job_id': job_id, 'attempts': attempts[job_id],
+                                                                   'error': result['error']})
+            else:
+                delay = min(cls.retry_delay * 2 ** (attempts[job_id] - 1), cls.MAX_RETRY_DELAY)
+                updates.append(("UPDATE spool SET status = 'queued', error = ?, time_updated = ?, next_attempt = ? "
+                                "WHERE job_id = ?", (result['error'], now, now + delay, job_id)))
+        cls.execute_updates(updates)
+
+
+    @classmethod
+    def release_batch(cls, job_ids, delay=0):
+        """
+        Re-queue postings without counting the attempt (i.e. the database became unavailable, or the extraction
+        pool was full)
+        Inputs: List of job ids, and number of seconds before their next attempt
+        """
+        now = time.time()
+        cls.execute_updates([("UPDATE spool SET status = 'queued', attempts = attempts - 1, time_updated = ?, "
+                              "next_attempt = ? WHERE job_id = ?", (now, now + delay, job_id)) for job_id in job_ids])
+
+
+    @classmethod
+    def execute_updates(cls, updates):
+        """
+        Input: List of (query, parameters) tuples, executed in a single transaction
+        """
+        with cls.lock:
+            cls.connection.execute("BEGIN IMMEDIATE")
+            try:
+                for query, parameters in updates:
+                    cls.connection.execute(query, parameters)
+                cls.connection.execute("COMMIT")
+            except BaseException:
+                cls.connection.execute("ROLLBACK")
+                raise
+
+
+    @classmethod
+    def process_batch(cls):
+        """
+        Extract and commit the next batch of postings due
+        Output: Number of postings processed (0 if none is due, or the database is unavailable) - not counting
+                the ones re-queued because the extraction pool stayed full
+        """
+        # The connection pool reconnects in the background - meanwhile, postings wait in the spool
+        if PGHandler.connection_status == False:
+            return 0
+        rows = cls.claim_batch()
+        if not rows:
+            return 0
+
+        documents = [make_document(f"spool {job_id}", job_id=job_id, html=html) for job_id, html, _ in rows]
+        try:
+            results = cls.ingestor.ingest_batch(documents)
+        except Exception as error:
+            # e.g. the connection to the database was lost, or no connection became available in time
+            logger.warning("Spooled job postings batch failed", extra={'jobs': len(rows), 'error': str(error)})
+            results = [cls.ingestor.make_result(document, 'failed', f"{type(error).__name__}: {error}")
+                       for document in documents]
+
+        if PGHandler.connection_status == False:
+            cls.release_batch([job_id for job_id, _, _ in rows])
+            return 0
+        # Transient errors (i.e. the extraction pool stayed full of the API's own requests, see
+        # BulkIngestor.STATUSES) are not failed attempts
+        retry_ids = [result['id'] for result in results if result['status'] == 'retry']
+        if retry_ids:
+            cls.release_batch(retry_ids, delay=ExtractionPool.retry_after or 0)
+        cls.complete_batch([result for result in results if result['status'] != 'retry'],
+                           {job_id: attempts for job_id, _, attempts in rows})
+        return len(rows) - len(retry_ids)
+
+
+    @classmethod
+    def prune(cls):
+        """
+        Delete the completed postings older than INGEST_KEEP_HOURS
+        """
+        with cls.lock:
+            cls.connection.execute("DELETE FROM spool WHERE status IN (?, ?) AND time_updated < ?",
+                                   cls.DONE_STATUSES + (time.time() - cls.keep_seconds,))
+        cls.last_prune = time.monotonic()
+
+
+    @classmethod
+    def run_worker(cls):
+        """
+        Process the spool's postings as they are due, until the API stops (runs in the background, see
+        init_spool())
+        """
+        sleep = PGHandler.pool_primitives['sleep']
+        while True:
+            try:
+                processed = cls.process_batch()
+                if time.monotonic() - cls.last_prune > cls.PRUNE_INTERVAL:
+                    cls.prune()
+            except Exception:
+                logger.exception("Ingest spool worker error")
+                processed = 0
+            if not processed:
+                sleep(cls.poll_interval)
+
+
+    @classmethod
+    def stats(cls):
+        """
+        Output: Dict of the number of spooled postings per status, the age of the oldest queued posting, and the
+                counts of the worker's attempts' results since startup
+        """
+        if not cls.enabled:
+            return {'enabled': False}
+        with cls.lock:
+            counts = dict(cls.connection.execute("SELECT status, count(*) FROM spool GROUP BY status").fetchall())
+            oldest = cls.connection.execute("SELECT min(time_received) FROM spool "
+                                            "WHERE status IN ('queued', 'processing')").fetchone()[0]
+        return {'enabled': True, 'statuses': counts,
+                'oldest_queued_seconds': round(time.time() - oldest, 3) if oldest is not None else None,
+                'processed': dict(cls.ingestor.counts)}
@@ -0,0 +1,33 @@
+# Utility
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+
+class JobRecord(NamedTuple):
+    """
+    JobRecord tuples hold a job's data through every layer of the app: extracted from a job posting by
+    JobData, inserted by PGHandler / AsyncPGHandler, selected back from the database (the select queries
+    return their columns in the same order) and serialized by JobSerializer.
+    Being tuples, they have no per-instance __dict__, pickle compactly to / from the extraction pool's worker
+    processes, and are passed from layer to layer as-is - never copied.
+    NOTE: Fields not extracted (time_add / rejected / time_reject, set by the database), not selected (see
+    PGHandler.select_columns()) or only selected by searches (rank) are None
+    """
+    id: Optional[int] = None
+    url: Optional[str] = None
+    title: Optional[str] = None
+    company: Optional[str] = None
+    location: Optional[str] = None
+    seniority: Optional[str] = None
+    employment_type: Optional[str] = None
+    industries: Optional[List[str]] = None
+    functions: Optional[List[str]] = None
+    posting_text: Optional[str] = None
+    time_add: Optional[datetime] = None
+    rejected: Optional[bool] = None
+    time_reject: Optional[datetime] = None
+    rank: Optional[float] = None
+
+
+# Fields extracted from job postings (see JobData.extract_job_data()), i.e. written when inserting a job
+EXTRACTED_FIELDS = JobRecord._fields[:JobRecord._fields.index('time_add')]
@@ -0,0 +1,93 @@
+# Utility
+import json
+import math
+from operator import attrgetter
+from json.encoder import encode_basestring_ascii
+# Flask-RESTful
+from flask_restful import fields
+
+
+def encode_integer(value):
+    # Same as fields.Integer: None is output as the default 0
+    return '0' if value is None else int.__repr__(int(value))
+
+
+def encode_string(value):
+    return 'null' if value is None else encode_basestring_ascii(value if type(value) is str else str(value))
+
+
+def encode_string_list(value):
+    if value is None:
+        return 'null'
+    return '[' + ', '.join([encode_string(item) for item in value]) + ']'
+
+
+def encode_float(value):
+    if value is None:
+        return 'null'
+    value = float(value)
+    # NaN / Infinity are output as by json.dumps()
+    return float.__repr__(value) if math.isfinite(value) else json.dumps(value)
+
+
+class JobSerializer:
+    """
+    JobSerializer objects serialize jobs' data (JobRecords, see job_record.py) straight to the JSON that
+    json.dumps(marshal(job, output_fields)) would output, byte for byte - same key order, separators and escaping -
+    without building the intermediate OrderedDict of every job, or looking up the 'uri' route per job
+    NOTE: String, Integer, Float, List(String) and Url fields are encoded directly, any other field type through
+    its own output() and json.dumps(). Url fields are built from the route's prefix, computed once per serializer:
+    create serializers within the request / application context the jobs are served in
+    """
+    def __init__(self, output_fields, uri_prefix=None):
+        """
+        Inputs: Dict of the fields to yield (e.g. api_linkedin_extractor.job_fields), and prefix of the jobs'
+                'uri' (e.g. '/jobdataextractor/api/v1.0/jobs/') - by default, from the Url fields' endpoint
+        """
+        self.encoders = [(json.dumps(name) + ': ', self.compile_field(name, field, uri_prefix))
+                         for name, field in output_fields.items()]
+
+
+    @classmethod
+    def compile_field(cls, name, field, uri_prefix):
+        """
+        Output: Function of a job's data returning the field's encoded JSON value
+        """
+        if isinstance(field, type):
+            field = field()
+        field_type = type(field)
+        get = attrgetter(name)
+
+        if field.attribute is None and field.default is None:
+            if field_type is fields.String:
+                return lambda job: encode_string(get(job))
+            if field_type is fields.Float:
+                return lambda job: encode_float(get(job))
+            if (field_type is fields.List and type(field.container) is fields.String
+                    and field.container.attribute is None and field.container.default is None):
+                return lambda job: encode_string_list(get(job))
+            if field_type is fields.Url and not field.absolute and field.endpoint is not None:
+                if uri_prefix is None:
+                    from flask import url_for
+                    uri_prefix = url_for(field.endpoint, id=0)[:-1]
+                return lambda job: encode_string(uri_prefix + str(job.id))
+        if field_type is fields.Integer and field.attribute is None and field.default == 0:
+            return lambda job: encode_integer(get(job))
+
+        return lambda job: json.dumps(field.output(name, job))
+
+
+    def serialize(self, job):
+        """
+        Input:  Job's data
+        Output: JSON object of the job's fields (string)
+        """
+        return '{' + ', '.join([prefix + encode(job) for prefix, encode in self.encoders]) + '}'
+
+
+    def serialize_list(self, jobs):
+        """
+        Input:  Iterable of jobs' data
+        Output: JSON array of the jobs (string)
+        """
+        return '[' + ', '.join([self.serialize(job) for job in jobs]) + ']'
@@ -0,0 +1,262 @@
+# Utility
+import os
+import time
+import bisect
+import logging
+import cProfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv, find_dotenv
+# Pyinstrument (optional, see RequestProfiler)
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:
+    PyinstrumentProfiler = None
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the histograms' buckets - from a field's extraction (~100us) to a timed out request
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Histogram objects count observed durations in buckets, per combination of label values, and render them in
+    the Prometheus text exposition format (cumulative <name>_bucket{le="..."} counts, <name>_sum, <name>_count)
+    """
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # Tuple of label values: [list of per-bucket counts (+Inf last), sum of observations]
+        self.lock = threading.Lock()
+
+
+    def observe(self, seconds, *labelvalues):
+        """
+        Inputs: Observed duration (seconds), and the values of the histogram's labels, in labelnames' order
+        """
+        # Buckets count the observations less than or equal to their upper bound
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            value = self.values.get(labelvalues)
+            if value is None:
+                value = self.values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            value[0][index] += 1
+            value[1] += seconds
+
+
+    def render(self):
+        """
+        Output: List of the lines of the histogram, in the Prometheus text exposition format
+        """
+        with self.lock:
+            values = sorted((labelvalues, list(counts), total) for labelvalues, (counts, total) in self.values.items())
+
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        bounds = [repr(float(bound)) for bound in self.buckets] + ['+Inf']
+        for labelvalues, counts, total in values:
+            labels = ''.join(f'{name}="{escape_label(value)}",' for name, value in zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+            labels = f'{{{labels[:-1]}}}' if labels else ''
+            lines.append(f'{self.name}_sum{labels} {total!r}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+def escape_label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+
+class Metrics:
+    """
+    Metrics class holds the histograms of the time spent on the API's hot paths, exported in the Prometheus text
+    format by the /metrics endpoint (see render()):
+    - request_seconds          : every request handled by the Flask API, per method, endpoint and status code
+                                 (until the response is returned - streamed bodies are not included)
+    - request_stage_seconds    : each stage of POST /jobs/ - decoding the request body, the dedup check, the
+                                 extraction (including the extraction pool's queue) and the insert
+    - extraction_stage_seconds : each stage of JobData.extract_job_data(), per parser backend - reading the
+                                 input, parsing the HTML (building the soup / tree), locating the relevant tags and
+                                 extracting each field (see JobData.timings) - in the extraction pool's workers too
+    - db_pool_wait_seconds     : waiting for a database connection from PGHandler's connection pool
+    - db_statement_seconds     : each of PGHandler's registered SQL statements (see StatementRegistry.execute())
+    Histograms are per process - with several server processes, scrape each of them
+    """
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    enabled = True
+    request_seconds = Histogram(
+        'jobdataextractor_request_seconds', "Time to handle an API request",
+        ['method', 'endpoint', 'status'])
+    request_stage_seconds = Histogram(
+        'jobdataextractor_request_stage_seconds', "Time spent in each stage of POST /jobs/",
+        ['stage'])
+    extraction_stage_seconds = Histogram(
+        'jobdataextractor_extraction_stage_seconds', "Time spent in each stage of a job posting's extraction",
+        ['backend', 'stage'])
+    db_pool_wait_seconds = Histogram(
+        'jobdataextractor_db_pool_wait_seconds', "Time waited for a database connection from the pool")
+    db_statement_seconds = Histogram(
+        'jobdataextractor_db_statement_seconds', "Time to execute a SQL statement",
+        ['statement'])
+
+
+    @classmethod
+    def init_metrics(cls):
+        """
+        Initialize the metrics
+        Inputs:  Reads the following (optional) environment variable from the .env file:
+                 METRICS_ENABLED - Record the histograms' observations (1: on, default / 0: off)
+        Outputs: Metrics class attributes
+        """
+        load_dotenv(find_dotenv())
+        cls.enabled = (os.environ.get("METRICS_ENABLED") or '1') == '1'
+
+
+    @classmethod
+    def observe(cls, histogram, seconds, *labelvalues):
+        if cls.enabled:
+            histogram.observe(seconds, *labelvalues)
+
+
+    @classmethod
+    @contextmanager
+    def timer(cls, histogram, *labelvalues):
+        """
+        Context manager observing the time spent in its block (exception raised or not) in the histogram
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.observe(histogram, time.perf_counter() - start, *labelvalues)
+
+
+    @classmethod
+    def observe_extraction(cls, backend, timings):
+        """
+        Inputs: Parser backend, and list of (stage, seconds) tuples of an extraction (i.e. JobData.timings)
+        """
+        if cls.enabled:
+            for stage, seconds in timings:
+                cls.extraction_stage_seconds.observe(seconds, backend, stage)
+
+
+    @classmethod
+    def render(cls):
+        """
+        Output: Every histogram, in the Prometheus text exposition format (string)
+        """
+        histograms = [cls.request_seconds, cls.request_stage_seconds, cls.extraction_stage_seconds,
+                      cls.db_pool_wait_seconds, cls.db_statement_seconds]
+        return '\n'.join(line for histogram in histograms for line in histogram.render()) + '\n'
+
+
+
+class RequestProfiler:
+    """
+    RequestProfiler class is an opt-in sampling profiler of the API's requests: one request in every
+    PROFILE_EVERY_N is profiled (with cProfile, or pyinstrument if installed and selected), and the profile of
+    those slower than PROFILE_SLOW_MS is written to PROFILE_DIR - a .prof file for cProfile (view it as a flame
+    graph with e.g. snakeviz, or with python -m pstats), an .html flame view for pyinstrument
+    NOTE: Profilers trace the thread the request runs on - under gevent, a profile also includes the other
+    greenlets run while the request waited on I/O. One request is profiled at a time
+    """
+    PROFILERS = ['cprofile', 'pyinstrument']
+
+    every_n = 0
+    slow_seconds = 0.5
+    directory = 'profiles'
+    profiler = 'cprofile'
+    requests = 0
+    active = False
+    lock = threading.Lock()
+
+
+    @classmethod
+    def init_profiler(cls):
+        """
+        Initialize the profiler
+        Inputs:  Reads the following (optional) environment variables from the .env file:
+                 PROFILE_EVERY_N - Profile one request in every N (default: 0, i.e. off)
+                 PROFILE_SLOW_MS - Minimum duration of the profiled requests written to PROFILE_DIR (default: 500)
+                 PROFILE_DIR     - Directory the profiles are written to (default: 'profiles')
+                 PROFILER        - 'cprofile' (default) or 'pyinstrument' (requires the pyinstrument package)
+        Outputs: RequestProfiler class attributes
+        """
+        load_dotenv(find_dotenv())
+        profiler = os.environ.get("PROFILER") or 'cprofile'
+        if profiler not in cls.PROFILERS:
+            raise ValueError(f"Unknown profiler: {profiler}")
+        if profiler == 'pyinstrument' and PyinstrumentProfiler is None:
+            raise ImportError("The 'pyinstrument' profiler requires the pyinstrument package to be installed")
+
+        cls.profiler = profiler
+        cls.every_n = int(os.environ.get("PROFILE_EVERY_N") or 0)
+        cls.slow_seconds = float(os.environ.get("PROFILE_SLOW_MS") or 500) / 1000
+        cls.directory = os.environ.get("PROFILE_DIR") or 'profiles'
+
+
+    @classmethod
+    def start(cls):
+        """
+        Output: Started profiler if the current request is sampled, None otherwise
+        """
+        if cls.every_n <= 0:
+            return None
+        with cls.lock:
+            cls.requests += 1
+            if cls.active or cls.requests % cls.every_n != 0:
+                return None
+            cls.active = True
+
+        if cls.profiler == 'pyinstrument':
+            profiler = PyinstrumentProfiler()
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+
+    @classmethod
+    def stop(cls, profiler, elapsed, name):
+        """
+        Stop the profiler and write its profile if the request was slow
+        Inputs: Profiler returned by start() (no-op if None), duration of the request (seconds), and name of the
+                request (e.g. 'POST jobs'), part of the profile's filename
+        """
+        if profiler is None:
+            return
+        try:
+            if cls.profiler == 'pyinstrument':
+                profiler.stop()
+            else:
+                profiler.disable()
+            if elapsed < cls.slow_seconds:
+                return
+
+            os.makedirs(cls.directory, exist_ok=True)
+            filename = (f"{datetime.now():%Y%m%dT%H%M%S%f}_{name.replace(' ', '_').replace('/', '_')}"
+                        f"_{1000 * elapsed:.0f}ms")
+            if cls.profiler == 'pyinstrument':
+                path = os.path.join(cls.directory, filename + '.html')
+                with open(path, 'w', encoding='utf-8') as wf:
+                    wf.write(profiler.output_html())
+            else:
+                path = os.path.join(cls.directory, filename + '.prof')
+                profiler.dump_stats(path)
+            logger.info("Slow request profiled", extra={'request': name, 'ms': round(1000 * elapsed, 1),
+                                                        'profile': path})
+        finally:
+            with cls.lock:
+                cls.active = False
@@ -0,0 +1,6 @@
+/* Indexes added to DDL_job_data.sql after its first release - run against databases created before then:
+   docker exec -i db_postgres psql -U <POSTGRES_USER> -d job_data < migrations/001_junction_indexes.sql */
+
+CREATE INDEX IF NOT EXISTS job_industry_industry_id_idx ON job_industry (industry_id);
+
+CREATE INDEX IF NOT EXISTS job_function_function_id_idx ON job_function (function_id);
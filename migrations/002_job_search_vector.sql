@@ -0,0 +1,10 @@
+/* Full-text search column and index added to DDL_job_data.sql after its first release - run against databases
+   created before then (requires Postgres 12+; rewrites the job table, computing every existing job's vector):
+   docker exec -i db_postgres psql -U <POSTGRES_USER> -d job_data < migrations/002_job_search_vector.sql */
+
+ALTER TABLE job ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', title), 'A') ||
+    setweight(to_tsvector('english', company), 'B') ||
+    setweight(to_tsvector('english', posting_text), 'C')) STORED;
+
+CREATE INDEX IF NOT EXISTS job_search_vector_idx ON job USING GIN (search_vector);
@@ -0,0 +1,54 @@
+/* Indexes for rejecting jobs by title and company, added to DDL_job_data.sql after its first release, and the
+   job search vector turned from a generated column (recomputed by every update of a job, e.g. of its
+   'rejected' flag) into one set by a trigger when the job's text changes - run against databases created
+   before then (requires Postgres 12+):
+   docker exec -i db_postgres psql -U <POSTGRES_USER> -d job_data < migrations/003_job_reject_indexes.sql */
+
+CREATE INDEX IF NOT EXISTS job_lower_title_company_idx ON job (lower(title), lower(company));
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS job_title_trgm_idx ON job USING GIN (title gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS job_company_trgm_idx ON job USING GIN (company gin_trgm_ops);
+
+BEGIN;
+
+/* A generated column can't be turned into a plain one before Postgres 13 (ALTER COLUMN ... DROP EXPRESSION) -
+   it is dropped, along with its index, and added back, then every job's vector is computed again below */
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM information_schema.columns
+             WHERE table_name = 'job' AND column_name = 'search_vector' AND is_generated = 'ALWAYS') THEN
+    ALTER TABLE job DROP COLUMN search_vector;
+  END IF;
+END;
+$$;
+
+ALTER TABLE job ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION trigger_set_search_vector() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+  NEW.search_vector = setweight(to_tsvector('english', NEW.title), 'A') ||
+                      setweight(to_tsvector('english', NEW.company), 'B') ||
+                      setweight(to_tsvector('english', NEW.posting_text), 'C');
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS set_search_vector ON job;
+
+CREATE TRIGGER set_search_vector
+BEFORE INSERT OR UPDATE OF title, company, posting_text ON job 
+FOR EACH ROW EXECUTE FUNCTION trigger_set_search_vector();
+
+UPDATE job SET search_vector = setweight(to_tsvector('english', title), 'A') ||
+                               setweight(to_tsvector('english', company), 'B') ||
+                               setweight(to_tsvector('english', posting_text), 'C')
+WHERE search_vector IS NULL;
+
+CREATE INDEX IF NOT EXISTS job_search_vector_idx ON job USING GIN (search_vector);
+
+COMMIT;
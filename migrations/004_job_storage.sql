@@ -0,0 +1,25 @@
+/* Storage settings of the job table added to DDL_job_data.sql after its first release - run against databases
+   created before then:
+   docker exec -i db_postgres psql -U <POSTGRES_USER> -d job_data < migrations/004_job_storage.sql
+   Only rows written afterwards are stored this way - to rewrite existing rows, then run (locks the table):
+   docker exec -i db_postgres psql -U <POSTGRES_USER> -d job_data -c "VACUUM FULL job;" */
+
+/* Move posting texts and search vectors out of the job table's rows (into its TOAST table) unless the row
+   fits in 256 bytes, so queries that do not select them (e.g. GET /jobs/?fields=id,title) read a fraction of
+   the pages. The row's short columns stay in the row - keeping the search vector in it (MAIN storage) would
+   move them out instead */
+ALTER TABLE job SET (toast_tuple_target = 256);
+
+/* Compress posting texts with LZ4 rather than pglz (faster to compress / decompress, similar ratio on text) -
+   requires Postgres 14+ built with LZ4 support (e.g. the official Docker image), skipped otherwise */
+DO $$
+BEGIN
+  IF current_setting('server_version_num')::int >= 140000 THEN
+    EXECUTE 'ALTER TABLE job ALTER COLUMN posting_text SET COMPRESSION lz4';
+  ELSE
+    RAISE NOTICE 'LZ4 compression requires Postgres 14+, posting_text keeps the default compression';
+  END IF;
+EXCEPTION WHEN feature_not_supported THEN
+  RAISE NOTICE 'Postgres was built without LZ4 support, posting_text keeps the default compression';
+END;
+$$;
@@ -2,12 +2,78 @@
 # Utility
 import os
 from dotenv import load_dotenv, find_dotenv
-import copy
+import logging
+import threading
+import itertools
 from contextlib import contextmanager
 # Psycopg2
 import psycopg2
 import psycopg2.extras
+import psycopg2.errors
 from psycopg2 import Error, sql, pool
+# Custom modules
+from connection_pool import ManagedConnectionPool, THREAD_PRIMITIVES
+from statement_registry import StatementRegistry, RegistryConnection
+from job_record import JobRecord, EXTRACTED_FIELDS
+from metrics import Metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class LookupCache:
+    """
+    LookupCache objects store the name -> id mappings of small lookup tables (i.e. 'industry' and 'function').
+    Names are never renamed and ids never reused, so cached ids stay valid in every process until the row is
+    deleted - PGHandler falls back to the database (and clears the cache) when a cached id turns out stale.
+    """
+    def __init__(self, tables):
+        self.tables = tables
+        self.ids = {table: {} for table in tables}
+        self.hits = {table: 0 for table in tables}
+        self.misses = {table: 0 for table in tables}
+        self.lock = threading.Lock()
+        
+        
+    def get(self, table, names):
+        """
+        Input:  Table name and list of names to look up
+        Output: Tuple of (dict of cached name: id, list of names not in the cache)
+        """
+        table_ids = self.ids[table]
+        found, missing = {}, []
+        for name in names:
+            if name in table_ids:
+                found[name] = table_ids[name]
+            elif name not in missing:
+                missing.append(name)
+        
+        with self.lock:
+            self.hits[table] += len(found)
+            self.misses[table] += len(missing)
+        return found, missing
+    
+    
+    def update(self, table, rows):
+        """
+        Input:  Table name and iterable of rows with 'id' and 'name' keys
+        """
+        with self.lock:
+            self.ids[table].update((row['name'], row['id']) for row in rows if row['name'] is not None)
+    
+    
+    def clear(self):
+        with self.lock:
+            for table in self.tables:
+                self.ids[table] = {}
+    
+    
+    def stats(self):
+        """
+        Output: Dict of cache size and hit / miss counters for each table
+        """
+        return {table: {'size': len(self.ids[table]), 'hits': self.hits[table], 'misses': self.misses[table]}
+                for table in self.tables}
 
 
 
@@ -20,6 +86,39 @@ class PGHandler:
     connection_status = False
     connection_pool = None
     
+    # Full-text search limits (see search_jobs()), set by init_connection_pool()
+    search_max_candidates = 10000
+    search_timeout_ms = 1000
+    
+    # Minimum trigram similarity of the title / company of jobs rejected by similarity (see reject_jobs()),
+    # set by init_connection_pool()
+    reject_similarity_threshold = 0.6
+    
+    # Columns of the job table selected by default (i.e. every column but search_vector), and the job's lists
+    # aggregated from the junction tables (by the text_select_*_join joins)
+    job_columns = ('id', 'url', 'title', 'company', 'location', 'seniority', 'employment_type', 'time_add',
+                   'posting_text', 'rejected', 'time_reject')
+    job_junctions = {'functions': 'sub_f.functions', 'industries': 'sub_i.industries'}
+    
+    # Fields returned by the select queries, in JobRecord order (a search's rank is selected by the search only)
+    select_fields = JobRecord._fields[:-1]
+    
+    # Columns written when inserting a job - the extracted fields but the junctions
+    insert_columns = tuple(field for field in EXTRACTED_FIELDS if field not in ('industries', 'functions'))
+    
+    # Blocking primitives used by the connection pool (native threads unless use_gevent() is called)
+    pool_primitives = THREAD_PRIMITIVES
+    
+    # Name -> id cache of the industry / function lookup tables, warmed by init_connection_pool()
+    lookup_cache = LookupCache(['industry', 'function'])
+    
+    # Callbacks called with the ids of jobs inserted / updated, once committed (see add_job_change_listener())
+    job_change_listeners = []
+    
+    # Queries composed once from the query strings below, rendered once per connection and optionally
+    # executed as server-side prepared statements (see register_statements())
+    statements = StatementRegistry()
+    
     # Query strings used to build queries safely
     
     text_insert_query = """
@@ -29,296 +128,782 @@ class PGHandler:
     DO NOTHING; 
     """
     
+    # Job row and its junction table rows, in a single statement - the junction rows are only inserted with
+    # the job row, and the statement returns the job id only if the job was not already in the database
+    text_insert_job_query = """
+    WITH new_job AS (
+        INSERT INTO job ({fields})
+        VALUES ({values})
+        ON CONFLICT (id)
+        DO NOTHING
+        RETURNING id),
+    new_job_industry AS (
+        INSERT INTO job_industry (job_id, industry_id)
+        SELECT DISTINCT new_job.id, unnest({industry_ids}::int[]) FROM new_job
+        ON CONFLICT (job_id, industry_id)
+        DO NOTHING),
+    new_job_function AS (
+        INSERT INTO job_function (job_id, function_id)
+        SELECT DISTINCT new_job.id, unnest({function_ids}::int[]) FROM new_job
+        ON CONFLICT (job_id, function_id)
+        DO NOTHING)
+    SELECT id FROM new_job;
+    """
+    
+    text_insert_names_query = """
+    WITH new_names AS (
+        INSERT INTO {table} (name)
+        SELECT DISTINCT unnest({names}::varchar[])
+        ON CONFLICT (name) 
+        DO NOTHING
+        RETURNING id, name)
+    SELECT id, name FROM new_names
+    UNION ALL
+    SELECT id, name FROM {table}
+    WHERE name = ANY({names}::varchar[]);
+    """
+    
+    text_select_names_query = """
+    SELECT id, name FROM {table}
+    WHERE name = ANY({names}::varchar[]);
+    """
+    
     text_select_query = """
     SELECT {field} FROM {table}
  	WHERE {field_where} = ({value});
     """
     
-    text_select_from_title_company = """
-    SELECT {field} FROM {table} 
-    WHERE title ILIKE {title}
-    AND company ILIKE {company};
+    # Reject every job matching the {where} condition (see text_reject_where_*), and return each matching job
+    # with whether it was rejected now or already before (keeping its original time_reject)
+    text_reject_jobs_query = """
+    WITH matched AS (
+        SELECT id, title, company, rejected, time_reject FROM job
+        WHERE {where}
+        FOR UPDATE
+    ), updated AS (
+        UPDATE job SET rejected = true
+        FROM matched
+        WHERE job.id = matched.id AND matched.rejected IS NOT TRUE
+        RETURNING job.id, job.time_reject
+    )
+    SELECT matched.id, matched.title, matched.company,
+        COALESCE(updated.time_reject, matched.time_reject) AS time_reject,
+        updated.id IS NOT NULL AS newly_rejected
+    FROM matched
+    LEFT JOIN updated
+    ON updated.id = matched.id
+    ORDER BY matched.id;
     """
     
+    # Jobs by id (through the primary key)
+    text_reject_where_ids = "id = ANY({job_ids}::bigint[])"
+    
+    # Jobs with the same title and company, ignoring case (through the job_lower_title_company_idx index)
+    text_reject_where_title_company = "lower(title) = lower({title}) AND lower(company) = lower({company})"
+    
+    # Jobs with a title and company similar to the given ones, i.e. sharing enough of their trigrams (through
+    # the job_title_trgm_idx / job_company_trgm_idx indexes, requires the pg_trgm extension)
+    text_reject_where_similar = "title %% {title} AND company %% {company}"
+    
     text_update_query = """
     UPDATE {table}
     SET {field} = ({value})
     WHERE {field_where} = ({value_where});
     """
     
-    text_select_all_data_query = """
-    SELECT job.*, sub_f.functions, sub_i.industries 
-    FROM job
-    INNER JOIN
-        (SELECT job_function.job_id, array_agg(function.name) as functions
+    # NOTE: Jobs' {columns} are listed explicitly (see register_select_statements()), to leave out the
+    # search_vector column and the columns not requested - e.g. posting_text, read from the job table's TOAST
+    # table, and the industries / functions, aggregated from the junction tables by the {junctions} joins
+    
+    # The job's functions / industries aggregated into lists (as sub_f.functions / sub_i.industries)
+    # The LATERAL subqueries only aggregate the junction rows of the selected job(s), and return no row for 
+    # jobs without industries / functions (i.e. such jobs are not selected)
+    text_select_functions_join = """
+    CROSS JOIN LATERAL
+        (SELECT array_agg(function.name) as functions
         FROM job_function
         INNER JOIN function
         ON function.id = job_function.function_id
+        WHERE job_function.job_id = job.id
         GROUP BY job_function.job_id) sub_f
-    ON job.id = sub_f.job_id
-    INNER JOIN
-        (SELECT job_industry.job_id, array_agg(industry.name) as industries
+    """
+    
+    text_select_industries_join = """
+    CROSS JOIN LATERAL
+        (SELECT array_agg(industry.name) as industries
         FROM job_industry
         INNER JOIN industry
         ON industry.id = job_industry.industry_id
+        WHERE job_industry.job_id = job.id
         GROUP BY job_industry.job_id) sub_i
-    ON job.id = sub_i.job_id
-    WHERE ({value} IS NULL OR job.id = {value});
+    """
+    
+    # Data of a single job
+    text_select_job_data_query = """
+    SELECT {columns}
+    FROM job
+    {junctions}
+    WHERE job.id = {value};
+    """
+    
+    # Data of a page of jobs in id order, starting after a given id (keyset pagination)
+    text_select_data_page_query = """
+    SELECT {columns}
+    FROM job
+    {junctions}
+    WHERE ({after_id} IS NULL OR job.id > {after_id})
+    ORDER BY job.id
+    LIMIT {limit};
+    """
+    
+    # Page of the jobs best matching a full-text search (web search syntax, e.g. "data engineer" -senior),
+    # ranked by relevance, optionally filtered by seniority / employment type / industry / function
+    # Only the first {max_candidates} matches are ranked, bounding the cost of queries matching most jobs
+    text_search_query = """
+    WITH candidates AS (
+        SELECT job.id, ts_rank_cd(job.search_vector, query.tsquery) AS rank
+        FROM job, websearch_to_tsquery('english', {query}) AS query(tsquery)
+        WHERE job.search_vector @@ query.tsquery
+        AND ({seniority}::varchar IS NULL OR job.seniority = {seniority})
+        AND ({employment_type}::varchar IS NULL OR job.employment_type = {employment_type})
+        AND ({industry}::varchar IS NULL OR EXISTS (
+            SELECT 1 FROM job_industry
+            INNER JOIN industry
+            ON industry.id = job_industry.industry_id
+            WHERE job_industry.job_id = job.id
+            AND industry.name = {industry}))
+        AND ({function}::varchar IS NULL OR EXISTS (
+            SELECT 1 FROM job_function
+            INNER JOIN function
+            ON function.id = job_function.function_id
+            WHERE job_function.job_id = job.id
+            AND function.name = {function}))
+        LIMIT {max_candidates}),
+    page AS (
+        SELECT id, rank FROM candidates
+        ORDER BY rank DESC, id
+        LIMIT {limit}
+        OFFSET {offset})
+    SELECT {columns}, page.rank
+    FROM page
+    INNER JOIN job
+    ON job.id = page.id
+    {junctions}
+    ORDER BY page.rank DESC, job.id;
     """
     
     
     @classmethod
     def init_connection_pool(cls):
         """
-        Initialize a Postgres database connection pool
+        Initialize a Postgres database connection pool (no-op if the pool is already initialized)
         Inputs:  Requires the following environment variables to be set in the .env file:
                  POSTGRES_HOST
                  POSTGRES_USER
                  POSTGRES_PASSWORD
                  POSTGRES_DB
+                 And the following optional ones:
+                 POSTGRES_POOL_MIN_SIZE  - Number of connections opened upfront (default: 2)
+                 POSTGRES_POOL_MAX_SIZE  - Maximum number of connections (default: 20)
+                 POSTGRES_POOL_TIMEOUT   - Seconds to wait for a connection when all are in use (default: 10)
+                 POSTGRES_POOL_PING_AFTER - Seconds a connection may stay idle before being validated when
+                                           checked out (default: 5)
+                 POSTGRES_PREPARED_STATEMENTS - 1 to execute queries as server-side prepared statements
+                                               (default: 0)
+                 SEARCH_MAX_CANDIDATES - Maximum number of matches ranked by a search (default: 10000)
+                 SEARCH_TIMEOUT_MS     - Milliseconds a search may run for (default: 1000)
+                 REJECT_SIMILARITY_THRESHOLD - Minimum similarity of jobs rejected by similarity (default: 0.6)
         Outputs: PGHandler.connection_pool class attribute (or print error message)
+                 PGHandler.lookup_cache warmed with every industry / function already in the database
+                 NOTE: If the database cannot be reached, the pool keeps reconnecting in the background and
+                 PGHandler.connection_status turns True once it succeeds
         """
+        if cls.connection_pool is not None and not cls.connection_pool.closed:
+            if cls.connection_status == False:
+                return "Error: Connection to the database lost, reconnecting"
+            return
+
         load_dotenv(find_dotenv())
-        # db_connect_params = { 
-        #                      'host': os.environ.get("POSTGRES_HOST"),
-        #                      'user': os.environ.get("POSTGRES_USER"),
-        #                      'password': os.environ.get("POSTGRES_PASSWORD"),
-        #                      'dbname': os.environ.get("POSTGRES_DB")
-        #                     }
+        cls.statements.use_prepared = (os.environ.get("POSTGRES_PREPARED_STATEMENTS") or '0') == '1'
+        cls.search_max_candidates = int(os.environ.get("SEARCH_MAX_CANDIDATES") or 10000)
+        cls.search_timeout_ms = int(os.environ.get("SEARCH_TIMEOUT_MS") or 1000)
+        cls.reject_similarity_threshold = float(os.environ.get("REJECT_SIMILARITY_THRESHOLD") or 0.6)
+        cls.register_statements()
+        
+        cls.connection_pool = ManagedConnectionPool(
+            min_size = int(os.environ.get("POSTGRES_POOL_MIN_SIZE") or 2),
+            max_size = int(os.environ.get("POSTGRES_POOL_MAX_SIZE") or 20),
+            checkout_timeout = float(os.environ.get("POSTGRES_POOL_TIMEOUT") or 10),
+            ping_after = float(os.environ.get("POSTGRES_POOL_PING_AFTER") or 5),
+            status_callback = cls.set_connection_status,
+            primitives = cls.pool_primitives,
+            connection_factory = RegistryConnection,
+            host = os.environ.get("POSTGRES_HOST"),
+            user = os.environ.get("POSTGRES_USER"),
+            password = os.environ.get("POSTGRES_PASSWORD"),
+            dbname = os.environ.get("POSTGRES_DB"))
         try:
-            cls.connection_pool = pool.SimpleConnectionPool(1, 5, 
-                                                            host = os.environ.get("POSTGRES_HOST"),
-                                                            user = os.environ.get("POSTGRES_USER"),
-                                                            password = os.environ.get("POSTGRES_PASSWORD"),
-                                                            dbname = os.environ.get("POSTGRES_DB"))
-            cls.connection_status = True
+            error = cls.connection_pool.open()
+            if error is not None:
+                raise error
+            
+            cls.lookup_cache.clear()
+            with cls.get_cursor() as cur:
+                for table in cls.lookup_cache.tables:
+                    cur.execute(sql.SQL("SELECT id, name FROM {table};").format(table = sql.Identifier(table)))
+                    cls.lookup_cache.update(table, cur.fetchall())
             
         except psycopg2.DatabaseError as error:
             error_msg = f"Error: {error}"
             return error_msg
     
     
+    @classmethod
+    def set_connection_status(cls, healthy):
+        """
+        Called by the connection pool whenever the database becomes unreachable (False) / reachable (True)
+        """
+        cls.connection_status = healthy
+        if healthy:
+            logger.info("Connection to Postgres database established")
+        else:
+            logger.warning("Connection to Postgres database lost, reconnecting")
+    
+    
+    @classmethod
+    def use_gevent(cls):
+        """
+        Make database calls cooperative under gevent: psycopg2 yields to other greenlets while waiting on the
+        database, and the connection pool blocks / reconnects with gevent primitives
+        NOTE: Must be called before init_connection_pool() (i.e. before importing api_linkedin_extractor)
+        """
+        import gevent
+        import gevent.lock
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+        cls.pool_primitives = {'semaphore': gevent.lock.BoundedSemaphore,
+                               'spawn': gevent.spawn,
+                               'sleep': gevent.sleep}
+    
+    
     @classmethod    
     @contextmanager
-    def get_cursor(cls):
+    def get_cursor(cls, name=None, cursor_factory=psycopg2.extras.RealDictCursor):
         """
-        Context manager to retrieve a connection from the connection_pool and yield a cursor for use
-        Outputs: RealDictCursor to be used in transactions to postgres db
-                 On exit, commits transaction and returns connection to connection_pool
+        Context manager for a unit of work: retrieves a single connection from the connection_pool and yields
+        a cursor for the entire set of SQL queries comprising a single API call, run in one transaction
+        Inputs:  Optional cursor name - named cursors are server-side, and fetch rows from the database
+                 in chunks of cursor.itersize rows as they are iterated over
+                 Optional cursor class (default: RealDictCursor, rows as dicts - pass
+                 psycopg2.extensions.cursor for rows as plain tuples)
+        Outputs: Cursor to be used in transactions to postgres db
+                 On exit, commits the transaction if the block completed, rolls it back if it raised, and
+                 returns the connection to connection_pool
+                 (raises connection_pool.PoolTimeoutError if no connection is available in time)
         """
         con = cls.connection_pool.getconn()
         try:
-            yield con.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        finally:
-            # Transaction is committed at the finally clause to ensure that changes to the database are 
-            # committed only when the entire set of SQL queries comprising a single API call is completed
+            yield con.cursor(name=name, cursor_factory=cursor_factory)
             con.commit()
+        except BaseException:
+            # Never commit a partially written unit of work
+            if not con.closed:
+                con.rollback()
+            raise
+        finally:
+            # Connection lost (e.g. database restarted): the idle connections are most likely lost too
+            if con.closed:
+                cls.connection_pool.evict_idle()
             cls.connection_pool.putconn(con)
     
     
     @classmethod
-    def insert_job(cls, input_job_data):
+    def register_statements(cls):
         """
-        Execute a SQL transaction to insert a new job listing into the database
-        Inputs:  Dictionary of key-value pairs corresponding to columns in the 'jobs' table
-        Outputs: True if transaction commits to db successfully, else False
+        Compose every fixed query shape once, into PGHandler.statements
         """
+        for table in cls.lookup_cache.tables:
+            cls.statements.register(('insert_names', table), lambda p: sql.SQL(cls.text_insert_names_query).format(
+                table = sql.Identifier(table),
+                names = p('names')
+                ))
+            cls.statements.register(('select_names', table), lambda p: sql.SQL(cls.text_select_names_query).format(
+                table = sql.Identifier(table),
+                names = p('names')
+                ))
         
-        # Check if job already exists, cancel transaction if it does
-        if cls.check_job_exists(input_job_data):
-            print("Job id: {} already exists in database, insert transaction cancelled"
-                  .format(input_job_data['id']))
-            return False
-        
-        # Deepcopy to avoid modifying the instantiated JobData.data attribute
-        job_data = copy.deepcopy(input_job_data)
-        
-        # Separate the many-to-many fields from the extracted job_data
-        junc_data = {'industry': job_data.pop('industries'),
-                     'function': job_data.pop('functions')}
-        
-        # Dictionaries to store the various insert / select queries
-        query_insert = {}
-        query_select = {}
+        cls.statements.register('select_job_id', lambda p: sql.SQL(cls.text_select_query).format(
+            table = sql.Identifier('job'),
+            field = sql.Identifier('id'),
+            field_where = sql.Identifier('id'),
+            value = p('job_id')
+            ))
+        cls.statements.register('insert_job', lambda p: sql.SQL(cls.text_insert_job_query).format(
+            fields = sql.SQL(",").join(map(sql.Identifier, cls.insert_columns)),
+            values = sql.SQL(",").join(p(column) for column in cls.insert_columns),
+            industry_ids = p('industry_ids'),
+            function_ids = p('function_ids')
+            ))
+        cls.register_select_statements()
+        cls.statements.register('reject_ids', lambda p: sql.SQL(cls.text_reject_jobs_query).format(
+            where = sql.SQL(cls.text_reject_where_ids).format(job_ids = p('job_ids'))
+            ))
+        cls.statements.register('reject_title_company', lambda p: sql.SQL(cls.text_reject_jobs_query).format(
+            where = sql.SQL(cls.text_reject_where_title_company).format(title = p('title'), company = p('company'))
+            ))
+        cls.statements.register('reject_similar', lambda p: sql.SQL(cls.text_reject_jobs_query).format(
+            where = sql.SQL(cls.text_reject_where_similar).format(title = p('title'), company = p('company'))
+            ))
+    
+    
+    @classmethod
+    def register_select_statements(cls, columns=None):
+        """
+        Compose the statements selecting jobs' data for a projection of the job columns (no-op if already
+        registered) - every projection is a query shape of its own
+        Inputs:  Tuple of job columns, as returned by select_columns() (default: every column)
+        Outputs: Dict of statement name: key of the statement in PGHandler.statements
+        """
+        keys = {name: name if columns is None else (name, columns)
+                for name in ['select_job_data', 'select_data_page', 'search_jobs']}
+        if cls.statements.is_registered(keys['search_jobs']):
+            return keys
         
-        job_fields, job_values = zip(*job_data.items())
+        columns_sql, junctions_sql = cls.build_select_columns(columns)
+        cls.statements.register(keys['select_job_data'], lambda p: sql.SQL(cls.text_select_job_data_query).format(
+            columns = columns_sql,
+            junctions = junctions_sql,
+            value = p('job_id')
+            ))
+        # NOTE: Not prepared - a plan made once for all values would not use the index when after_id is given
+        cls.statements.register(keys['select_data_page'], lambda p: sql.SQL(cls.text_select_data_page_query).format(
+            columns = columns_sql,
+            junctions = junctions_sql,
+            after_id = p('after_id'),
+            limit = p('limit')
+            ), prepare=False)
+        # NOTE: Not prepared - the filters left out (NULL) are only optimized away from plans made for the values
+        cls.statements.register(keys['search_jobs'], lambda p: sql.SQL(cls.text_search_query).format(
+            columns = columns_sql,
+            junctions = junctions_sql,
+            query = p('query'),
+            seniority = p('seniority'),
+            employment_type = p('employment_type'),
+            industry = p('industry'),
+            function = p('function'),
+            max_candidates = p('max_candidates'),
+            limit = p('limit'),
+            offset = p('offset')
+            ), prepare=False)
+        return keys
+    
+    
+    @classmethod
+    def build_select_columns(cls, columns=None):
+        """
+        Input:  Tuple of job columns, as returned by select_columns() (default: every column)
+        Output: Tuple of the {columns} and {junctions} of the select queries (sql.Composable objects)
+                NOTE: {columns} lists every field of select_fields, in JobRecord order - the fields not
+                selected as NULL - so rows map onto JobRecord tuples as-is
+        """
+        columns = columns or cls.job_columns + tuple(cls.job_junctions)
+        columns_sql = [sql.SQL("NULL") if field not in columns
+                       else sql.SQL(cls.job_junctions[field]) if field in cls.job_junctions
+                       else sql.Identifier('job', field)
+                       for field in cls.select_fields]
+        junctions_sql = []
+        if 'functions' in columns:
+            junctions_sql.append(sql.SQL(cls.text_select_functions_join))
+        if 'industries' in columns:
+            junctions_sql.append(sql.SQL(cls.text_select_industries_join))
+        return sql.SQL(", ").join(columns_sql), sql.SQL("").join(junctions_sql)
+    
+    
+    @classmethod
+    def select_columns(cls, fields):
+        """
+        Input:  Iterable of the job fields to select (e.g. ['title', 'company']), or None for every field
+        Output: Tuple of the job columns / junctions to select for them (in job_columns + job_junctions order,
+                always including 'id'), or None for every column
+                NOTE: Jobs without industries / functions are only selected if neither are (insert_job()
+                links jobs with no industries / functions to the NULL industry / function)
+        """
+        if fields is None:
+            return None
+        fields = set(fields)
+        return tuple(column for column in cls.job_columns + tuple(cls.job_junctions)
+                     if column == 'id' or column in fields)
+    
+    
+    @classmethod
+    def add_job_change_listener(cls, callback):
+        """
+        Register a callback to be called with the list of ids of the jobs inserted / updated by each committed 
+        transaction (e.g. to invalidate cached copies of the jobs)
+        Inputs:  Function taking a list of integer job ids
+        """
+        if callback not in cls.job_change_listeners:
+            cls.job_change_listeners.append(callback)
+    
+    
+    @classmethod
+    def notify_job_change(cls, job_ids):
+        """
+        Call every registered job change listener with the list of changed job ids
+        """
+        if job_ids:
+            for callback in cls.job_change_listeners:
+                callback(job_ids)
+    
+    
+    @classmethod
+    def insert_job(cls, input_job_data):
+        """
+        Execute a SQL transaction to insert a new job listing into the database
+        The job row and the junction table rows are written by a single statement (regardless of the number 
+        of industries / functions), which also detects jobs already in the database - one connection checkout
+        and one round trip (plus one per table with names missing from the lookup cache)
+        Inputs:  JobRecord of the job's extracted data (see job_record.py)
+        Outputs: True if transaction commits to db successfully, False if the job already exists
+        """
         
-         
         # Check connection
         if cls.connection_status == False:
-            print(""" Connection to Postgres database has not been established! 
-                  Call PGHandler.init_connection_pool()""")
+            logger.error("Connection to Postgres database has not been established, call PGHandler.init_connection_pool()")
         else:
             with cls.get_cursor() as cur:
-                
-                # Get job id and insert job into database
-                job_id = int(job_data['id'])
-                
-                # Build and execute query for insertion into job table
-                query_insert['job'] = sql.SQL(cls.text_insert_query).format(
-                    table = sql.Identifier('job'),
-                    fields = sql.SQL(",").join(map(sql.Identifier, job_fields)),
-                    values = sql.SQL(",").join(sql.Placeholder() * len(job_fields)),
-                    pkey = sql.Identifier('id')
-                    )
-                
-                cur.execute(query_insert['job'], job_values)
-                
-                # Loop through each of the multi-value tables and fields
-                for table, values in junc_data.items():
-                    
-                    junc_ids = ['job_id', table+'_id']
-                    
-                    # Build queries for industry / function table insertion and selection
-                    query_insert[table] = sql.SQL(cls.text_insert_query).format(
-                    table = sql.Identifier(table),
-                    fields = sql.Identifier('name'),
-                    values = sql.Placeholder(),
-                    pkey = sql.Identifier('name')
-                    )
-                    
-                    query_select[table] = sql.SQL(cls.text_select_query).format(
-                    table = sql.Identifier(table),
-                    field = sql.Identifier('id'),
-                    field_where = sql.Identifier('name'),
-                    value = sql.Placeholder()
-                    )
-                    
-                    # Build query for insertion to junction tables
-                    query_insert['job_'+table] = sql.SQL(cls.text_insert_query).format(
-                    table = sql.Identifier('job_'+table),
-                    fields = sql.SQL(",").join(sql.Identifier(n) for n in junc_ids),
-                    values = sql.SQL(",").join(sql.Placeholder() * len(junc_ids)),
-                    pkey = sql.SQL(",").join(sql.Identifier(n) for n in junc_ids),
-                    )
-                    
-                    # Check if industry / function item is None
-                    if values is None:
-
-                        # Directly add to the appropriate junction table using the default 'NULL' row
-                        # (i.e, industry_id = 1 / function_id = 1; see DDL_job_data.sql)
-                        cur.execute(query_insert['job_'+table], (job_id, 1))
-                    
-                    else:
-                        # Loop through each industry / function item
-                        for value in values:
-                            
-                            # Insert industry / function item into database (DO NOTHING if already exists)
-                            cur.execute(query_insert[table], (value,))
-                        
-                            # Get auto-assigned industry_id / function_id from database
-                            cur.execute(query_select[table], (value,))
-                            current_id = cur.fetchone()['id']
-                            
-                            # Insert new row to job_industry / job_function junction tables
-                            cur.execute(query_insert['job_'+table], (job_id, current_id))
+                inserted_id = cls.execute_insert(cur, input_job_data)
+            
+            # Job already exists, nothing was written
+            if inserted_id is None:
+                logger.info("Job already exists in database, insert transaction cancelled",
+                            extra={'job_id': input_job_data.id})
+                return False
+            cls.notify_job_change([inserted_id])
                             
         return True
     
     
+    @classmethod
+    def insert_jobs(cls, input_job_list):
+        """
+        Execute a single SQL transaction to insert a batch of new job listings into the database
+        Each job is inserted under its own savepoint, so a job which fails to insert does not prevent the
+        rest of the batch from being committed
+        Inputs:  List of JobRecords of the jobs' extracted data
+        Outputs: Dictionary of job id: insert status ('inserted' / 'exists' / 'failed: <error>')
+        """
+        
+        if cls.connection_status == False:
+            logger.error("Connection to Postgres database has not been established, call PGHandler.init_connection_pool()")
+            return {}
+        
+        if not input_job_list:
+            return {}
+        
+        status = {}
+        
+        with cls.get_cursor() as cur:
+            for job_data in input_job_list:
+                job_id = int(job_data.id)
+                
+                # Skip jobs repeated within the batch (keeping the status of their first occurrence)
+                if job_id in status:
+                    continue
+                
+                try:
+                    cur.execute("SAVEPOINT insert_job;")
+                    inserted_id = cls.execute_insert(cur, job_data)
+                    cur.execute("RELEASE SAVEPOINT insert_job;")
+                    status[job_id] = 'exists' if inserted_id is None else 'inserted'
+                except psycopg2.DatabaseError as error:
+                    cur.execute("ROLLBACK TO SAVEPOINT insert_job;")
+                    status[job_id] = "failed: " + str(error).strip()
+        
+        cls.notify_job_change([job_id for job_id, job_status in status.items() if job_status == 'inserted'])
+        return status
+    
+    
+    @classmethod
+    def execute_insert(cls, cur, input_job_data):
+        """
+        Execute the statement inserting a new job listing into the database (see build_insert_query())
+        If an industry / function id from the lookup cache no longer exists in the database, the cache is 
+        cleared and the statement is rebuilt from the ids currently in the database
+        Inputs:  Cursor of the current transaction
+                 JobRecord of the job's extracted data
+        Outputs: Integer id of the inserted job, None if the job already exists (nothing is inserted)
+        """
+        # The savepoint lets the statement be retried if a cached id turns out stale
+        # NOTE: Not released explicitly (the statement's result must come last) - it is released with the
+        # enclosing transaction / savepoint
+        savepoint = b"SAVEPOINT insert_cached_ids; "
+        try:
+            # Execute the savepoint and insert statements in a single round trip to the database
+            cls.statements.execute(cur, *cls.build_insert_query(cur, input_job_data), prefix=savepoint)
+        except psycopg2.errors.ForeignKeyViolation:
+            cur.execute("ROLLBACK TO SAVEPOINT insert_cached_ids;")
+            cls.lookup_cache.clear()
+            cls.statements.execute(cur, *cls.build_insert_query(cur, input_job_data), prefix=savepoint)
+        
+        inserted_row = cur.fetchone()
+        return None if inserted_row is None else inserted_row['id']
+    
+    
+    @classmethod
+    def build_insert_query(cls, cur, input_job_data):
+        """
+        Build the statement inserting a new job listing (job row and junction table rows) into the database
+        Industry / function names are resolved to their ids beforehand (see resolve_name_ids()), so the
+        statement only reaches the lookup tables for names not yet in the lookup cache
+        Inputs:  Cursor of the current transaction (used to resolve names missing from the lookup cache)
+                 JobRecord of the job's extracted data
+        Outputs: Tuple of (key of the statement in PGHandler.statements, dictionary of its values)
+        """
+        # The record is only read - its values (e.g. the posting text) are referenced, never copied
+        query_values = {column: getattr(input_job_data, column) for column in cls.insert_columns}
+        
+        # Industry / function item is None: use the default 'NULL' row
+        # (i.e, industry_id = 1 / function_id = 1; see DDL_job_data.sql)
+        junc_data = {'industry': input_job_data.industries,
+                     'function': input_job_data.functions}
+        for table, values in junc_data.items():
+            query_values[table+'_ids'] = [1] if values is None else cls.resolve_name_ids(cur, table, values)
+        
+        return 'insert_job', query_values
+    
+    
+    @classmethod
+    def resolve_name_ids(cls, cur, table, names):
+        """
+        Look up the auto-assigned ids of a list of industry / function names, from the lookup cache if 
+        possible. Names missing from the cache are inserted into the database (DO NOTHING if already exist) 
+        and their ids added to the cache.
+        Inputs:  Cursor of the current transaction
+                 String of the table name ('industry' / 'function') and list of names
+        Outputs: List of the names' ids
+        """
+        ids, missing = cls.lookup_cache.get(table, names)
+        
+        if missing:
+            query_names = {'names': missing}
+            cls.statements.execute(cur, ('insert_names', table), query_names)
+            rows = cur.fetchall()
+            
+            # NOTE: Names inserted by a concurrent transaction which committed while the previous statement 
+            # waited on it are skipped by the insert, and not yet visible to the statement - select them
+            # again in a separate statement
+            if len({row['name'] for row in rows}) < len(missing):
+                cls.statements.execute(cur, ('select_names', table), query_names)
+                rows += cur.fetchall()
+            
+            cls.lookup_cache.update(table, rows)
+            ids.update((row['name'], row['id']) for row in rows)
+        
+        return [ids[name] for name in names if name in ids]
+    
+    
     @classmethod
     def check_job_exists(cls, job_data, show_result=False):
         """
         Execute a SQL transaction to check if a job is already in the database.
-        Inputs:  Dictionary of key-value pairs corresponding to columns in the 'jobs' table
+        Inputs:  JobRecord of the job's data
                  Boolean to toggle verbose check result
         Outputs: Boolean indicating presence (True) / absence (False) of job in database
         """
-        job_id = int(job_data['id'])
+        job_id = int(job_data.id)
         
         if cls.connection_status == False:
-            print(""" Connection to Postgres database has not been established! 
-                  Call PGHandler.init_connection_pool()""")
+            logger.error("Connection to Postgres database has not been established, call PGHandler.init_connection_pool()")
         else:
             with cls.get_cursor() as cur:
                 
-                # Build and execute query for insertion into job table
-                query_select = sql.SQL(cls.text_select_query).format(
-                    table = sql.Identifier('job'),
-                    field = sql.Identifier('id'),
-                    field_where = sql.Identifier('id'),
-                    value = sql.Placeholder()
-                    )
-                cur.execute(query_select, (job_id,))
+                # Execute query selecting the job's id from the job table
+                cls.statements.execute(cur, 'select_job_id', {'job_id': job_id})
                 
                 if cur.fetchone() is None:
-                    if show_result: print("Job id: {} NOT IN database".format(job_id))
+                    if show_result: logger.info("Job NOT IN database", extra={'job_id': job_id})
                     return False
                 else:
-                    if show_result: print("Job id: {} FOUND IN database".format(job_id))
+                    if show_result: logger.info("Job FOUND IN database", extra={'job_id': job_id})
                     return True
             
     
     @classmethod
-    def select_job(cls, job_id=None):
+    def select_existing_ids(cls, job_ids):
+        """
+        Execute a SQL transaction to find which of a list of jobs are already in the database
+        Inputs:  List of integer job ids
+        Outputs: Set of the job ids found in the database
+        """
+        
+        if cls.connection_status == False:
+            logger.error("Connection to Postgres database has not been established, call PGHandler.init_connection_pool()")
+        else:
+            with cls.get_cursor() as cur:
+                with Metrics.timer(Metrics.db_statement_seconds, 'select_existing_ids'):
+                    cur.execute("SELECT id FROM job WHERE id = ANY(%s);", (list(job_ids),))
+                return {row['id'] for row in cur.fetchall()}
+    
+    
+    @classmethod
+    def select_recent_ids(cls, limit):
+        """
+        Execute a SQL transaction to select the ids of the most recently added jobs
+        Inputs:  Integer maximum number of job ids to select
+        Outputs: List of integer job ids, most recently added first
+        """
+        
+        if cls.connection_status == False:
+            logger.error("Connection to Postgres database has not been established, call PGHandler.init_connection_pool()")
+        else:
+            with cls.get_cursor() as cur:
+                with Metrics.timer(Metrics.db_statement_seconds, 'select_recent_ids'):
+                    cur.execute("SELECT id FROM job ORDER BY time_add DESC LIMIT %s;", (limit,))
+                return [row['id'] for row in cur.fetchall()]
+    
+    
+    @classmethod
+    def select_job(cls, job_id=None, fields=None):
         """
         Executes a SQL transaction to select a specific job's data
         Inputs:  Integer job id to be selected
-                 NOTE: Will default to extracting ALL job data
-        Outputs: Dictionary of key-value pairs corresponding to columns in the 'jobs' table
+                 NOTE: Will default to extracting ALL job data (see select_jobs_page() / iter_jobs())
+                 Optional list of the job fields to select (default: every field, see select_columns())
+        Outputs: JobRecord of the job's data (see job_record.py), None if the job does not exist
                  NOTE: Will also include information from the 'industry' and 'function' tables as lists
-                 e.g. key='industries', value=['Industry1', 'Industry2' ...]
+                 e.g. industries=['Industry1', 'Industry2' ...]
         """
         
+        if job_id is None:
+            return cls.select_jobs_page(fields=fields)
+        
         if cls.connection_status == False:
-            print(""" Connection to Postgres database has not been established! 
-                  Call PGHandler.init_connection_pool()""")
+            logger.error("Connection to Postgres database has not been established, call PGHandler.init_connection_pool()")
         else:
-            with cls.get_cursor() as cur:
-                
-                # Build and execute query to get job data from database
-                query_select = sql.SQL(cls.text_select_all_data_query).format(
-                    value = sql.Placeholder()
-                    )
-                cur.execute(query_select, (job_id, job_id))
+            with cls.get_cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
                 
-                if job_id is None:
-                    job_data = cur.fetchall()
-                else:
-                    job_data = cur.fetchone()
+                # Execute query to get job data from database
+                key = cls.register_select_statements(cls.select_columns(fields))['select_job_data']
+                cls.statements.execute(cur, key, {'job_id': job_id})
                 
-                return job_data
+                row = cur.fetchone()
+                return None if row is None else JobRecord(*row)
     
     
     @classmethod
-    def update_rejected(cls, job_title, job_company):
+    def select_jobs_page(cls, after_id=None, limit=None, fields=None):
         """
-        Change the 'rejected' flag for a job in the db from False to True
-        Inputs:  Strings of job title and company
-        Outputs: Boolean True if Transaction committed successfully, False if job not found / commit failed
+        Executes a SQL transaction to select a page of jobs' data, in job id order
+        Inputs:  Integer job id to start after (default: start from the first job)
+                 Integer maximum number of jobs to select (default: no limit)
+                 Optional list of the job fields to select (default: every field, see select_columns())
+        Outputs: List of JobRecords, as returned by select_job()
         """
         
         if cls.connection_status == False:
-            print(""" Connection to Postgres database has not been established! 
-                  Call PGHandler.init_connection_pool()""")
+            logger.error("Connection to Postgres database has not been established, call PGHandler.init_connection_pool()")
         else:
-            with cls.get_cursor() as cur:
+            with cls.get_cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                key = cls.register_select_statements(cls.select_columns(fields))['select_data_page']
+                cls.statements.execute(cur, key, {'after_id': after_id, 'limit': limit})
+                return list(itertools.starmap(JobRecord, cur.fetchall()))
     
-                # Build and execute query to check if job exists in table
-                query_select = sql.SQL(cls.text_select_from_title_company).format(
-                    field = sql.Identifier('id'),
-                    table = sql.Identifier('job'),
-                    title = sql.Placeholder(), 
-                    company = sql.Placeholder()
-                    )
-                cur.execute(query_select, (job_title, job_company))
-                
-                job_id = cur.fetchone()
-                
-                if job_id is None:
-                    print("Job not found in database")
-                    return False
+    
+    @classmethod
+    def iter_jobs(cls, after_id=None, limit=None, chunk_size=500, fields=None):
+        """
+        Generator streaming jobs' data from the database through a server-side cursor, in job id order
+        Only chunk_size rows are held in memory at a time, regardless of the number of jobs selected
+        NOTE: Holds a connection from the connection_pool until the generator is exhausted or closed
+        Inputs:  Integer job id to start after (default: start from the first job)
+                 Integer maximum number of jobs to select (default: no limit)
+                 Integer number of rows fetched from the database at a time
+                 Optional list of the job fields to select (default: every field, see select_columns())
+        Outputs: JobRecords, as returned by select_job()
+        """
+        
+        if cls.connection_status == False:
+            logger.error("Connection to Postgres database has not been established, call PGHandler.init_connection_pool()")
+        else:
+            with cls.get_cursor(name='iter_jobs', cursor_factory=psycopg2.extensions.cursor) as cur:
+                cur.itersize = chunk_size
+                key = cls.register_select_statements(cls.select_columns(fields))['select_data_page']
+                cls.statements.execute(cur, key, {'after_id': after_id, 'limit': limit})
+                yield from itertools.starmap(JobRecord, cur)
+    
+    
+    @classmethod
+    def search_jobs(cls, query, seniority=None, employment_type=None, industry=None, function=None,
+                    limit=20, offset=0, fields=None):
+        """
+        Executes a SQL transaction to select a page of the jobs best matching a full-text search over their
+        title, company and posting text (through the job_search_vector_idx GIN index)
+        Inputs:  String of the search query, in web search syntax (e.g. '"data engineer" python -senior')
+                 Optional strings of the seniority / employment type / industry / function to filter on
+                 Integer maximum number of jobs to select, and number of best matching jobs to skip
+                 Optional list of the job fields to select (default: every field, see select_columns())
+                 NOTE: Only the first search_max_candidates matches are ranked, and the search is cancelled
+                 (raising psycopg2.errors.QueryCanceled) after search_timeout_ms milliseconds
+        Outputs: List of JobRecords, as returned by select_job(), with the job's rank (most relevant first)
+        """
+        
+        if cls.connection_status == False:
+            logger.error("Connection to Postgres database has not been established, call PGHandler.init_connection_pool()")
+        else:
+            with cls.get_cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                cur.execute("SET LOCAL statement_timeout = %s;", (cls.search_timeout_ms,))
+                key = cls.register_select_statements(cls.select_columns(fields))['search_jobs']
+                cls.statements.execute(cur, key, {
+                    'query': query, 'seniority': seniority, 'employment_type': employment_type,
+                    'industry': industry, 'function': function, 'max_candidates': cls.search_max_candidates,
+                    'limit': limit, 'offset': offset})
+                return list(itertools.starmap(JobRecord, cur.fetchall()))
+    
+    
+    @classmethod
+    def reject_jobs(cls, job_ids=None, title=None, company=None, similar=False):
+        """
+        Executes a SQL transaction to change the 'rejected' flag of jobs in the db from False to True, in a
+        single statement - either the jobs with the given ids, or every job matching the title and company
+        Inputs:  List of integer job ids
+                 OR Strings of job title and company, matched ignoring case - or, if similar, matched by
+                 trigram similarity (at least reject_similarity_threshold, requires the pg_trgm extension)
+        Outputs: List of dictionaries of the matching jobs' id, title, company, time_reject and newly_rejected
+                 (False if the job was already rejected), empty if no job matched
+        """
+        
+        if cls.connection_status == False:
+            logger.error("Connection to Postgres database has not been established, call PGHandler.init_connection_pool()")
+        else:
+            with cls.get_cursor() as cur:
+                if job_ids is not None:
+                    cls.statements.execute(cur, 'reject_ids', {'job_ids': list(job_ids)})
+                elif similar:
+                    cur.execute("SET LOCAL pg_trgm.similarity_threshold = %s;", (cls.reject_similarity_threshold,))
+                    cls.statements.execute(cur, 'reject_similar', {'title': title, 'company': company})
                 else:
-                    # Build and execute query to update job listing
-                    query_update = sql.SQL(cls.text_update_query).format(
-                        table = sql.Identifier('job'),
-                        field = sql.Identifier('rejected'),
-                        value = sql.Placeholder(),
-                        field_where = sql.Identifier('id'), 
-                        value_where = sql.Placeholder()
-                        )
-                    cur.execute(query_update, (True, job_id))
-                    return True    
+                    cls.statements.execute(cur, 'reject_title_company', {'title': title, 'company': company})
+                rejected_jobs = cur.fetchall()
+            
+            cls.notify_job_change([job['id'] for job in rejected_jobs if job['newly_rejected']])
+            return rejected_jobs
+    
+    
+    @classmethod
+    def update_rejected(cls, job_title, job_company):
+        """
+        Change the 'rejected' flag for the jobs in the db with the given title and company from False to True
+        Inputs:  Strings of job title and company
+        Outputs: Boolean True if Transaction committed successfully, False if job not found / commit failed
+        """
+        
+        rejected_jobs = cls.reject_jobs(title=job_title, company=job_company)
+        if not rejected_jobs:
+            if rejected_jobs is not None:
+                logger.info("Job not found in database", extra={'title': job_title, 'company': job_company})
+            return False
+        return True
     
         
     @classmethod
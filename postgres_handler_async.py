@@ -0,0 +1,333 @@
+# Utility
+import os
+import logging
+from dotenv import load_dotenv, find_dotenv
+# Asyncpg
+import asyncpg
+# Custom modules
+from postgres_handler import PGHandler, LookupCache
+from job_record import JobRecord
+
+
+logger = logging.getLogger(__name__)
+
+
+def quote_ident(name):
+    """
+    Input:  String of a table / column name
+    Output: String of the name quoted as a SQL identifier
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+# Every job column / junction selected by PGHandler's select queries, in JobRecord order
+# (see PGHandler.build_select_columns())
+JOB_COLUMNS = ", ".join(PGHandler.job_junctions.get(field) or "job." + quote_ident(field)
+                        for field in PGHandler.select_fields)
+JOB_JUNCTIONS = PGHandler.text_select_functions_join + PGHandler.text_select_industries_join
+
+
+class AsyncPGHandler:
+    """
+    AsyncPGHandler class is the asyncio counterpart of PGHandler, used by the ASGI server (api_asgi_server.py).
+    It stores an asyncpg connection pool to the job_data Postgres database once initialized, and coroutines
+    transacting the same inserts / selects / updates as PGHandler - built from PGHandler's query strings,
+    with asyncpg's numbered parameters ($1, $2 ...) as placeholders.
+    """
+    connection_status = False
+    connection_pool = None
+
+    # Name -> id cache of the industry / function lookup tables, warmed by init_connection_pool()
+    lookup_cache = LookupCache(['industry', 'function'])
+
+    # Callbacks called with the ids of jobs inserted / updated, once committed (see add_job_change_listener())
+    job_change_listeners = []
+
+
+    @classmethod
+    async def init_connection_pool(cls):
+        """
+        Initialize a Postgres database connection pool
+        Inputs:  Requires the following environment variables to be set in the .env file:
+                 POSTGRES_HOST
+                 POSTGRES_USER
+                 POSTGRES_PASSWORD
+                 POSTGRES_DB
+                 And the following optional ones:
+                 POSTGRES_POOL_MIN_SIZE - Number of connections opened upfront (default: 2)
+                 POSTGRES_POOL_MAX_SIZE - Maximum number of connections (default: 20)
+        Outputs: AsyncPGHandler.connection_pool class attribute (or print error message)
+                 AsyncPGHandler.lookup_cache warmed with every industry / function already in the database
+        """
+        load_dotenv(find_dotenv())
+        try:
+            await cls.close_connection_pool()
+            cls.connection_pool = await asyncpg.create_pool(
+                host = os.environ.get("POSTGRES_HOST"),
+                user = os.environ.get("POSTGRES_USER"),
+                password = os.environ.get("POSTGRES_PASSWORD"),
+                database = os.environ.get("POSTGRES_DB"),
+                min_size = int(os.environ.get("POSTGRES_POOL_MIN_SIZE") or 2),
+                max_size = int(os.environ.get("POSTGRES_POOL_MAX_SIZE") or 20))
+            cls.connection_status = True
+
+            cls.lookup_cache.clear()
+            async with cls.connection_pool.acquire() as con:
+                for table in cls.lookup_cache.tables:
+                    cls.lookup_cache.update(table, await con.fetch(f"SELECT id, name FROM {quote_ident(table)};"))
+
+        except (asyncpg.PostgresError, OSError) as error:
+            error_msg = f"Error: {error}"
+            return error_msg
+
+
+    @classmethod
+    async def close_connection_pool(cls):
+        """
+        Close every connection of the connection pool, if initialized
+        """
+        if cls.connection_pool is not None:
+            await cls.connection_pool.close()
+            cls.connection_pool = None
+            cls.connection_status = False
+
+
+    @classmethod
+    def add_job_change_listener(cls, callback):
+        """
+        Register a callback to be called with the list of ids of the jobs inserted / updated by each committed
+        transaction (e.g. to invalidate cached copies of the jobs)
+        Inputs:  Function taking a list of integer job ids
+        """
+        if callback not in cls.job_change_listeners:
+            cls.job_change_listeners.append(callback)
+
+
+    @classmethod
+    def notify_job_change(cls, job_ids):
+        """
+        Call every registered job change listener with the list of changed job ids
+        """
+        if job_ids:
+            for callback in cls.job_change_listeners:
+                callback(job_ids)
+
+
+    @classmethod
+    async def insert_job(cls, input_job_data):
+        """
+        Execute a SQL transaction to insert a new job listing into the database (see PGHandler.insert_job())
+        Inputs:  JobRecord of the job's extracted data (see job_record.py)
+        Outputs: True if transaction commits to db successfully, False if the job already exists
+        """
+
+        # Check connection
+        if cls.connection_status == False:
+            logger.error("Connection to Postgres database has not been established, call AsyncPGHandler.init_connection_pool()")
+        else:
+            async with cls.connection_pool.acquire() as con:
+                async with con.transaction():
+                    try:
+                        # Nested transaction (i.e. savepoint) to retry the insert if a cached id turns out stale
+                        async with con.transaction():
+                            inserted_id = await cls.execute_insert(con, input_job_data)
+                    except asyncpg.ForeignKeyViolationError:
+                        cls.lookup_cache.clear()
+                        inserted_id = await cls.execute_insert(con, input_job_data)
+
+            # Job already exists, nothing was written
+            if inserted_id is None:
+                logger.info("Job already exists in database, insert transaction cancelled",
+                            extra={'job_id': input_job_data.id})
+                return False
+            cls.notify_job_change([inserted_id])
+
+        return True
+
+
+    @classmethod
+    async def execute_insert(cls, con, input_job_data):
+        """
+        Execute the statement inserting a new job listing (job row and junction table rows) into the database
+        Inputs:  Connection of the current transaction
+                 JobRecord of the job's extracted data
+        Outputs: Integer id of the inserted job, None if the job already exists (nothing is inserted)
+        """
+        job_fields = PGHandler.insert_columns
+        job_values = [getattr(input_job_data, column) for column in job_fields]
+        junc_data = {'industry': input_job_data.industries,
+                     'function': input_job_data.functions}
+
+        # Industry / function item is None: use the default 'NULL' row (i.e, industry_id = 1 / function_id = 1)
+        junc_ids = [[1] if values is None else await cls.resolve_name_ids(con, table, values)
+                    for table, values in junc_data.items()]
+
+        # Insert job into job table, and new rows to the junction tables for every item at once
+        n_fields = len(job_fields)
+        return await con.fetchval(PGHandler.text_insert_job_query.format(
+            fields = ",".join(map(quote_ident, job_fields)),
+            values = ",".join(f"${i}" for i in range(1, n_fields + 1)),
+            industry_ids = f"${n_fields + 1}",
+            function_ids = f"${n_fields + 2}"
+            ), *job_values, *junc_ids)
+
+
+    @classmethod
+    async def resolve_name_ids(cls, con, table, names):
+        """
+        Look up the auto-assigned ids of a list of industry / function names (see PGHandler.resolve_name_ids())
+        Inputs:  Connection of the current transaction
+                 String of the table name ('industry' / 'function') and list of names
+        Outputs: List of the names' ids
+        """
+        ids, missing = cls.lookup_cache.get(table, names)
+
+        if missing:
+            rows = await con.fetch(PGHandler.text_insert_names_query.format(
+                table = quote_ident(table),
+                names = "$1"
+                ), missing)
+
+            # NOTE: Names inserted by a concurrent transaction which committed while the previous statement
+            # waited on it are skipped by the insert, and not yet visible to the statement
+            if len({row['name'] for row in rows}) < len(missing):
+                rows += await con.fetch(PGHandler.text_select_names_query.format(
+                    table = quote_ident(table),
+                    names = "$1"
+                    ), missing)
+
+            cls.lookup_cache.update(table, rows)
+            ids.update((row['name'], row['id']) for row in rows)
+
+        return [ids[name] for name in names if name in ids]
+
+
+    @classmethod
+    async def check_job_exists(cls, job_data, show_result=False):
+        """
+        Execute a SQL transaction to check if a job is already in the database.
+        Inputs:  JobRecord of the job's data
+                 Boolean to toggle verbose check result
+        Outputs: Boolean indicating presence (True) / absence (False) of job in database
+        """
+        job_id = int(job_data.id)
+
+        if cls.connection_status == False:
+            logger.error("Connection to Postgres database has not been established, call AsyncPGHandler.init_connection_pool()")
+        else:
+            row = await cls.connection_pool.fetchrow("SELECT id FROM job WHERE id = $1;", job_id)
+
+            if row is None:
+                if show_result: logger.info("Job NOT IN database", extra={'job_id': job_id})
+                return False
+            else:
+                if show_result: logger.info("Job FOUND IN database", extra={'job_id': job_id})
+                return True
+
+
+    @classmethod
+    async def select_recent_ids(cls, limit):
+        """
+        Execute a SQL transaction to select the ids of the most recently added jobs
+        Inputs:  Integer maximum number of job ids to select
+        Outputs: List of integer job ids, most recently added first
+        """
+
+        if cls.connection_status == False:
+            logger.error("Connection to Postgres database has not been established, call AsyncPGHandler.init_connection_pool()")
+        else:
+            rows = await cls.connection_pool.fetch("SELECT id FROM job ORDER BY time_add DESC LIMIT $1;", limit)
+            return [row['id'] for row in rows]
+
+
+    @classmethod
+    async def select_job(cls, job_id=None):
+        """
+        Executes a SQL transaction to select a specific job's data
+        Inputs:  Integer job id to be selected
+                 NOTE: Will default to extracting ALL job data (see select_jobs_page() / iter_jobs())
+        Outputs: JobRecord of the job's data (see job_record.py), None if the job does not exist
+                 NOTE: Will also include information from the 'industry' and 'function' tables as lists
+        """
+
+        if job_id is None:
+            return await cls.select_jobs_page()
+
+        if cls.connection_status == False:
+            logger.error("Connection to Postgres database has not been established, call AsyncPGHandler.init_connection_pool()")
+        else:
+            query = PGHandler.text_select_job_data_query.format(columns = JOB_COLUMNS, junctions = JOB_JUNCTIONS,
+                                                                value = "$1")
+            row = await cls.connection_pool.fetchrow(query, job_id)
+            return None if row is None else JobRecord(*row)
+
+
+    @classmethod
+    async def select_jobs_page(cls, after_id=None, limit=None):
+        """
+        Executes a SQL transaction to select a page of jobs' data, in job id order
+        Inputs:  Integer job id to start after (default: start from the first job)
+                 Integer maximum number of jobs to select (default: no limit)
+        Outputs: List of JobRecords, as returned by select_job()
+        """
+
+        if cls.connection_status == False:
+            logger.error("Connection to Postgres database has not been established, call AsyncPGHandler.init_connection_pool()")
+        else:
+            rows = await cls.connection_pool.fetch(cls.build_select_page_query(), after_id, limit)
+            return [JobRecord(*row) for row in rows]
+
+
+    @classmethod
+    async def iter_jobs(cls, after_id=None, limit=None, chunk_size=500):
+        """
+        Asynchronous generator streaming jobs' data from the database through a server-side cursor
+        (see PGHandler.iter_jobs())
+        Inputs:  Integer job id to start after (default: start from the first job)
+                 Integer maximum number of jobs to select (default: no limit)
+                 Integer number of rows fetched from the database at a time
+        Outputs: JobRecords, as returned by select_job()
+        """
+
+        if cls.connection_status == False:
+            logger.error("Connection to Postgres database has not been established, call AsyncPGHandler.init_connection_pool()")
+        else:
+            async with cls.connection_pool.acquire() as con:
+                async with con.transaction():
+                    async for row in con.cursor(cls.build_select_page_query(), after_id, limit,
+                                                prefetch=chunk_size):
+                        yield JobRecord(*row)
+
+
+    @classmethod
+    def build_select_page_query(cls):
+        """
+        Outputs: Query selecting a page of jobs' data, taking the after_id ($1) and limit ($2) values
+        """
+        return PGHandler.text_select_data_page_query.format(columns = JOB_COLUMNS, junctions = JOB_JUNCTIONS,
+                                                            after_id = "$1::bigint", limit = "$2::bigint")
+
+
+    @classmethod
+    async def update_rejected(cls, job_title, job_company):
+        """
+        Change the 'rejected' flag for the jobs in the db with the given title and company from False to True
+        Inputs:  Strings of job title and company
+        Outputs: Boolean True if Transaction committed successfully, False if job not found / commit failed
+        """
+
+        if cls.connection_status == False:
+            logger.error("Connection to Postgres database has not been established, call AsyncPGHandler.init_connection_pool()")
+        else:
+            async with cls.connection_pool.acquire() as con:
+                # Reject every matching job in a single statement (see PGHandler.reject_jobs())
+                rejected_jobs = await con.fetch(PGHandler.text_reject_jobs_query.format(
+                    where = PGHandler.text_reject_where_title_company.format(title = "$1", company = "$2")
+                    ), job_title, job_company)
+
+            if not rejected_jobs:
+                logger.info("Job not found in database", extra={'title': job_title, 'company': job_company})
+                return False
+
+            cls.notify_job_change([job['id'] for job in rejected_jobs if job['newly_rejected']])
+            return True
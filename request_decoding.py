@@ -0,0 +1,164 @@
+# Utility
+import io
+import os
+import json
+import zlib
+from dotenv import load_dotenv, find_dotenv
+# Werkzeug
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.wsgi import get_input_stream
+
+
+# Content-Encoding values of the request bodies decoded (the Chrome Extension posts gzip-compressed pages)
+GZIP_ENCODINGS = ('gzip', 'x-gzip')
+IDENTITY_ENCODINGS = ('', 'identity')
+
+
+class BodyTooLargeError(Exception):
+    """
+    Raised when a request body decodes to more than the maximum decoded size
+    """
+    pass
+
+
+class InvalidEncodingError(Exception):
+    """
+    Raised when a request body is not valid gzip data (corrupt or truncated)
+    """
+    pass
+
+
+def max_decoded_size():
+    """
+    Inputs:  Reads the following (optional) environment variable from the .env file:
+             REQUEST_MAX_DECODED_MB - Maximum size of a decoded gzip request body, in MB (default: 64)
+    Outputs: Maximum size of a decoded gzip request body (bytes)
+    """
+    load_dotenv(find_dotenv())
+    return int(float(os.environ.get("REQUEST_MAX_DECODED_MB") or 64) * 2**20)
+
+
+class GzipDecoder:
+    """
+    GzipDecoder objects incrementally decode a gzip-compressed request body, as its chunks arrive, and stop as soon
+    as the decoded body grows beyond the maximum decoded size - a small, highly compressed body (e.g. a
+    'gzip bomb') is never decoded in full
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.decoded_size = 0
+        self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+    def feed(self, data):
+        """
+        Input:  Next chunk of the gzip-compressed body (bytes)
+        Output: Decoded bytes (possibly empty) - raises BodyTooLargeError / InvalidEncodingError
+        """
+        decoded = []
+        while data:
+            try:
+                # At most one byte past the maximum size is decoded, enough to tell the body is too large
+                chunk = self.decompressor.decompress(data, self.max_size - self.decoded_size + 1)
+            except zlib.error as error:
+                raise InvalidEncodingError(f"Invalid gzip data: {error}")
+            self.decoded_size += len(chunk)
+            if self.decoded_size > self.max_size:
+                raise BodyTooLargeError(f"Request body is larger than {self.max_size} bytes once decoded")
+            decoded.append(chunk)
+            # A body can hold several gzip members back to back (RFC 1952) - decode the next one
+            data = self.decompressor.unused_data if self.decompressor.eof else b''
+            if data:
+                self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return b''.join(decoded)
+
+
+    def finish(self):
+        """
+        Checks the body ended with the end of a gzip member - raises InvalidEncodingError if truncated
+        """
+        if not self.decompressor.eof:
+            raise InvalidEncodingError("Invalid gzip data: truncated")
+
+
+
+class GzipRequestStream(io.RawIOBase):
+    """
+    Read-only stream of a request's decoded body, decoding the underlying (gzip-compressed) body stream as it is
+    read - errors are raised as the HTTP errors the API responds with (413 / 400)
+    """
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, stream, max_size):
+        """
+        Inputs: Request's (compressed) body stream, and maximum decoded size (bytes)
+        """
+        super().__init__()
+        self.stream = stream
+        self.decoder = GzipDecoder(max_size)
+        self.pending = memoryview(b'')  # Decoded bytes not read yet
+        self.done = False
+
+
+    def readable(self):
+        return True
+
+
+    def readinto(self, buffer):
+        while not self.pending and not self.done:
+            data = self.stream.read(self.READ_SIZE)
+            try:
+                if data:
+                    self.pending = memoryview(self.decoder.feed(data))
+                else:
+                    self.decoder.finish()
+                    self.done = True
+            except BodyTooLargeError as error:
+                raise RequestEntityTooLarge(str(error))
+            except InvalidEncodingError as error:
+                raise BadRequest(str(error))
+
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+
+class GzipRequestMiddleware:
+    """
+    WSGI middleware decoding 'Content-Encoding: gzip' request bodies - e.g. the pruned, compressed job postings
+    posted by the Chrome Extension. The body is decoded as the API reads it (see GzipRequestStream): the
+    'text/html' intake of POST /jobs/ feeds it straight to the 'stream' parser backend, without ever holding
+    the compressed or decoded page in full. Bodies decoding to more than the maximum size are rejected with 413,
+    invalid gzip data with 400, other content encodings with 415.
+    """
+    def __init__(self, app, max_size=None):
+        """
+        Inputs: WSGI application (i.e. Flask's app.wsgi_app), and maximum decoded size of a request body
+                (bytes) - by default, REQUEST_MAX_DECODED_MB in the .env file (see max_decoded_size())
+        """
+        self.app = app
+        self.max_size = max_size or max_decoded_size()
+
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+
+        if encoding in GZIP_ENCODINGS:
+            # The compressed body, as many bytes as the Content-Length header says (or up to its end, if chunked)
+            stream = get_input_stream(environ)
+            environ['wsgi.input'] = io.BufferedReader(GzipRequestStream(stream, self.max_size),
+                                                      GzipRequestStream.READ_SIZE)
+            # The decoded body's length is unknown - it is read up to its end
+            environ['wsgi.input_terminated'] = True
+            environ.pop('CONTENT_LENGTH', None)
+            del environ['HTTP_CONTENT_ENCODING']
+
+        elif encoding not in IDENTITY_ENCODINGS:
+            body = json.dumps({'message': f"Unsupported Content-Encoding: {encoding}"}).encode()
+            start_response('415 UNSUPPORTED MEDIA TYPE', [('Content-Type', 'application/json'),
+                                                          ('Content-Length', str(len(body)))])
+            return [body]
+
+        return self.app(environ, start_response)
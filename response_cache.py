@@ -0,0 +1,232 @@
+# Utility
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv, find_dotenv
+# Redis (optional, required by the 'redis' backend only)
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """
+    In-process LRU store of serialized responses, bounded in number of entries and entry age
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key: (expiry time, value), least recently used first
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+
+    def delete(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+    def stats(self):
+        return {'size': len(self.entries), 'max_size': self.max_size, 'evictions': self.evictions}
+
+
+class RedisBackend:
+    """
+    Redis store of serialized responses, shared by every API process using the same Redis server
+    Entries expire after the TTL; the number of entries is bounded by Redis' own maxmemory policy
+    """
+    KEY_PREFIX = 'jobdataextractor:response:'
+
+    def __init__(self, url, ttl):
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+
+    def get(self, key):
+        return self.client.get(self.KEY_PREFIX + str(key))
+
+
+    def set(self, key, value):
+        self.client.set(self.KEY_PREFIX + str(key), value, ex=self.ttl)
+
+
+    def delete(self, keys):
+        if keys:
+            self.client.delete(*[self.KEY_PREFIX + str(key) for key in keys])
+
+
+    def clear(self):
+        for key in self.client.scan_iter(self.KEY_PREFIX + '*'):
+            self.client.delete(key)
+
+
+    def stats(self):
+        return {}
+
+
+class ResponseCache:
+    """
+    ResponseCache class stores the serialized JSON bodies of the API's single job responses, keyed by job id,
+    so repeated GET requests for a job are served without a database round trip or re-marshalling the job.
+    Entries are invalidated by PGHandler whenever the job is inserted / updated (see init_cache()).
+    """
+    # Cache backends, selectable through the RESPONSE_CACHE_BACKEND environment variable (see .env)
+    # 'memory' - In-process LRU cache
+    # 'redis'  - Shared cache on the Redis server at RESPONSE_CACHE_REDIS_URL
+    # 'off'    - No caching
+    BACKENDS = ['memory', 'redis', 'off']
+
+    backend = None
+    backend_name = 'off'
+    generation = 0  # Incremented by every invalidation
+    hits = 0
+    misses = 0
+    lock = threading.Lock()
+
+
+    @classmethod
+    def init_cache(cls, job_change_hook=None):
+        """
+        Initialize the response cache
+        Inputs:  Reads the following (optional) environment variables from the .env file:
+                 RESPONSE_CACHE_BACKEND   - Cache backend, one of BACKENDS (default: 'memory')
+                 RESPONSE_CACHE_SIZE      - Maximum number of cached responses (default: 1024, 'memory' only)
+                 RESPONSE_CACHE_TTL       - Seconds a response stays cached (default: 300)
+                 RESPONSE_CACHE_REDIS_URL - Redis server url (default: redis://localhost:6379/0, 'redis' only)
+                 Function registering a callback to be called with the ids of inserted / updated jobs
+                 (i.e. PGHandler.add_job_change_listener)
+        Outputs: ResponseCache.backend class attribute
+        """
+        load_dotenv(find_dotenv())
+
+        backend = os.environ.get("RESPONSE_CACHE_BACKEND") or 'memory'
+        if backend not in cls.BACKENDS:
+            raise ValueError(f"Unknown response cache backend: {backend}")
+        ttl = int(os.environ.get("RESPONSE_CACHE_TTL") or 300)
+
+        if backend == 'memory':
+            cls.backend = MemoryBackend(int(os.environ.get("RESPONSE_CACHE_SIZE") or 1024), ttl)
+        elif backend == 'redis':
+            if redis is None:
+                raise ImportError("The 'redis' response cache backend requires the redis package to be installed")
+            cls.backend = RedisBackend(os.environ.get("RESPONSE_CACHE_REDIS_URL") or 'redis://localhost:6379/0',
+                                       ttl)
+        else:
+            cls.backend = None
+
+        cls.backend_name = backend
+        cls.hits = cls.misses = 0
+        if job_change_hook is not None:
+            job_change_hook(cls.invalidate)
+
+
+    @classmethod
+    def get(cls, key):
+        """
+        Input:  Cache key (job id)
+        Output: Tuple of (JSON body bytes, ETag) if cached, else None
+                NOTE: On a miss, read ResponseCache.generation before selecting the job from the database,
+                and pass it to set() (see set())
+        """
+        if cls.backend is None:
+            return None
+
+        try:
+            body = cls.backend.get(key)
+        except Exception as error:
+            # A shared backend being unavailable must not fail the request - serve it from the database
+            logger.warning("Response cache error", extra={'error': str(error)})
+            body = None
+
+        with cls.lock:
+            if body is None:
+                cls.misses += 1
+            else:
+                cls.hits += 1
+        return None if body is None else (body, cls.make_etag(body))
+
+
+    @classmethod
+    def set(cls, key, body, generation):
+        """
+        Input:  Cache key (job id), JSON body bytes, and ResponseCache.generation as read before the body's 
+                data was selected from the database - the body is not cached if any job changed since, as
+                the data may predate the change
+        Output: ETag of the body
+        """
+        if cls.backend is not None and generation == cls.generation:
+            try:
+                cls.backend.set(key, body)
+            except Exception as error:
+                logger.warning("Response cache error", extra={'error': str(error)})
+        return cls.make_etag(body)
+
+
+    @classmethod
+    def invalidate(cls, keys):
+        """
+        Input:  List of cache keys (job ids) to drop from the cache
+        """
+        with cls.lock:
+            cls.generation += 1
+        if cls.backend is not None:
+            try:
+                cls.backend.delete(keys)
+            except Exception as error:
+                logger.warning("Response cache error", extra={'error': str(error)})
+
+
+    @staticmethod
+    def make_etag(body):
+        """
+        Input:  JSON body bytes
+        Output: ETag (hash of the body, so every process / backend computes the same ETag for a response)
+        """
+        return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+    @classmethod
+    def stats(cls):
+        """
+        Output: Dict of the backend used, hit / miss counters and hit rate (plus the backend's own stats)
+        """
+        requests = cls.hits + cls.misses
+        stats = {'backend': cls.backend_name, 'hits': cls.hits,
+                 'misses': cls.misses, 'hit_rate': round(cls.hits / requests, 4) if requests else None}
+        if cls.backend is not None:
+            stats.update(cls.backend.stats())
+        return stats
@@ -0,0 +1,151 @@
+# Utility
+import time
+import threading
+# Psycopg2
+import psycopg2.extensions
+from psycopg2 import sql
+# Custom modules
+from metrics import Metrics
+
+
+class RegistryConnection(psycopg2.extensions.connection):
+    """
+    Connection holding the statements of a StatementRegistry rendered for it, and the names of the statements
+    prepared on its server session (pass as connection_factory to psycopg2.connect())
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rendered_statements = {}
+        self.prepared_statements = set()
+
+
+class Statement:
+    """
+    Statement objects store a query shape composed once: with named placeholders (%(param)s) to be executed
+    as is, and with numbered parameters ($1, $2 ...) to be prepared on the server
+    """
+    def __init__(self, number, query, prepared_query, params):
+        self.prepared_name = f"statement_{number}"
+        self.query = query
+        self.prepared_query = prepared_query
+        self.params = params
+        self.execute_query = (b"EXECUTE " + self.prepared_name.encode()
+                              + (b"(" + b",".join([b"%s"] * len(params)) + b")" if params else b""))
+
+
+class StatementRegistry:
+    """
+    StatementRegistry objects compose each query shape once, render it to bytes once per connection, and
+    optionally execute it as a server-side prepared statement (PREPARE once per connection, then EXECUTE),
+    so Postgres skips parsing and planning it on every call
+    NOTE: Prepared statements may be planned once for all parameter values (i.e. a generic plan) - register
+    queries whose best plan depends on the parameter values with prepare=False
+    """
+    def __init__(self, use_prepared=False):
+        self.use_prepared = use_prepared
+        self.statements = {}
+        self.lock = threading.Lock()
+        # Counted under the lock - statements are executed concurrently by the connection pool's threads / greenlets
+        self.counts = {'executed': 0, 'prepared': 0, 'renders': 0}
+
+
+    def register(self, key, build_query, prepare=True):
+        """
+        Compose a query shape (no-op if already registered)
+        Inputs:  Hashable key identifying the query shape (including anything its composition depends on)
+                 Function taking a placeholder function (param name -> sql.Composable) and returning the query
+                 Boolean to allow the query to be executed as a prepared statement (if use_prepared)
+        """
+        if key in self.statements:
+            return
+
+        params = []
+        def placeholder(param):
+            if param not in params:
+                params.append(param)
+            return sql.Placeholder(param)
+        query = build_query(placeholder)
+        prepared_query = build_query(lambda param: sql.SQL(f"${params.index(param) + 1}")) if prepare else None
+
+        with self.lock:
+            if key not in self.statements:
+                self.statements[key] = Statement(len(self.statements), query, prepared_query, params)
+
+
+    def is_registered(self, key):
+        return key in self.statements
+
+
+    def render(self, con, key, query):
+        """
+        Inputs:  Connection, key of the statement and composed query
+        Output:  Bytes of the query rendered for the connection (cached on RegistryConnection objects)
+        """
+        rendered_statements = getattr(con, 'rendered_statements', None)
+        rendered = None if rendered_statements is None else rendered_statements.get(key)
+        if rendered is None:
+            rendered = query.as_string(con).encode(psycopg2.extensions.encodings[con.encoding])
+            self.count('renders')
+            if rendered_statements is not None:
+                rendered_statements[key] = rendered
+        return rendered
+
+
+    def execute(self, cur, key, values, prefix=b""):
+        """
+        Execute a registered statement, timed in Metrics.db_statement_seconds - per statement name (the key, or
+        its first item for tuple keys, e.g. projections of the same statement)
+        Inputs:  Cursor of the current transaction
+                 Key of the statement, and dictionary of its param name: value
+                 Bytes of statements to send in the same round trip, before the statement (e.g. a SAVEPOINT)
+        """
+        start = time.perf_counter()
+        try:
+            self.execute_statement(cur, key, values, prefix)
+        finally:
+            Metrics.observe(Metrics.db_statement_seconds, time.perf_counter() - start,
+                            key[0] if isinstance(key, tuple) else key)
+
+
+    def execute_statement(self, cur, key, values, prefix):
+        """
+        Utility function used in execute()
+        """
+        statement = self.statements[key]
+        con = cur.connection
+        prepared_statements = getattr(con, 'prepared_statements', None)
+        self.count('executed')
+
+        # Named (server-side) cursors can only be declared for the query itself
+        if (not self.use_prepared or statement.prepared_query is None or prepared_statements is None
+                or cur.name is not None):
+            cur.execute(prefix + self.render(con, key, statement.query), values)
+            return
+
+        name = statement.prepared_name
+        if name not in prepared_statements:
+            # NOTE: Prepared statements outlive the transaction (even if rolled back), until the session ends
+            # Executed with (no) values, so literal '%%' in the query are unescaped as when executed as is
+            cur.execute(b"PREPARE " + name.encode() + b" AS "
+                        + statement.prepared_query.as_string(con).encode(psycopg2.extensions.encodings[con.encoding]),
+                        [])
+            prepared_statements.add(name)
+            self.count('prepared')
+
+        cur.execute(prefix + statement.execute_query, [values[param] for param in statement.params])
+
+
+    def count(self, counter):
+        """
+        Input: Name of the counter to increment (see stats())
+        """
+        with self.lock:
+            self.counts[counter] += 1
+
+
+    def stats(self):
+        """
+        Output: Dict of the number of statements registered, executed, prepared and rendered
+        """
+        with self.lock:
+            return dict(self.counts, statements=len(self.statements), use_prepared=self.use_prepared)
@@ -0,0 +1,65 @@
+# Utility
+import os
+import sys
+import json
+import logging
+from dotenv import load_dotenv, find_dotenv
+
+
+# Attributes of every logging.LogRecord - any other attribute was passed through the 'extra' argument
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats log records as one JSON object per line - time, level, logger and message, plus the fields passed
+    through the 'extra' argument of the logging call (e.g. logger.info("...", extra={'job_id': job_id})) and the
+    exception's traceback, if any
+    """
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Formats log records as human-readable lines, with the fields passed through the 'extra' argument appended as
+    key=value pairs
+    """
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+    def format(self, record):
+        line = super().format(record)
+        extra = ' '.join(f'{key}={value}' for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        return f'{line} {extra}' if extra else line
+
+
+
+def configure_logging():
+    """
+    Configure the root logger of the API / tools, unless the server running them already did
+    Inputs:  Reads the following (optional) environment variables from the .env file:
+             LOG_LEVEL  - Minimum level of the records logged (default: 'INFO')
+             LOG_FORMAT - 'json' (one JSON object per line, default) or 'text'
+    Outputs: Handler writing to stderr, added to the root logger
+    """
+    load_dotenv(find_dotenv())
+
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(TextFormatter() if os.environ.get("LOG_FORMAT") == 'text' else JsonFormatter())
+    root.addHandler(handler)
+    root.setLevel(os.environ.get("LOG_LEVEL") or 'INFO')
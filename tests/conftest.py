@@ -0,0 +1,6 @@
+# Utility
+import os
+import sys
+
+# The modules under test live in the repo's top-level directory, next to this one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,91 @@
+"""
+BulkIngestor's handling of a batch - skipped, failed and retryable documents - with the database calls of
+PGHandler replaced by an in-memory set of job ids.
+"""
+# Utility
+import pytest
+# Custom modules
+import bulk_ingest
+from bulk_ingest import BulkIngestor, extract_document, iter_ndjson_documents, make_document
+from extraction_pool import ExtractionPool, PoolFullError
+from job_record import JobRecord
+from postgres_handler import PGHandler
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """
+    Output: Set of the ids of the jobs 'in the database', updated by PGHandler.insert_jobs()
+    """
+    job_ids = {1}
+
+    def insert_jobs(job_list):
+        status = {job.id: 'exists' if job.id in job_ids else 'inserted' for job in job_list}
+        job_ids.update(status)
+        return status
+
+    monkeypatch.setattr(PGHandler, 'select_existing_ids', classmethod(lambda cls, ids: job_ids & set(ids)))
+    monkeypatch.setattr(PGHandler, 'insert_jobs', classmethod(lambda cls, job_list: insert_jobs(job_list)))
+    return job_ids
+
+
+def extract_batch(documents):
+    """
+    Stand-in for the extraction pool - 'busy' pages are refused by a full pool, 'bad' pages fail to parse
+    """
+    def extract(job_input_data):
+        if job_input_data['html'] == 'busy':
+            raise PoolFullError("Extraction pool is full")
+        if job_input_data['html'] == 'bad':
+            raise AttributeError("No <article> tag found in the job posting HTML")
+        return JobRecord(id=job_input_data['id'], title=job_input_data['html'])
+    return [extract_document(document, extract=extract) for document in documents]
+
+
+@pytest.mark.parametrize('html, result', [('ok', (2, JobRecord(id=2, title='ok'), None, False)),
+                                          ('bad', (2, None, 'AttributeError: No <article> tag found in the job '
+                                                             'posting HTML', False)),
+                                          ('busy', (2, None, 'PoolFullError: Extraction pool is full', True))])
+def test_extract_document_flags_retryable_errors(html, result):
+    assert extract_batch([make_document('line 1', 2, html)]) == [result]
+
+
+def test_ingest_batch_statuses(database):
+    lines = ['{"id": 1, "HTML": "known"}', '{"id": 2, "HTML": "ok"}', '{"id": 2, "HTML": "repeated"}',
+             'not json', '{"id": 3, "HTML": "busy"}', '{"id": 4, "HTML": "bad"}', '', '{"id": 5, "HTML": "ok"}']
+    ingestor = BulkIngestor(extract_batch, batch_size=3)
+    results = list(ingestor.ingest(iter_ndjson_documents(lines)))
+
+    assert [(result['id'], result['status']) for result in results] == \
+        [(1, 'exists'), (2, 'inserted'), (2, 'exists'), (None, 'failed'), (3, 'retry'), (4, 'failed'), (5, 'inserted')]
+    assert results[4]['error'].startswith('PoolFullError')
+    assert database == {1, 2, 5}
+    summary = ingestor.summary()
+    assert (summary['documents'], summary['inserted'], summary['exists'], summary['failed'], summary['retry']) == \
+        (7, 2, 2, 2, 1)
+
+
+def test_pool_retries_until_a_slot_is_free(monkeypatch):
+    attempts = []
+
+    def extract(job_input_data):
+        attempts.append(job_input_data['id'])
+        if len(attempts) < 3:
+            raise PoolFullError("Extraction pool is full")
+        return JobRecord(id=job_input_data['id'])
+
+    monkeypatch.setattr(ExtractionPool, 'extract', extract)
+    monkeypatch.setattr(ExtractionPool, 'timeout', 10)
+    monkeypatch.setitem(PGHandler.pool_primitives, 'sleep', lambda seconds: None)
+    assert bulk_ingest.extract_with_pool_retries({'id': 7, 'html': ''}) == JobRecord(id=7)
+    assert attempts == [7, 7, 7]
+
+
+def test_pool_retries_give_up_after_the_pool_timeout(monkeypatch):
+    def extract(job_input_data):
+        raise PoolFullError("Extraction pool is full")
+
+    monkeypatch.setattr(ExtractionPool, 'extract', extract)
+    monkeypatch.setattr(ExtractionPool, 'timeout', 0.1)
+    with pytest.raises(PoolFullError):
+        bulk_ingest.extract_with_pool_retries({'id': 7, 'html': ''})
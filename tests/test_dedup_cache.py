@@ -0,0 +1,99 @@
+"""
+DedupCache's claim / release cycle: duplicates rejected by known id, in-flight id and content hash, and the
+bounds of the known ids and content hashes.
+"""
+# Utility
+import threading
+import pytest
+# Custom modules
+from dedup_cache import DedupCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """
+    Output: Function initializing DedupCache with the given bounds, the ids of the 'database' and a job change
+            hook - returns the list of the callbacks registered by the hook
+    """
+    monkeypatch.setattr(DedupCache, 'in_flight_ids', set())
+
+    def init(known_ids=100, content_hashes=0, recent_ids=()):
+        monkeypatch.setenv('DEDUP_KNOWN_IDS', str(known_ids))
+        monkeypatch.setenv('DEDUP_CONTENT_HASHES', str(content_hashes))
+        listeners = []
+        DedupCache.init_cache(lambda n: list(recent_ids)[:n], listeners.append)
+        return listeners
+    return init
+
+
+def test_seeded_ids_are_known(cache):
+    # Most recent first - the oldest ids are evicted past the bound
+    listeners = cache(known_ids=2, recent_ids=[30, 20, 10])
+    assert DedupCache.claim(30) == 'known'
+    assert DedupCache.claim(20) == 'known'
+    assert DedupCache.claim(10) is None
+    assert listeners == [DedupCache.add_known_ids]
+
+
+def test_job_change_hook_adds_known_ids(cache):
+    listeners = cache()
+    listeners[0]([1, 2])
+    assert DedupCache.claim(1) == 'known'
+    assert DedupCache.claim(3) is None
+
+
+def test_claim_and_release(cache):
+    cache()
+    assert DedupCache.claim(1) is None
+    assert DedupCache.claim(1) == 'in_flight'
+    DedupCache.release(1)
+    # Not stored (e.g. failed extraction): the job can be posted again
+    assert DedupCache.claim(1) is None
+    DedupCache.release(1, stored=True)
+    assert DedupCache.claim(1) == 'known'
+    assert DedupCache.stats() == {'known_ids': 1, 'max_known_ids': 100, 'in_flight_ids': 0,
+                                  'content_hashes': None, 'rejected': {'known': 1, 'in_flight': 1, 'content': 0}}
+
+
+def test_content_hashes(cache):
+    cache(content_hashes=2)
+    pages = ['<html>1</html>', '<html>2</html>', '<html>3</html>']
+    for job_id, html in enumerate(pages):
+        assert DedupCache.claim(job_id, html) is None
+        DedupCache.release(job_id, html, stored=True)
+    # Same page under another job id - the oldest hash was evicted past the bound
+    assert DedupCache.claim(10, pages[0]) is None
+    assert DedupCache.claim(11, pages[1]) == 'content'
+    assert DedupCache.claim(12, pages[2]) == 'content'
+    # Hashes are only kept for stored jobs
+    DedupCache.release(10, pages[0])
+    assert DedupCache.claim(13, pages[0]) is None
+    assert DedupCache.stats()['content_hashes'] == 2
+
+
+def test_disabled_bounds(cache):
+    listeners = cache(known_ids=-1, recent_ids=[1])
+    listeners[0]([2])
+    DedupCache.release(3, '<html></html>', stored=True)
+    assert DedupCache.claim(1) is None
+    assert DedupCache.claim(2) is None
+    assert DedupCache.claim(4, '<html></html>') is None
+    assert DedupCache.stats()['known_ids'] == 0
+    assert DedupCache.stats()['content_hashes'] is None
+
+
+def test_concurrent_claims(cache):
+    cache()
+    barrier = threading.Barrier(8)
+    results = []
+
+    def claim():
+        barrier.wait()
+        results.append(DedupCache.claim(1))
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(None) == 1 and results.count('in_flight') == 7
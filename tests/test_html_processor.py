@@ -0,0 +1,124 @@
+"""
+Parity of the JobData parser backends with the 'bs4' reference backend: over the fixture corpus (against its
+golden outputs, see benchmarks/bench_extraction.py), and over snippets of malformed / unusual markup derived
+from its first page.
+"""
+# Utility
+import io
+import re
+import json
+import pytest
+# Custom modules
+from html_processor import JobData
+from benchmarks.bench_extraction import FIXTURES_DIR, load_pages, load_golden, golden_output
+
+
+REFERENCE_BACKEND = 'bs4'
+BACKENDS = ['lxml', 'stream']
+PAGES = load_pages(FIXTURES_DIR)
+BASE_PAGE = dict(PAGES)['01_standard.html']
+DETAILS_TAG = ('<div class="jobs-box__html-content jobs-description-content__text t-14 t-normal" id="job-details" '
+               'tabindex="-1">')
+TITLE_TEXT = 'Data Engineer\n     </h1>'
+
+# Variations of the first fixture page - name: page
+SNIPPETS = {
+    'p_wrapping_details': BASE_PAGE.replace(DETAILS_TAG, '<p>' + DETAILS_TAG + 'Posting <p>text more'),
+    'entities_without_semicolon': BASE_PAGE.replace(TITLE_TEXT, 'Data &ndash Engineer &amp Co &copy\n     </h1>'),
+    'cdata': BASE_PAGE.replace(DETAILS_TAG, DETAILS_TAG + '<![CDATA[Apply by Friday]]>'),
+    'charrefs': BASE_PAGE.replace(DETAILS_TAG, DETAILS_TAG + '&#8212; &#x2014; &#0; &#x110000; &bogus; &amp;'),
+    'unclosed_tags': BASE_PAGE.replace('</li>', '').replace('</p>', ''),
+    'stray_end_tags': BASE_PAGE.replace(DETAILS_TAG, DETAILS_TAG + '</span></b></div>'),
+    'comment_script_style': BASE_PAGE.replace(DETAILS_TAG, DETAILS_TAG + '<!-- hidden --><script>var x = "<p>no</p>";'
+                                              '</script><style>p{}</style>'),
+    'pre_whitespace': BASE_PAGE.replace(DETAILS_TAG, DETAILS_TAG + '<pre>  keep   \n\n  this  </pre>'),
+    'truncated': BASE_PAGE[:BASE_PAGE.index('</article>')],
+    'missing_article': BASE_PAGE.replace('<article', '<section').replace('</article>', '</section>'),
+    'missing_header': BASE_PAGE.replace('"mt6 ml5 flex-grow-1"', '"mt6 ml5 other"'),
+    'missing_details': BASE_PAGE.replace('id="job-details"', 'id="other"'),
+    'missing_h1': re.sub(r'<h1.*?</h1>', '', BASE_PAGE, flags=re.S),
+    'missing_h3': re.sub(r'<h3 class="jobs-top-card.*?</h3>', '', BASE_PAGE, flags=re.S),
+}
+
+# Known differences of the 'lxml' backend (which is why 'bs4' stays the default, see .env) - backend: snippets
+KNOWN_DIFFERENCES = {
+    # libxml2 keeps entities without a semicolon as-is, drops CDATA sections and replaces NUL characters,
+    # and the tags missing from a page raise IndexError
+    'lxml': {'entities_without_semicolon', 'cdata', 'charrefs', 'missing_h1', 'missing_h3'},
+}
+
+
+def extract(html, backend):
+    """
+    Input:  HTML string (or file-like object) and parser backend name
+    Output: Dict of the extracted GOLDEN_FIELDS, or the type of the exception raised
+    """
+    job = JobData(job_input_data={'id': 0, 'html': html}, backend=backend)
+    try:
+        job.extract_job_data()
+    except Exception as error:
+        return type(error)
+    # Round-trip through JSON, as golden outputs are stored
+    return json.loads(json.dumps(golden_output(job.data)))
+
+
+@pytest.mark.parametrize('backend', [REFERENCE_BACKEND] + BACKENDS)
+@pytest.mark.parametrize('filename, html', PAGES, ids=[filename for filename, _ in PAGES])
+def test_fixture_matches_golden(filename, html, backend):
+    assert extract(html, backend) == load_golden(FIXTURES_DIR, filename)
+
+
+def snippet_params():
+    """
+    Output: List of pytest params of (snippet name, backend) - known differences are expected to fail
+    """
+    params = []
+    for backend in BACKENDS:
+        for name in sorted(SNIPPETS):
+            marks = []
+            if name in KNOWN_DIFFERENCES.get(backend, ()):
+                marks = [pytest.mark.xfail(reason=f"Known difference of the '{backend}' backend", strict=True)]
+            params.append(pytest.param(name, backend, marks=marks, id=f"{name}-{backend}"))
+    return params
+
+
+@pytest.mark.parametrize('name, backend', snippet_params())
+def test_snippet_matches_reference(name, backend):
+    assert extract(SNIPPETS[name], backend) == extract(SNIPPETS[name], REFERENCE_BACKEND)
+
+
+def test_snippets_vary_the_page():
+    # Guards against a snippet silently testing the unchanged page once the fixture page changes
+    assert all(html != BASE_PAGE for html in SNIPPETS.values())
+
+
+class CountingReader(io.BytesIO):
+    """
+    Binary stream counting the bytes read from it
+    """
+    bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+@pytest.mark.parametrize('chunk_size', [2, 3, 4096])
+@pytest.mark.parametrize('filename, html', PAGES, ids=[filename for filename, _ in PAGES])
+def test_stream_reads_binary_stream(monkeypatch, filename, html, chunk_size):
+    # Multi-byte characters split across chunks must be decoded as a whole
+    monkeypatch.setattr(JobData, 'FEED_CHUNK_SIZE', chunk_size)
+    assert extract(io.BytesIO(html.encode('utf-8')), 'stream') == load_golden(FIXTURES_DIR, filename)
+
+
+def test_stream_reads_text_stream():
+    assert extract(io.StringIO(BASE_PAGE), 'stream') == extract(BASE_PAGE, REFERENCE_BACKEND)
+
+
+def test_stream_stops_reading_once_complete():
+    # Nothing past the article and header card can change the extracted text - it is never read
+    trailer = '<div>' + 'x' * 10 * JobData.FEED_CHUNK_SIZE + '</div>'
+    stream = CountingReader(BASE_PAGE.replace('</body>', trailer + '</body>').encode('utf-8'))
+    assert extract(stream, 'stream') == extract(BASE_PAGE, REFERENCE_BACKEND)
+    assert stream.bytes_read <= len(BASE_PAGE.encode('utf-8')) + JobData.FEED_CHUNK_SIZE
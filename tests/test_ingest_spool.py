@@ -0,0 +1,77 @@
+"""
+IngestSpool's worker: completed, failed and retried postings - in a temporary spool file, with the database
+calls of PGHandler replaced by an in-memory set of job ids.
+"""
+# Utility
+import pytest
+# Custom modules
+from bulk_ingest import extract_document
+from extraction_pool import ExtractionPool, PoolFullError
+from ingest_spool import IngestSpool
+from job_record import JobRecord
+from postgres_handler import PGHandler
+
+
+def extract_batch(documents):
+    """
+    Stand-in for the extraction pool - 'busy' pages are refused by a full pool, 'bad' pages fail to parse
+    """
+    def extract(job_input_data):
+        if job_input_data['html'] == 'busy':
+            raise PoolFullError("Extraction pool is full")
+        if job_input_data['html'] == 'bad':
+            raise AttributeError("No <article> tag found in the job posting HTML")
+        return JobRecord(id=job_input_data['id'])
+    return [extract_document(document, extract=extract) for document in documents]
+
+
+@pytest.fixture
+def spool(monkeypatch, tmp_path):
+    monkeypatch.setenv('INGEST_MODE', 'spool')
+    monkeypatch.setenv('INGEST_SPOOL_PATH', str(tmp_path / 'spool.sqlite3'))
+    monkeypatch.setenv('INGEST_MAX_ATTEMPTS', '2')
+    monkeypatch.setattr(IngestSpool, 'connection', None)
+    monkeypatch.setattr(ExtractionPool, 'retry_after', 5)
+    # The worker is driven by the tests (process_batch()), not started in the background
+    monkeypatch.setitem(PGHandler.pool_primitives, 'spawn', lambda function: None)
+    monkeypatch.setattr(PGHandler, 'connection_status', True)
+    monkeypatch.setattr(PGHandler, 'select_existing_ids', classmethod(lambda cls, ids: set()))
+    monkeypatch.setattr(PGHandler, 'insert_jobs',
+                        classmethod(lambda cls, job_list: {job.id: 'inserted' for job in job_list}))
+    IngestSpool.init_spool(extract_batch)
+    yield IngestSpool
+    IngestSpool.connection.close()
+
+
+def due_now(spool):
+    spool.connection.execute("UPDATE spool SET next_attempt = 0")
+
+
+def test_postings_are_completed(spool):
+    assert spool.enqueue(1, 'ok') and not spool.enqueue(1, 'ok')
+    assert spool.process_batch() == 1
+    assert spool.status(1)['status'] == 'inserted' and spool.status(1)['attempts'] == 1
+
+
+def test_failed_postings_are_retried_then_failed(spool):
+    spool.enqueue(2, 'bad')
+    spool.process_batch()
+    assert (spool.status(2)['status'], spool.status(2)['attempts']) == ('queued', 1)
+    due_now(spool)
+    spool.process_batch()
+    assert (spool.status(2)['status'], spool.status(2)['attempts']) == ('failed', 2)
+    assert spool.status(2)['error'].startswith('AttributeError')
+
+
+def test_full_extraction_pool_is_not_an_attempt(spool):
+    spool.enqueue(3, 'busy')
+    spool.enqueue(4, 'ok')
+    # Only the extracted posting counts as processed, however many times the pool stays full
+    assert spool.process_batch() == 1 and spool.status(4)['status'] == 'inserted'
+    for _ in range(3):
+        due_now(spool)
+        assert spool.process_batch() == 0
+    assert (spool.status(3)['status'], spool.status(3)['attempts'], spool.status(3)['error']) == ('queued', 0, None)
+    next_attempt, time_updated = spool.connection.execute(
+        "SELECT next_attempt, time_updated FROM spool WHERE job_id = 3").fetchone()
+    assert next_attempt - time_updated == pytest.approx(ExtractionPool.retry_after)
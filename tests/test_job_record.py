@@ -0,0 +1,83 @@
+"""
+JobRecord tuples are pickled to / from the extraction pool's workers and map onto the select queries' rows as-is:
+their fields must survive a round-trip and stay in the order PGHandler selects and inserts them.
+"""
+# Utility
+import pickle
+from datetime import datetime
+import pytest
+from psycopg2 import sql
+# Custom modules
+from job_record import JobRecord, EXTRACTED_FIELDS
+from postgres_handler import PGHandler
+
+
+JOB = JobRecord(
+    id = 1234567890,
+    url = 'https://www.linkedin.com/jobs/view/1234567890/',
+    title = 'Ingénieur Données',
+    company = 'Acme',
+    location = 'Montréal, Québec, Canada',
+    seniority = 'Entry level',
+    employment_type = 'Full-time',
+    industries = ['Computer Software', 'Internet'],
+    functions = [],
+    posting_text = 'About the role:\nBuild data pipelines',
+    time_add = datetime(2021, 3, 4, 5, 6, 7),
+    rejected = False,
+    time_reject = None,
+    rank = 0.5,
+)
+
+
+def selected_fields(columns):
+    """
+    Input:  Tuple of job columns, as returned by PGHandler.select_columns()
+    Output: List of the fields actually selected by the {columns} of the select queries, None for the NULLs
+    """
+    columns_sql, _ = PGHandler.build_select_columns(columns)
+    return [None if part == sql.SQL("NULL") else part.string if isinstance(part, sql.SQL) else part.strings[1]
+            for part in columns_sql.seq[::2]]
+
+
+@pytest.mark.parametrize('protocol', range(pickle.HIGHEST_PROTOCOL + 1))
+def test_pickle_round_trip(protocol):
+    job = pickle.loads(pickle.dumps(JOB, protocol))
+    assert type(job) is JobRecord
+    assert job == JOB
+
+
+def test_tuple_behaviour():
+    assert not hasattr(JOB, '__dict__')
+    assert JobRecord() == (None,) * len(JobRecord._fields)
+    assert JobRecord(**JOB._asdict()) == JOB
+    assert JOB._replace(rank=None) == JOB[:-1] + (None,)
+
+
+def test_extracted_fields():
+    assert EXTRACTED_FIELDS == ('id', 'url', 'title', 'company', 'location', 'seniority', 'employment_type',
+                                'industries', 'functions', 'posting_text')
+    assert PGHandler.insert_columns == tuple(field for field in EXTRACTED_FIELDS
+                                             if field not in PGHandler.job_junctions)
+
+
+def test_select_fields_map_onto_records():
+    # Every column selected by default, in JobRecord order, but the rank selected by searches only
+    assert PGHandler.select_fields == JobRecord._fields[:-1]
+    assert set(PGHandler.select_fields) == set(PGHandler.job_columns) | set(PGHandler.job_junctions)
+    row = tuple(JOB)[:-1]
+    assert JobRecord(*row) == JOB._replace(rank=None)
+    assert JobRecord(*row, 0.5) == JOB
+
+
+@pytest.mark.parametrize('fields', [None, ['title', 'company'], ['industries'], ['posting_text', 'functions']],
+                         ids=['every_field', 'columns', 'junction', 'mixed'])
+def test_select_columns_keep_record_order(fields):
+    columns = PGHandler.select_columns(fields)
+    selected = selected_fields(columns)
+    assert len(selected) == len(PGHandler.select_fields)
+    for field, column in zip(PGHandler.select_fields, selected):
+        if fields is None or field == 'id' or field in fields:
+            assert column == (PGHandler.job_junctions[field] if field in PGHandler.job_junctions else field)
+        else:
+            assert column is None
@@ -0,0 +1,108 @@
+"""
+JobSerializer must output the same bytes as json.dumps(marshal(job, output_fields)), the way the API serialized
+job responses before, for every field type the API yields and every value the database can return.
+The fields mirror those of api_linkedin_extractor.py, whose import would initialize the app's services.
+"""
+# Utility
+import json
+import math
+from datetime import datetime
+import pytest
+# Flask-RESTful
+from flask import Flask
+from flask_restful import Api, Resource, fields, marshal
+# Custom modules
+from job_record import JobRecord
+from job_serializer import JobSerializer
+
+
+job_fields = {
+    'id': fields.Integer,
+    'url': fields.String,
+    'title': fields.String,
+    'company': fields.String,
+    'location': fields.String,
+    'seniority': fields.String,
+    'employment_type': fields.String,
+    'industries': fields.List(fields.String),
+    'functions': fields.List(fields.String),
+    'posting_text': fields.String,
+    'uri': fields.Url('job')
+}
+search_fields = dict(job_fields, rank=fields.Float)
+# Field types JobSerializer does not encode directly, output through their own output()
+reject_fields = {
+    'id': fields.Integer,
+    'title': fields.String,
+    'time_reject': fields.DateTime(dt_format='iso8601'),
+    'rejected': fields.Boolean,
+    'uri': fields.Url('job')
+}
+FIELD_SETS = {'job': job_fields, 'search': search_fields, 'reject': reject_fields,
+              'projected': {field: job_fields[field] for field in ['id', 'title', 'company', 'location']}}
+
+BASE_JOB = JobRecord(
+    id = 1234567890,
+    url = 'https://www.linkedin.com/jobs/view/1234567890/',
+    title = 'Data Engineer',
+    company = 'Acme',
+    location = 'Paris, France',
+    seniority = 'Entry level',
+    employment_type = 'Full-time',
+    industries = ['Computer Software', 'Internet'],
+    functions = ['Engineering'],
+    posting_text = 'About the role:\nBuild data pipelines',
+    time_reject = datetime(2021, 3, 4, 5, 6, 7),
+    rejected = True,
+    rank = 0.5,
+)
+JOBS = {
+    'standard': BASE_JOB,
+    'missing_values': JobRecord(id=1),
+    'non_ascii': BASE_JOB._replace(title='Ingénieur Données – 日本語', location='Montréal, Québec, Canada'),
+    'escapes': BASE_JOB._replace(title='"Senior" \\ Lead', posting_text='Tab\there\r\nNUL\x00 bell\x07  '),
+    'empty_lists': BASE_JOB._replace(industries=[], functions=[]),
+    'lists_with_none': BASE_JOB._replace(industries=[None, 'Internet'], functions=[None]),
+    'zero_rank': BASE_JOB._replace(rank=0.0),
+    'small_rank': BASE_JOB._replace(rank=1e-7),
+    'integer_rank': BASE_JOB._replace(rank=1),
+    'nan_rank': BASE_JOB._replace(rank=math.nan),
+    'inf_rank': BASE_JOB._replace(rank=-math.inf),
+    'not_rejected': BASE_JOB._replace(rejected=False, time_reject=None),
+}
+
+
+@pytest.fixture(scope='module')
+def app():
+    """
+    Output: Flask app routing the jobs' 'uri' the way the API does
+    """
+    class Job(Resource):
+        def get(self, id):
+            return {}
+
+    app = Flask(__name__)
+    Api(app).add_resource(Job, '/jobdataextractor/api/v1.0/jobs/<int:id>', endpoint='job')
+    with app.test_request_context('/jobdataextractor/api/v1.0/jobs/'):
+        yield app
+
+
+@pytest.mark.parametrize('job_name', JOBS)
+@pytest.mark.parametrize('fields_name', FIELD_SETS)
+def test_serialize_matches_marshal(app, fields_name, job_name):
+    output_fields, job = FIELD_SETS[fields_name], JOBS[job_name]
+    expected = json.dumps(marshal(job._asdict(), output_fields))
+    assert JobSerializer(output_fields).serialize(job) == expected
+
+
+def test_serialize_list_matches_marshal(app):
+    jobs = list(JOBS.values())
+    serializer = JobSerializer(search_fields)
+    assert serializer.serialize_list(jobs) == json.dumps([marshal(job._asdict(), search_fields) for job in jobs])
+    assert serializer.serialize_list([]) == json.dumps([])
+
+
+def test_explicit_uri_prefix():
+    # No request context: the 'uri' is built from the given prefix only
+    serializer = JobSerializer({'id': fields.Integer, 'uri': fields.Url('job')}, uri_prefix='/jobs/')
+    assert serializer.serialize(JobRecord(id=42)) == '{"id": 42, "uri": "/jobs/42"}'
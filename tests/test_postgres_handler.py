@@ -0,0 +1,144 @@
+"""
+PGHandler's set-based job inserts: the industry / function ids resolved from the lookup cache (or the database)
+for the insert statement, and - against the database of the .env file, if TEST_DATABASE=1 - the rows written,
+compared with the row-by-row inserts they replaced (see benchmarks/bench_insert.py).
+"""
+# Utility
+import os
+import itertools
+import pytest
+# Custom modules
+from benchmarks.bench_insert import BASE_JOB_ID, cleanup, insert_job_rowwise, make_job, normalize
+from job_record import JobRecord
+from postgres_handler import LookupCache, PGHandler
+
+
+class FakeStatements:
+    """
+    Statement registry recording the statements executed, whose cursor returns the ids of the 'database'
+    """
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.executed = []
+
+    def execute(self, cur, key, values, prefix=b""):
+        self.executed.append((key, values))
+        self.cursor.execute(key, values)
+
+
+class FakeCursor:
+    """
+    Cursor over lookup tables held in dicts of name: id - inserts skip the names in committed_names, as if a
+    concurrent transaction had inserted them
+    """
+    def __init__(self, tables, committed_names=()):
+        self.tables = tables
+        self.committed_names = set(committed_names)
+        self.rows = []
+
+    def execute(self, key, values):
+        statement, table = key
+        names = values['names']
+        if statement == 'insert_names':
+            for name in names:
+                self.tables[table].setdefault(name, len(self.tables[table]) + 1)
+            names = [name for name in names if name not in self.committed_names]
+        self.rows = [{'id': self.tables[table][name], 'name': name} for name in names]
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """
+    Output: FakeStatements of lookup tables holding the default 'NULL' rows and a few names, with an empty lookup
+            cache
+    """
+    cursor = FakeCursor({'industry': {None: 1, 'Internet': 2}, 'function': {None: 1, 'Engineering': 2}})
+    statements = FakeStatements(cursor)
+    monkeypatch.setattr(PGHandler, 'lookup_cache', LookupCache(['industry', 'function']))
+    monkeypatch.setattr(PGHandler, 'statements', statements)
+    return statements
+
+
+def test_insert_values(database):
+    job = JobRecord(id=1, url='https://www.linkedin.com/jobs/view/1/', title='Data Engineer',
+                    industries=['Internet', 'Computer Software'], functions=None)
+    key, values = PGHandler.build_insert_query(database.cursor, job)
+    assert key == 'insert_job'
+    assert values == {'id': 1, 'url': job.url, 'title': 'Data Engineer', 'company': None, 'location': None,
+                      'seniority': None, 'employment_type': None, 'posting_text': None,
+                      'industry_ids': [2, 3], 'function_ids': [1]}
+    # Missing names are inserted in a single statement
+    assert database.executed == [(('insert_names', 'industry'), {'names': ['Internet', 'Computer Software']})]
+
+
+def test_cached_names_skip_the_database(database):
+    PGHandler.lookup_cache.update('industry', [{'id': 2, 'name': 'Internet'}, {'id': 1, 'name': None}])
+    job = JobRecord(id=1, industries=['Internet', 'Internet'], functions=['Engineering', 'Sales'])
+    _, values = PGHandler.build_insert_query(database.cursor, job)
+    assert values['industry_ids'] == [2, 2]
+    assert values['function_ids'] == [2, 3]
+    assert database.executed == [(('insert_names', 'function'), {'names': ['Engineering', 'Sales']})]
+    # Every name is cached by now
+    database.executed.clear()
+    PGHandler.build_insert_query(database.cursor, job)
+    assert database.executed == []
+    assert PGHandler.lookup_cache.stats()['function'] == {'size': 2, 'hits': 2, 'misses': 2}
+
+
+def test_empty_lists(database):
+    _, values = PGHandler.build_insert_query(database.cursor, JobRecord(id=1, industries=[], functions=[]))
+    assert values['industry_ids'] == values['function_ids'] == []
+    assert database.executed == []
+
+
+def test_names_inserted_concurrently(database):
+    # Names committed by a concurrent transaction are skipped by the insert - selected again
+    database.cursor.committed_names = {'Sales'}
+    ids = PGHandler.resolve_name_ids(database.cursor, 'function', ['Sales', 'Marketing'])
+    assert ids == [3, 4]
+    assert [key for key, _ in database.executed] == [('insert_names', 'function'), ('select_names', 'function')]
+
+
+# Ids of the jobs inserted by each path, in pairs
+JOB_IDS = itertools.count(BASE_JOB_ID, 2)
+
+
+@pytest.fixture(scope='module')
+def pg_database():
+    """
+    Output: PGHandler connected to the database of the .env file, without synthetic jobs / names
+    """
+    if os.environ.get('TEST_DATABASE') != '1':
+        pytest.skip("Set TEST_DATABASE=1 to run the tests against the database of the .env file")
+    error = PGHandler.init_connection_pool()
+    if not PGHandler.connection_status:
+        PGHandler.connection_pool.closeall()
+        pytest.skip(error or "Database unreachable")
+    cleanup()
+    yield PGHandler
+    cleanup()
+
+
+@pytest.mark.parametrize('n_values, lists', [
+    (3, {}),
+    (0, {'industries': None, 'functions': None}),
+    (0, {}),
+    (2, {'industries': ['Benchmark Industry 0', 'Benchmark Industry 0', 'Benchmark Industry 1']}),
+    (2, {'functions': ['Benchmark Function 0', 'Benchmark Function new']}),
+], ids=['names', 'none', 'empty', 'repeated_names', 'new_name'])
+@pytest.mark.parametrize('warm_cache', [True, False], ids=['warm_cache', 'cold_cache'])
+def test_insert_matches_rowwise(pg_database, n_values, lists, warm_cache):
+    job_id = next(JOB_IDS)
+    if not warm_cache:
+        pg_database.lookup_cache.clear()
+    pg_database.insert_job(make_job(job_id, n_values)._replace(**lists))
+    insert_job_rowwise(make_job(job_id + 1, n_values)._replace(**lists))
+    # NOTE: Jobs with empty (not None) industries / functions have no junction rows - neither path's job is
+    # selected back
+    batched, rowwise = pg_database.select_job(job_id), pg_database.select_job(job_id + 1)
+    assert (batched is None) == (rowwise is None)
+    assert batched is None or normalize(batched) == normalize(rowwise)
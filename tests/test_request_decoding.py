@@ -0,0 +1,107 @@
+"""
+GzipDecoder and GzipRequestMiddleware: incremental decoding, multi-member bodies, truncated / invalid data and
+bodies decoding beyond the maximum size ('gzip bombs').
+"""
+# Utility
+import gzip
+import pytest
+# Werkzeug
+from werkzeug.test import Client
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Request, Response
+# Custom modules
+from request_decoding import GzipDecoder, GzipRequestMiddleware, BodyTooLargeError, InvalidEncodingError
+
+
+BODY = ''.join(f'<p>Line {i} of the posting &ndash; déjà vu</p>\n' for i in range(2000)).encode('utf-8')
+
+
+def decode(data, max_size, chunk_size=None):
+    """
+    Input:  gzip-compressed bytes, maximum decoded size, and size of the chunks fed to the decoder (None: all)
+    Output: Decoded bytes
+    """
+    decoder = GzipDecoder(max_size)
+    chunk_size = chunk_size or len(data)
+    decoded = b''.join(decoder.feed(data[i:i + chunk_size]) for i in range(0, len(data), chunk_size))
+    decoder.finish()
+    return decoded
+
+
+@pytest.mark.parametrize('chunk_size', [None, 1, 7, 4096])
+def test_decodes_in_chunks(chunk_size):
+    assert decode(gzip.compress(BODY), len(BODY), chunk_size) == BODY
+
+
+@pytest.mark.parametrize('chunk_size', [None, 1, 4096])
+def test_decodes_every_member(chunk_size):
+    data = gzip.compress(BODY[:1000]) + gzip.compress(BODY[1000:5000]) + gzip.compress(BODY[5000:])
+    assert decode(data, len(BODY), chunk_size) == BODY
+
+
+def test_stops_decoding_a_bomb():
+    decoder = GzipDecoder(2**20)
+    with pytest.raises(BodyTooLargeError):
+        decoder.feed(gzip.compress(b'\0' * 64 * 2**20))
+    # At most one byte past the maximum size is decoded
+    assert decoder.decoded_size == 2**20 + 1
+
+
+def test_rejects_bomb_split_across_members():
+    with pytest.raises(BodyTooLargeError):
+        decode(gzip.compress(BODY) * 2, 2 * len(BODY) - 1)
+
+
+def test_accepts_body_of_maximum_size():
+    assert decode(gzip.compress(BODY), len(BODY), 1) == BODY
+
+
+@pytest.mark.parametrize('cut', [1, 10, -8, -1])
+def test_rejects_truncated_body(cut):
+    data = gzip.compress(BODY)
+    with pytest.raises(InvalidEncodingError):
+        decode(data[:cut], len(BODY))
+
+
+def test_rejects_invalid_data():
+    with pytest.raises(InvalidEncodingError):
+        decode(b'not gzip data at all', len(BODY))
+
+
+def echo_app(environ, start_response):
+    """
+    WSGI application responding with the (decoded) request body - or with the HTTP error raised reading it, as
+    Flask would
+    """
+    try:
+        response = Response(Request(environ).get_data())
+    except HTTPException as error:
+        response = error.get_response(environ)
+    return response(environ, start_response)
+
+
+@pytest.fixture
+def client():
+    return Client(GzipRequestMiddleware(echo_app, max_size=len(BODY)))
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'x-gzip', 'GZIP'])
+def test_middleware_decodes_body(client, encoding):
+    response = client.post('/', data=gzip.compress(BODY), headers={'Content-Encoding': encoding})
+    assert response.status_code == 200 and response.get_data() == BODY
+
+
+def test_middleware_passes_identity_body(client):
+    response = client.post('/', data=BODY)
+    assert response.status_code == 200 and response.get_data() == BODY
+
+
+@pytest.mark.parametrize('data, status', [(gzip.compress(BODY + b'!'), 413),
+                                          (gzip.compress(BODY)[:-4], 400),
+                                          (b'not gzip data at all', 400)], ids=['too_large', 'truncated', 'invalid'])
+def test_middleware_rejects_body(client, data, status):
+    assert client.post('/', data=data, headers={'Content-Encoding': 'gzip'}).status_code == status
+
+
+def test_middleware_rejects_other_encodings(client):
+    assert client.post('/', data=BODY, headers={'Content-Encoding': 'br'}).status_code == 415
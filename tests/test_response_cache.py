@@ -0,0 +1,105 @@
+"""
+ResponseCache's generation guard - a body selected before a job changed must not be cached - and its memory
+backend's invalidation, LRU and TTL bounds.
+"""
+# Utility
+import pytest
+# Custom modules
+import response_cache
+from response_cache import MemoryBackend, ResponseCache
+
+
+class FailingBackend:
+    """
+    Backend whose server is unavailable
+    """
+    def get(self, key):
+        raise ConnectionError("unavailable")
+
+    set = delete = get
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """
+    Output: List of the callbacks registered by the job change hook of a 'memory' ResponseCache
+    """
+    monkeypatch.setenv('RESPONSE_CACHE_BACKEND', 'memory')
+    monkeypatch.setenv('RESPONSE_CACHE_SIZE', '2')
+    monkeypatch.setenv('RESPONSE_CACHE_TTL', '300')
+    listeners = []
+    ResponseCache.init_cache(listeners.append)
+    yield listeners
+    ResponseCache.backend = None
+
+
+def test_get_and_set(cache):
+    assert ResponseCache.get(1) is None
+    etag = ResponseCache.set(1, b'{"id": 1}', ResponseCache.generation)
+    assert ResponseCache.get(1) == (b'{"id": 1}', etag)
+    assert etag == ResponseCache.make_etag(b'{"id": 1}')
+    assert ResponseCache.stats() == {'backend': 'memory', 'hits': 1, 'misses': 1, 'hit_rate': 0.5,
+                                     'size': 1, 'max_size': 2, 'evictions': 0}
+
+
+def test_job_change_invalidates(cache):
+    assert cache == [ResponseCache.invalidate]
+    ResponseCache.set(1, b'{"id": 1}', ResponseCache.generation)
+    ResponseCache.set(2, b'{"id": 2}', ResponseCache.generation)
+    cache[0]([1])
+    assert ResponseCache.get(1) is None
+    assert ResponseCache.get(2) is not None
+
+
+def test_stale_body_is_not_cached(cache):
+    # The job changes between the body's select and set(): the body may predate the change
+    generation = ResponseCache.generation
+    cache[0]([1])
+    etag = ResponseCache.set(1, b'{"id": 1}', generation)
+    assert etag == ResponseCache.make_etag(b'{"id": 1}')
+    assert ResponseCache.get(1) is None
+    # Any job's change bumps the generation, not only the cached job's
+    generation = ResponseCache.generation
+    cache[0]([2])
+    ResponseCache.set(1, b'{"id": 1}', generation)
+    assert ResponseCache.get(1) is None
+    ResponseCache.set(1, b'{"id": 1}', ResponseCache.generation)
+    assert ResponseCache.get(1) is not None
+
+
+def test_memory_backend_bounds(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(response_cache.time, 'monotonic', lambda: now[0])
+    backend = MemoryBackend(max_size=2, ttl=10)
+    backend.set(1, b'1')
+    backend.set(2, b'2')
+    assert backend.get(1) == b'1'
+    # Least recently used first out
+    backend.set(3, b'3')
+    assert backend.get(2) is None
+    assert backend.get(1) == b'1'
+    assert backend.stats() == {'size': 2, 'max_size': 2, 'evictions': 1}
+    now[0] = 10.5
+    assert backend.get(1) is None
+    assert backend.get(3) is None
+
+
+def test_backend_errors_are_misses(cache):
+    ResponseCache.backend = FailingBackend()
+    assert ResponseCache.get(1) is None
+    assert ResponseCache.set(1, b'{}', ResponseCache.generation) == ResponseCache.make_etag(b'{}')
+    ResponseCache.invalidate([1])
+
+
+def test_off_backend(monkeypatch):
+    monkeypatch.setenv('RESPONSE_CACHE_BACKEND', 'off')
+    ResponseCache.init_cache()
+    ResponseCache.set(1, b'{}', ResponseCache.generation)
+    assert ResponseCache.get(1) is None
+    assert ResponseCache.stats()['hit_rate'] is None
+
+
+def test_unknown_backend(monkeypatch):
+    monkeypatch.setenv('RESPONSE_CACHE_BACKEND', 'disk')
+    with pytest.raises(ValueError):
+        ResponseCache.init_cache()